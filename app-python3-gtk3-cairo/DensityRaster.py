@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+## @file DensityRaster.py
+## @package DensityRaster
+
+import math
+
+import cairo
+
+import numpy as np
+
+from Utils import Utils
+
+
+## Klasa DensityRaster.
+# Rysowanie hipergrafu przy bardzo małym powiększeniu jako obrazu gęstości.
+# Elementy i połączenia nie są rysowane przez Cairo pojedynczo - są zliczane (np.bincount) w buforze NumPy
+# o rozdzielczości CELL_PX pikseli ekranu na komórkę, a bufor zamieniany jest na kolory i rysowany jako jeden
+# obrazek. Koszt klatki zależy głównie od wielkości ekranu, a nie od ilości elementów.
+class DensityRaster(object):
+
+    ## Wielkość komórki bufora w pikselach ekranu.
+    CELL_PX = 2
+
+    ## Wzmocnienie gęstości połączeń (długość połączeń w komórce, przy której jest ona w 63% zakryta).
+    EDGE_GAIN = 0.6
+
+    ## Wzmocnienie gęstości elementów.
+    NODE_GAIN = 1.0
+
+    ## Maksymalna łączna ilość próbek połączeń w jednej klatce.
+    MAX_EDGE_SAMPLES = 1 << 16
+
+    ## Metoda zliczająca długość odcinków w komórkach bufora.
+    # Odcinki przycinane są do bufora i próbkowane mniej więcej co jedną komórkę.
+    # @param p1_list Tablica początków odcinków (N x 2) we współrzędnych komórek.
+    # @param p2_list Tablica końców odcinków (N x 2) we współrzędnych komórek.
+    # @param width Szerokość bufora w komórkach.
+    # @param height Wysokość bufora w komórkach.
+    # @return Tablica gęstości (height * width).
+    @staticmethod
+    def rasterize_segments(p1_list, p2_list, width, height):
+        if len(p1_list) == 0:
+            return np.zeros(width * height)
+
+        inside, t0, t1 = Utils.clip_segments_to_rect(p1_list, p2_list, (0, 0, width, height))
+        d = (p2_list - p1_list)[inside]
+        a = p1_list[inside] + d * t0[inside, None]
+        d = d * (t1 - t0)[inside, None]
+
+        length = np.sqrt(np.sum(d ** 2, axis=1))
+        scale = min(1.0, DensityRaster.MAX_EDGE_SAMPLES / max(1.0, np.sum(length)))
+        counts = np.maximum(1, np.ceil(length * scale)).astype(np.intp)
+
+        idx = np.repeat(np.arange(len(counts)), counts)
+        t = (np.arange(len(idx)) - np.repeat(np.cumsum(counts) - counts, counts) + 0.5) / np.repeat(counts, counts)
+
+        # odcinki są już przycięte do bufora, więc wystarczy obciąć komórki na prawej i dolnej krawędzi
+        x = np.minimum((a[:, 0][idx] + d[:, 0][idx] * t).astype(np.intp), width - 1)
+        y = np.minimum((a[:, 1][idx] + d[:, 1][idx] * t).astype(np.intp), height - 1)
+
+        return np.bincount(y * width + x, weights=np.repeat(length / counts, counts), minlength=width * height)
+
+    ## Metoda zliczająca punkty w komórkach bufora.
+    # @param points Tablica punktów (N x 2) we współrzędnych komórek.
+    # @param weights Tablica wag punktów (N).
+    # @param width Szerokość bufora w komórkach.
+    # @param height Wysokość bufora w komórkach.
+    # @return Tablica sum wag (height * width).
+    @staticmethod
+    def accumulate(points, weights, width, height):
+        cells = np.floor(points).astype(np.intp)
+        ok = (cells[:, 0] >= 0) & (cells[:, 0] < width) & (cells[:, 1] >= 0) & (cells[:, 1] < height)
+
+        return np.bincount(cells[ok, 1] * width + cells[ok, 0], weights=weights[ok], minlength=width * height)
+
+    ## Metoda rysująca hipergraf jako obraz gęstości.
+    # @param cro Kontekst rysowania biblioteki Cairo.
+    # @param size Wymiary obszaru rysowania w pikselach (szerokość, wysokość).
+    # @param edge_p1_list Tablica początków połączeń (N x 2) w bazie współrzędnych ekranu.
+    # @param edge_p2_list Tablica końców połączeń (N x 2) w bazie współrzędnych ekranu.
+    # @param edge_color Kolor połączeń.
+    # @param node_pos_list Tablica pozycji elementów (M x 2) w bazie współrzędnych ekranu.
+    # @param node_radius_list Tablica promieni elementów na ekranie (M).
+    # @param node_color_list Tablica kolorów elementów (M x 3).
+    @staticmethod
+    def draw(cro, size, edge_p1_list, edge_p2_list, edge_color, node_pos_list, node_radius_list, node_color_list):
+        cell = DensityRaster.CELL_PX
+        width = int(math.ceil(size[0] / cell))
+        height = int(math.ceil(size[1] / cell))
+
+        if width <= 0 or height <= 0:
+            return
+
+        edge_density = DensityRaster.rasterize_segments(edge_p1_list / cell, edge_p2_list / cell, width, height)
+
+        # element zakrywa całą swoją komórkę, a większy - tyle komórek, ile wynosi jego pole
+        node_weights = np.maximum(1.0, np.pi * (node_radius_list / cell) ** 2)
+        node_points = node_pos_list / cell
+        node_density = DensityRaster.accumulate(node_points, node_weights, width, height)
+
+        # kolory liczone są tylko dla komórek, w których coś jest
+        cells = np.flatnonzero(edge_density + node_density)
+        edge_density = edge_density[cells]
+        node_density = node_density[cells]
+
+        alpha_edge = 1.0 - np.exp(-DensityRaster.EDGE_GAIN * edge_density)
+        alpha_node = 1.0 - np.exp(-DensityRaster.NODE_GAIN * node_density)
+        alpha_under = (1.0 - alpha_node) * alpha_edge
+
+        # kolory wstępnie przemnożone przez przezroczystość (format cairo.FORMAT_ARGB32)
+        values = np.round((alpha_node + alpha_under) * 255).astype(np.uint32) << 24
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for channel, shift in ((0, 16), (1, 8), (2, 0)):
+                node_sum = DensityRaster.accumulate(node_points, node_weights * node_color_list[:, channel], width, height)[cells]
+                node_channel = np.where(node_density > 0, node_sum / node_density, 0.0)
+                value = alpha_node * node_channel + alpha_under * edge_color[channel]
+                values |= np.round(value * 255).astype(np.uint32) << shift
+
+        pixels = np.zeros(width * height, dtype=np.uint32)
+        pixels[cells] = values
+
+        stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, width)
+        surface = cairo.ImageSurface.create_for_data(pixels, cairo.FORMAT_ARGB32, width, height, stride)
+
+        cro.save()
+        cro.scale(cell, cell)
+        cro.set_source_surface(surface, 0, 0)
+        cro.paint()
+        cro.restore()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+## @file FrameScheduler.py
+## @package FrameScheduler
+
+import time
+
+
+## Klasa FrameScheduler.
+# Harmonogram symulacji ze stałym krokiem czasu, niezależny od szybkości rysowania.
+# Przy każdej klatce (wywołanie advance, np. z GLib.timeout_add) upływający czas rzeczywisty dodawany jest
+# do akumulatora, a następnie wykonywane jest tyle kroków symulacji o długości dt, ile się w nim mieści -
+# nie więcej niż max_substeps i tylko dopóki nie zostanie przekroczony budżet czasu klatki.
+# Czas, którego nie udało się zasymulować w budżecie, jest odrzucany (symulacja zwalnia zamiast
+# zaległości narastających z klatki na klatkę).
+# Harmonogram liczy osobno częstotliwość rysowania (frame_rendered) i ilość kroków symulacji na sekundę.
+class FrameScheduler(object):
+
+    ## Domyślna częstotliwość klatek.
+    DEFAULT_FRAME_RATE = 60.0
+
+    ## Domyślna maksymalna ilość kroków symulacji w jednej klatce.
+    DEFAULT_MAX_SUBSTEPS = 16
+
+    ## Domyślna część czasu klatki, którą może zająć symulacja.
+    DEFAULT_BUDGET_FRACTION = 0.75
+
+    ## Co ile sekund przeliczane są częstotliwości rysowania i symulacji.
+    RATE_INTERVAL_SEC = 1.0
+
+    ## Konstruktor.
+    # @param dt Krok czasu symulacji.
+    # @param frame_rate Częstotliwość klatek.
+    # @param max_substeps Maksymalna ilość kroków symulacji w jednej klatce.
+    # @param budget_fraction Część czasu klatki, którą może zająć symulacja.
+    # @param clock Funkcja zwracająca aktualny czas w sekundach.
+    def __init__(self, dt, frame_rate=DEFAULT_FRAME_RATE, max_substeps=DEFAULT_MAX_SUBSTEPS,
+                 budget_fraction=DEFAULT_BUDGET_FRACTION, clock=time.perf_counter):
+
+        ## Krok czasu symulacji.
+        self.dt = dt
+
+        ## Częstotliwość klatek.
+        self.frame_rate = frame_rate
+
+        ## Maksymalna ilość kroków symulacji w jednej klatce.
+        self.max_substeps = max_substeps
+
+        ## Budżet czasu symulacji w jednej klatce (w sekundach).
+        self.budget_sec = budget_fraction / frame_rate
+
+        ## Funkcja zwracająca aktualny czas.
+        self.clock = clock
+
+        ## Czas rzeczywisty, który nie został jeszcze zasymulowany.
+        self.accumulator = 0.0
+
+        ## Czas poprzedniej klatki (None - harmonogram był zatrzymany).
+        self.last_time = None
+
+        ## Ilość klatek narysowanych od ostatniego przeliczenia częstotliwości.
+        self.frames = 0
+
+        ## Ilość kroków symulacji wykonanych od ostatniego przeliczenia częstotliwości.
+        self.steps = 0
+
+        ## Czas ostatniego przeliczenia częstotliwości.
+        self.rates_time = clock()
+
+    ## Metoda zwracająca odstęp pomiędzy klatkami.
+    # @return Odstęp w milisekundach (dla GLib.timeout_add).
+    def get_frame_interval_ms(self):
+        return max(1, int(round(1000.0 / self.frame_rate)))
+
+    ## Metoda zatrzymująca upływ czasu symulacji (np. przy wyłączeniu animacji lub gdy układ jest nieruchomy).
+    # Czas, który upłynie do następnego wywołania advance, nie jest symulowany.
+    def reset(self):
+        self.accumulator = 0.0
+        self.last_time = None
+
+    ## Metoda wykonująca kroki symulacji przypadające na bieżącą klatkę.
+    # @param step Funkcja wykonująca jeden krok symulacji o długości dt.
+    # @param is_idle Opcjonalna funkcja zwracająca True, gdy układ jest nieruchomy i kroki można pominąć.
+    # @return Ilość wykonanych kroków.
+    def advance(self, step, is_idle=None):
+        if is_idle is not None and is_idle():
+            self.reset()
+            return 0
+
+        now = self.clock()
+
+        if self.last_time is None:
+            # pierwsza klatka po zatrzymaniu - jeden krok, bez nadrabiania czasu
+            self.accumulator = self.dt
+        else:
+            self.accumulator += now - self.last_time
+
+        self.last_time = now
+
+        steps = 0
+
+        while self.accumulator >= self.dt and steps < self.max_substeps:
+            step()
+            steps += 1
+            self.accumulator -= self.dt
+
+            if self.clock() - now > self.budget_sec:
+                break
+
+        if self.accumulator >= self.dt:
+            self.accumulator %= self.dt
+
+        self.steps += steps
+
+        return steps
+
+    ## Metoda zliczająca narysowaną klatkę.
+    def frame_rendered(self):
+        self.frames += 1
+
+    ## Metoda zwracająca częstotliwości rysowania i symulacji, co RATE_INTERVAL_SEC sekund.
+    # @return Słownik {"render_fps", "steps_per_sec"} lub None, jeśli od ostatniego przeliczenia minęło za mało czasu.
+    def poll_rates(self):
+        now = self.clock()
+        elapsed = now - self.rates_time
+
+        if elapsed < FrameScheduler.RATE_INTERVAL_SEC:
+            return None
+
+        rates = {"render_fps": self.frames / elapsed, "steps_per_sec": self.steps / elapsed}
+
+        self.frames = 0
+        self.steps = 0
+        self.rates_time = now
+
+        return rates
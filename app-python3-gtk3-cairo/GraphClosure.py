@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+## @file GraphClosure.py
+## @package GraphClosure
+
+import numpy as np
+
+
+## Klasa GraphClosure.
+# Klasa wyznaczająca domknięcia relacji pomiędzy wierzchołkami metodami przeszukiwania grafu,
+# zamiast sumowania kolejnych potęg macierzy.
+# Osiągalność (macierz D) liczona jest przez silnie spójne składowe (algorytm Tarjana)
+# i domknięcie skondensowanego grafu acyklicznego, a spójność (macierz S) przez strukturę zbiorów rozłącznych.
+# Wyniki przechowywane są w postaci upakowanej bitowo (np.packbits) - jeden wiersz bajtów na wierzchołek.
+class GraphClosure:
+
+    ## Metoda budująca listy sąsiedztwa (CSR) z listy par.
+    # @param n Ilość wierzchołków.
+    # @param pi Numery wierzchołków początkowych.
+    # @param pj Numery wierzchołków końcowych.
+    # @return Krotka (wskaźniki początków list, numery sąsiadów) - bez powtórzeń.
+    @staticmethod
+    def pairs_to_csr(n, pi, pj):
+        pi = np.asarray(pi, dtype=np.intp)
+        pj = np.asarray(pj, dtype=np.intp)
+
+        keys = np.unique(pi * n + pj)
+
+        src = keys // n
+        dst = keys % n
+
+        indptr = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+
+        return indptr, dst
+
+    ## Metoda wyznaczająca silnie spójne składowe grafu skierowanego (iteracyjny algorytm Tarjana).
+    # Składowe numerowane są w odwrotnej kolejności topologicznej - wszystkie następniki składowej mają mniejsze numery.
+    # @param n Ilość wierzchołków.
+    # @param indptr Wskaźniki początków list sąsiedztwa.
+    # @param indices Numery sąsiadów.
+    # @return Krotka (ilość składowych, tablica numerów składowych dla wierzchołków).
+    @staticmethod
+    def strongly_connected_components(n, indptr, indices):
+        indptr = indptr.tolist()
+        indices = indices.tolist()
+
+        index = [-1] * n
+        lowlink = [0] * n
+        on_stack = [False] * n
+        comp = [-1] * n
+
+        stack = list()
+        counter = 0
+        ncomp = 0
+
+        for root in range(n):
+            if index[root] != -1:
+                continue
+
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+
+            work = [[root, indptr[root]]]
+
+            while work:
+                frame = work[-1]
+                v = frame[0]
+
+                if frame[1] < indptr[v + 1]:
+                    w = indices[frame[1]]
+                    frame[1] += 1
+
+                    if index[w] == -1:
+                        index[w] = lowlink[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+
+                        work.append([w, indptr[w]])
+                    elif on_stack[w]:
+                        if index[w] < lowlink[v]:
+                            lowlink[v] = index[w]
+                else:
+                    work.pop()
+
+                    if work:
+                        u = work[-1][0]
+
+                        if lowlink[v] < lowlink[u]:
+                            lowlink[u] = lowlink[v]
+
+                    if lowlink[v] == index[v]:
+                        while True:
+                            w = stack.pop()
+                            on_stack[w] = False
+                            comp[w] = ncomp
+
+                            if w == v:
+                                break
+
+                        ncomp += 1
+
+        return ncomp, np.array(comp, dtype=np.intp)
+
+    ## Metoda zwracająca upakowane bitowo wiersze przynależności wierzchołków do grup.
+    # @param n Ilość wierzchołków.
+    # @param ngroups Ilość grup.
+    # @param group Tablica numerów grup dla wierzchołków.
+    # @return Tablica uint8 (ngroups x ceil(n/8)), bit wierzchołka ustawiony w wierszu jego grupy.
+    @staticmethod
+    def get_packed_members(n, ngroups, group):
+        members = np.zeros((ngroups, (n + 7) // 8), dtype=np.uint8)
+
+        nodes = np.arange(n, dtype=np.intp)
+        np.bitwise_or.at(members, (group, nodes >> 3), (128 >> (nodes & 7)).astype(np.uint8))
+
+        return members
+
+    ## Metoda wyznaczająca osiągalność (domknięcie przechodnie, ścieżki o długości co najmniej 1).
+    # Odpowiada zbinaryzowanej sumie Pb + Pb^2 + Pb^3 + ...
+    # @param n Ilość wierzchołków.
+    # @param pi Numery wierzchołków początkowych przejść.
+    # @param pj Numery wierzchołków końcowych przejść.
+    # @return Tablica uint8 (n x ceil(n/8)) - upakowane bitowo wiersze macierzy osiągalności.
+    @staticmethod
+    def reachability_packed(n, pi, pj):
+        indptr, indices = GraphClosure.pairs_to_csr(n, pi, pj)
+        ncomp, comp = GraphClosure.strongly_connected_components(n, indptr, indices)
+
+        members = GraphClosure.get_packed_members(n, ncomp, comp)
+
+        # składowa jest cykliczna, gdy ma więcej niż jeden wierzchołek lub wierzchołek z pętlą własną
+        src = np.repeat(np.arange(n, dtype=np.intp), np.diff(indptr))
+        cyclic = np.bincount(comp, minlength=ncomp) > 1
+        cyclic[comp[src[src == indices]]] = True
+
+        # krawędzie grafu skondensowanego, pogrupowane po składowej początkowej
+        csrc = comp[src]
+        cdst = comp[indices]
+        inter = csrc != cdst
+        cond_indptr, cond_indices = GraphClosure.pairs_to_csr(ncomp, csrc[inter], cdst[inter])
+
+        closure = np.zeros_like(members)
+        reach_with_members = np.zeros_like(members)
+
+        # następniki mają mniejsze numery, więc są już policzone
+        for c in range(ncomp):
+            succ = cond_indices[cond_indptr[c]:cond_indptr[c + 1]]
+
+            if len(succ) > 0:
+                closure[c] = np.bitwise_or.reduce(reach_with_members[succ], axis=0)
+
+            if cyclic[c]:
+                closure[c] |= members[c]
+
+            reach_with_members[c] = closure[c] | members[c]
+
+        return closure[comp]
+
+    ## Metoda wyznaczająca spójność (ścieżki nieskierowane o długości co najmniej 1) strukturą zbiorów rozłącznych.
+    # Odpowiada zbinaryzowanej sumie Rb + Rb^2 + Rb^3 + ... dla symetrycznej macierzy Rb.
+    # @param n Ilość wierzchołków.
+    # @param pi Numery wierzchołków - pierwsze końce połączeń.
+    # @param pj Numery wierzchołków - drugie końce połączeń.
+    # @param self_loops Opcjonalna tablica bool wierzchołków z pętlą własną.
+    # @return Tablica uint8 (n x ceil(n/8)) - upakowane bitowo wiersze macierzy spójności.
+    @staticmethod
+    def connectivity_packed(n, pi, pj, self_loops=None):
+        parent = list(range(n))
+
+        def find(x):
+            root = x
+
+            while parent[root] != root:
+                root = parent[root]
+
+            while parent[x] != root:
+                parent[x], x = root, parent[x]
+
+            return root
+
+        for a, b in zip(np.asarray(pi).tolist(), np.asarray(pj).tolist()):
+            ra = find(a)
+            rb = find(b)
+
+            if ra != rb:
+                parent[rb] = ra
+
+        roots = np.array([find(x) for x in range(n)], dtype=np.intp)
+        labels, comp = np.unique(roots, return_inverse=True)
+
+        members = GraphClosure.get_packed_members(n, len(labels), comp)
+
+        # wierzchołek jest połączony sam ze sobą, gdy ma sąsiada (droga tam i z powrotem) lub pętlę własną
+        connected = np.bincount(comp, minlength=len(labels))[comp] > 1
+
+        if self_loops is not None:
+            connected |= np.asarray(self_loops, dtype=bool)
+
+        return np.where(connected[:, np.newaxis], members[comp], 0).astype(np.uint8)
+
+    ## Metoda rozpakowująca wybrane wiersze i kolumny upakowanej bitowo macierzy.
+    # @param packed Tablica uint8 z upakowanymi wierszami.
+    # @param n Ilość kolumn macierzy.
+    # @param rows Opcjonalna tablica numerów wierszy i kolumn do wybrania, None - wszystkie.
+    # @return Macierz NumPy z wartościami 0 i 1.
+    @staticmethod
+    def unpack(packed, n, rows=None):
+        if rows is None:
+            return np.unpackbits(packed, axis=1, count=n).astype(int)
+
+        rows = np.asarray(rows, dtype=np.intp)
+
+        return np.unpackbits(packed[rows], axis=1, count=n)[:, rows].astype(int)
@@ -18,14 +18,16 @@ import pickle
 from functools import wraps
 
 import time
-#import threading
-#from multiprocessing import Process
 
 import numpy as np
 
 from Vert import Vert, HBNode
 from Utils import Utils
 from HyperGraph import HyperGraph
+from SimulationProcess import SimulationProcess
+from FrameScheduler import FrameScheduler
+from SceneLayer import SceneLayer
+from MultilevelLayout import MultilevelLayout
 from HgMatrixAnalyzer import HgMatrixAnalyzer as Ma
 
 
@@ -51,26 +53,35 @@ def undo_redo_function_decorator(method):
     return _impl
 
 
-## Dekorator na funkcje, po których należy odświeżyć ekran.
-#  Pozwala obudować funkcje, aby wykonać akcje przed i po wykonaniu funkcji.
-# @param method Metoda, która ma zostać obudowana.
-# @return Zwraca dalej funkcję, która obudowuje daną funkcję.
-def redraw_function_decorator(method):
-    @wraps(method)
-    def _impl(*method_args, **method_kwargs):
-        if not isinstance(method_args[0], GuiWindow):
-            raise TypeError('method_args[0] nie jest klasy GuiWindow!')
-        else:
-            ## Wywołanie metody obudowanej.
-            method(*method_args, **method_kwargs)
+## Fabryka dekoratorów na funkcje, po których należy odświeżyć ekran.
+#  Pozwala obudować funkcje, aby po ich wykonaniu wywołać podaną metodę odświeżającą okna.
+# @param redraw_method_name Nazwa metody GuiWindow wywoływanej po metodzie obudowanej.
+# @return Zwraca dekorator obudowujący daną funkcję.
+def make_redraw_function_decorator(redraw_method_name):
+    def _decorator(method):
+        @wraps(method)
+        def _impl(*method_args, **method_kwargs):
+            if not isinstance(method_args[0], GuiWindow):
+                raise TypeError('method_args[0] nie jest klasy GuiWindow!')
+            else:
+                ## Wywołanie metody obudowanej.
+                method(*method_args, **method_kwargs)
 
-            ## Metoda po metodzie obudowanej - odświeżanie ekranu.
-            method_args[0].queue_draw()
+                ## Metoda po metodzie obudowanej - odświeżanie ekranu.
+                getattr(method_args[0], redraw_method_name)()
 
-            # print('Redrawed from decorator func after calling: \n\t{} \n\twith args: \n\t\t{}, \n\tkwargs: \n\t\t{}.\n\n'
-            #       .format(method, method_args, method_kwargs))
+        return _impl
 
-    return _impl
+    return _decorator
+
+
+## Dekorator na funkcje, po których należy odświeżyć ekran.
+redraw_function_decorator = make_redraw_function_decorator('queue_draw')
+
+## Dekorator na funkcje, po których należy odświeżyć tylko zmieniony obszar ekranu.
+#  Zmieniony obszar wyznaczany jest przez GuiWindow.queue_scene_redraw, a jeśli nie da się go wyznaczyć,
+#  odświeżany jest cały ekran, jak w redraw_function_decorator.
+damage_redraw_function_decorator = make_redraw_function_decorator('queue_scene_redraw')
 
 
 ## Klasa EntryDialog.
@@ -466,6 +477,34 @@ class GuiWindow(Gtk.Window):
         ## Stała czasowa, która wyraża ilość czasu jaki musi minąć pomiędzy dwoma kolejnymi odświeżeniami widoku.
         self.TIME_DELTA_SEC = 1.0 / 240.0
 
+        ## Harmonogram kroków symulacji ze stałym krokiem czasu TIME_DELTA_SEC, niezależny od szybkości rysowania.
+        self.scheduler = FrameScheduler(self.TIME_DELTA_SEC)
+
+        ## Id źródła GLib wywołującego on_frame_tick (None - animacja zatrzymana).
+        self.frame_source_id = None
+
+        ## Proces symulacji działający w tle (None - symulacja wykonywana jest w oknie).
+        self.simulation = None
+
+        ## Obraz sceny przechowywany pomiędzy odświeżeniami, gdy animacja jest wyłączona.
+        self.scene_layer = SceneLayer()
+
+        ## Czas (w milisekundach) od ostatniego obrotu rolką, po którym scena rysowana jest w nowym powiększeniu.
+        # Wcześniej pokazywany jest przeskalowany obraz poprzedni.
+        self.ZOOM_SETTLE_MS = 150
+
+        ## Id źródła GLib wywołującego on_zoom_settled (None - powiększenie nie jest zmieniane).
+        self.zoom_settle_source_id = None
+
+        ## Margines (w pikselach) dodawany do odświeżanego obszaru ekranu (grubość linii, wygładzanie krawędzi).
+        self.DAMAGE_MARGIN_PX = 3
+
+        ## Widok (hipergraf, struktura, powiększenie, przesunięcie, wymiary) przy ostatnim wyznaczaniu zmienionego obszaru.
+        self.damage_view = None
+
+        ## Wersja hipergrafu przy ostatnim wyznaczaniu zmienionego obszaru.
+        self.damage_scene_version = None
+
         ## Zmienna przechowująca poprzednią pozycję myszy przy kliknięciu.
         self.old_mouse_pos = np.array((0, 0), dtype=np.double)  # punkt na ekranie
 
@@ -552,6 +591,8 @@ class GuiWindow(Gtk.Window):
                     <toolitem action='NewHyperarc' />
                     <toolitem action='NewHyperloop' />
                     <toolitem action='AnimateToggle' />
+                    <toolitem action='BackgroundToggle' />
+                    <toolitem action='MultilevelLayout' />
                     <toolitem action='EditSelected' />
                     <toolitem action='DeleteSelected' />
                     <toolitem action='SaveEvoState' />
@@ -573,6 +614,8 @@ class GuiWindow(Gtk.Window):
             ("UndoAction", Gtk.STOCK_UNDO, "cofnij", None, None, self.undo_action),
             ("RedoAction", Gtk.STOCK_REDO, "powtórz", None, None, self.redo_action),
             ("AnimateToggle", Gtk.STOCK_MEDIA_PLAY, "animuj", None, None, self.toggle_animate),
+            ("BackgroundToggle", Gtk.STOCK_EXECUTE, "w tle", None, None, self.toggle_background_simulation),
+            ("MultilevelLayout", Gtk.STOCK_EXECUTE, "ułóż wielopoz.", None, None, self.multilevel_layout),
             ("SelectAllToggle", Gtk.STOCK_SELECT_ALL, "zaznacz", None, None, self.toggle_select_all),
             ("DeactivateAll", Gtk.STOCK_SELECT_ALL, "deaktywuj", None, None, self.deactivate_all),
             ("NewNode", Gtk.STOCK_ADD, "wierzchołek", None, None, self.make_node),
@@ -877,7 +920,8 @@ class GuiWindow(Gtk.Window):
     # @returns Obiekt okna rysowania.
     def init_drawing_area(self):
         ## Pole do rysowania za pomocą Cairo.
-        drawing_area = Gtk.DrawingArea()
+        self.drawing_area = Gtk.DrawingArea()
+        drawing_area = self.drawing_area
         drawing_area.set_size_request(640, 640)
         drawing_area.set_hexpand(True)
         drawing_area.set_vexpand(True)
@@ -922,9 +966,11 @@ class GuiWindow(Gtk.Window):
 
 
         self.connect("key-press-event", self.key_pressed)
+        self.connect('destroy', self.stop_background_simulation)
         self.connect('destroy', self.quit)
 
         # SETTING REFRESH TIME FOR ANIMATION
+        # źródło GLib.timeout_add wywołujące on_frame_tick dodawane jest przy włączeniu animacji (toggle_animate)
 
         # GLib.timeout_add(int(1000 * self.TIME_DELTA_SEC), self.animate)  # segfault with PyPy
         # GObject.timeout_add(int(1000 * self.TIME_DELTA_SEC), self.animate)  # no effect in PyPy, refresh only on key/mouse events; works with CPython 2, 3
@@ -970,13 +1016,13 @@ class GuiWindow(Gtk.Window):
                 path = dialog.get_filename()
                 if not path.endswith(".hg"):
                     path += ".hg"
-                pickle.dump(self.active_hg.dump_hg_as_dict(), open(path, "wb"))
+                self.active_hg.save_hg_to_file(path)
             elif response == Gtk.ResponseType.CANCEL:
                 print("Cancel clicked")
 
             dialog.destroy()
         else:
-            pickle.dump(self.active_hg.dump_hg_as_dict(), open(path, "wb"))
+            self.active_hg.save_hg_to_file(path)
 
     ## Metoda ładująca zserializowany plik hipergrafu do projektu.
     # Wyświetlane jest okno wyboru pliku.
@@ -1016,12 +1062,7 @@ class GuiWindow(Gtk.Window):
             dialog.destroy()
 
         if path is not None:
-            if path.endswith('py3hg'):
-                hgastuple = pickle.load(open(path, "rb"))
-                newhg.load_hg_from_tuple(hgastuple)
-            else:
-                hgasdict = pickle.load(open(path, "rb"))
-                newhg.load_hg_from_dict(hgasdict)
+            newhg.load_hg_from_file(path)
 
             self.esa.set_upper(len(newhg.evolution_history) - 1)
             newhg.evolution_view_current_frame = len(newhg.evolution_history) - 1
@@ -1054,7 +1095,7 @@ class GuiWindow(Gtk.Window):
         self.undo_states.append(pickle.dumps(self.active_hg))
 
     ## Metoda wykonywana po akcji edytującej w jakiś sposób stan hipergrafu.
-    @redraw_function_decorator
+    @damage_redraw_function_decorator
     def after_modify_action_handler(self):
         # print('Zapisano akcje do listy')
         # self.redo_states = list()
@@ -1067,7 +1108,7 @@ class GuiWindow(Gtk.Window):
     ## Metoda pozwalająca reagować na kliknięcie przyciskiem myszy.
     #
     # @param event Obiekt zdarzenia, które zawiera informacje m.in. o numerze przycisku i krotności kliknięcia.
-    @redraw_function_decorator
+    @damage_redraw_function_decorator
     def mouse_button_clicked(self, widget, event):
         # x, y, state = event.window.get_pointer()
         x = event.x
@@ -1148,7 +1189,7 @@ class GuiWindow(Gtk.Window):
     ## Metoda pozwalająca reagować na przeciągnięcie myszy podczas kliknięcia.
     #
     # @param event Obiekt zdarzenia, które zawiera informacje m.in. o wektorze przesunięcia.
-    @redraw_function_decorator
+    @damage_redraw_function_decorator
     def mouse_moved_while_clicked(self, widget, event):
         # x, y, state = event.window.get_pointer()
         x = event.x
@@ -1191,6 +1232,58 @@ class GuiWindow(Gtk.Window):
             if self.ZOOM < self.MINZOOM:
                 self.ZOOM = self.MINZOOM
 
+        # do czasu zakończenia przewijania pokazywany jest przeskalowany obraz sceny
+        if self.zoom_settle_source_id is not None:
+            GLib.source_remove(self.zoom_settle_source_id)
+
+        self.zoom_settle_source_id = GLib.timeout_add(self.ZOOM_SETTLE_MS, self.on_zoom_settled)
+
+    ## Metoda zlecająca odświeżenie ekranu po zmianie hipergrafu.
+    # Jeśli od poprzedniego wywołania zmieniły się tylko pojedyncze elementy (HyperGraph.pop_damage_rects),
+    # a widok się nie przesunął, odświeżany jest tylko prostokąt obejmujący ich stare i nowe położenie
+    # oraz ich połączenia - koszt rysowania zależy wtedy od wielkości zmiany, a nie od wielkości hipergrafu.
+    # W pozostałych przypadkach odświeżany jest cały ekran.
+    def queue_scene_redraw(self):
+        hg = self.active_hg
+        view = (hg, hg.structure_version, self.ZOOM, tuple(self.CANVAS_PAN_VECTOR), tuple(self.DRAWING_AREA_SIZE))
+        from_version = self.damage_scene_version
+        scene_version = hg.get_scene_version()
+        rects = hg.pop_damage_rects()
+
+        self.damage_view, last_view = view, self.damage_view
+        self.damage_scene_version = scene_version
+
+        if rects is None or view != last_view or self.ANIMATE or self.custom_clickables or self.custom_drawables:
+            self.queue_draw()
+            return
+
+        if len(rects) == 0:
+            if scene_version != from_version:
+                self.queue_draw()
+            return
+
+        p0 = Utils.map_pos_canvas_to_screen(np.min(rects[:, :2], axis=0), self.DRAWING_AREA_CENTER, self.ZOOM, self.CANVAS_PAN_VECTOR)
+        p1 = Utils.map_pos_canvas_to_screen(np.max(rects[:, 2:], axis=0), self.DRAWING_AREA_CENTER, self.ZOOM, self.CANVAS_PAN_VECTOR)
+
+        x0, y0 = np.maximum(np.floor(p0) - self.DAMAGE_MARGIN_PX, 0).astype(int)
+        x1, y1 = np.minimum(np.ceil(p1) + self.DAMAGE_MARGIN_PX, self.DRAWING_AREA_SIZE).astype(int)
+
+        if x1 <= x0 or y1 <= y0:
+            # zmiany poza ekranem - obraz sceny jest aktualny
+            self.scene_layer.add_damage((0, 0, 0, 0), from_version, scene_version)
+            return
+
+        self.scene_layer.add_damage((x0, y0, x1 - x0, y1 - y0), from_version, scene_version)
+        self.drawing_area.queue_draw_area(x0, y0, x1 - x0, y1 - y0)
+
+    ## Metoda wywoływana przez GLib po zakończeniu zmiany powiększenia - zleca narysowanie sceny w nowym powiększeniu.
+    # @return False (jednorazowe wywołanie).
+    def on_zoom_settled(self):
+        self.zoom_settle_source_id = None
+        self.queue_draw()
+
+        return False
+
     # KEYBOARD CALLBACKS
 
     ## Metoda pozwalająca reagować na wciśnięte klawisze na klawiaturze.
@@ -1208,6 +1301,9 @@ class GuiWindow(Gtk.Window):
         if   key == "p":
             self.toggle_animate()
 
+        elif key == "b":
+            self.toggle_background_simulation()
+
         elif key == "a":
             self.toggle_select_all()
 
@@ -1238,15 +1334,13 @@ class GuiWindow(Gtk.Window):
 
                         if lastselxnode.is_of_vert_type(Vert.T_NODE):
 
-                            unselected_nodes_id = [xid for xid in self.active_hg.get_all_nodes_id() if xid not in selnid]
-                            closest_node_id = self.active_hg.get_closest_xnode_id_by_xnode_id(lastselxid, xid_list=unselected_nodes_id)
+                            closest_node_id = self.active_hg.get_closest_xnode_id_by_xnode_id(lastselxid, vert_type=Vert.T_NODE, exclude=selnid)
 
                             if closest_node_id is not None:
                                 print("nid: {}".format(closest_node_id))
                                 self.select_xnode(closest_node_id)
                         else:
-                            unselected_hbnodes_id = [xid for xid in self.active_hg.get_all_hyperbranches_id() if xid not in selhbid]
-                            closest_hbnode_id = self.active_hg.get_closest_xnode_id_by_xnode_id(lastselxid, xid_list=unselected_hbnodes_id)
+                            closest_hbnode_id = self.active_hg.get_closest_xnode_id_by_xnode_id(lastselxid, vert_type=Vert.T_HBRANCH, exclude=selhbid)
 
                             if closest_hbnode_id is not None:
                                 print("hbid: {}".format(closest_hbnode_id))
@@ -1297,6 +1391,81 @@ class GuiWindow(Gtk.Window):
     def toggle_animate(self, button=None):
         self.ANIMATE = not self.ANIMATE
 
+        if self.simulation is not None:
+            if self.ANIMATE:
+                self.simulation.resume()
+            else:
+                self.simulation.pause()
+
+        if self.ANIMATE and self.frame_source_id is None:
+            self.scheduler.reset()
+            self.frame_source_id = GLib.timeout_add(self.scheduler.get_frame_interval_ms(), self.on_frame_tick)
+
+    ## Metoda wywoływana przez GLib co klatkę animacji.
+    # Wykonuje kroki symulacji przypadające na klatkę (lub odczytuje stan symulacji w tle)
+    # i zleca odświeżenie widoku tylko wtedy, gdy elementy się przesunęły.
+    # Gdy wszystkie elementy są uśpione, kroki i odświeżanie są pomijane.
+    # @return True, jeśli metoda ma być wywołana przy następnej klatce (False - po wyłączeniu animacji).
+    def on_frame_tick(self):
+        if not self.ANIMATE:
+            self.frame_source_id = None
+            return False
+
+        hg = self.active_hg
+
+        if self.simulation is not None:
+            moved = self.simulation.read_positions(hg)
+        else:
+            moved = self.scheduler.advance(lambda: hg.update(self.TIME_DELTA_SEC, verbose=False),
+                                           is_idle=lambda: hg.sleep_enabled and hg.get_awake_xnodes_count() == 0) > 0
+
+        if moved:
+            self.queue_draw()
+
+        rates = self.scheduler.poll_rates()
+
+        if rates is not None and self.DEBUG_MODE:
+            steps_per_sec = rates["steps_per_sec"] if self.simulation is None else self.simulation.get_stats()["steps_per_sec"]
+            print("render {0:.1f} fps, \tsimulation {1:.1f} steps/s, \tawake {2}".format(rates["render_fps"],
+                                                                                    steps_per_sec,
+                                                                                    hg.get_awake_xnodes_count()))
+
+        return True
+
+    ## Metoda pozwalająca przenieść symulację do osobnego procesu lub z powrotem do okna.
+    # Symulacja w tle wykonywana jest na innym rdzeniu procesora, a okno przy rysowaniu odczytuje tylko
+    # najnowsze pozycje elementów z pamięci współdzielonej, więc czas kroku symulacji nie spowalnia interfejsu.
+    # @param button Obiekt przycisku, z którego ewentualnie wywoływana jest metoda.
+    def toggle_background_simulation(self, button=None):
+        if self.simulation is None:
+            self.simulation = SimulationProcess(dt=self.TIME_DELTA_SEC)
+
+            if not self.ANIMATE:
+                self.simulation.pause()
+
+            print("symulacja w tle: wlaczona")
+        else:
+            self.stop_background_simulation()
+            print("symulacja w tle: wylaczona")
+
+    ## Metoda kończąca proces symulacji w tle.
+    # @param widget Opcjonalny obiekt, z którego wywoływana jest metoda.
+    def stop_background_simulation(self, widget=None):
+        if self.simulation is not None:
+            self.simulation.stop()
+            self.simulation = None
+
+    ## Metoda układająca wstępnie hipergraf metodą wielopoziomową (MultilevelLayout).
+    # Elementy zaznaczone zachowują swoje pozycje.
+    # @param button Obiekt przycisku, z którego ewentualnie wywoływana jest metoda.
+    @undo_redo_function_decorator
+    def multilevel_layout(self, button=None):
+        MultilevelLayout.arrange(self.active_hg, verbose=True)
+
+        if self.simulation is not None:
+            # nowe pozycje wszystkich elementów - proces symulacji dostaje elementy hipergrafu od nowa
+            self.simulation.sync(self.active_hg)
+
     ## Metoda pozwalająca cofnąć cofniętą wykonaną akcję.
     # @param button Obiekt przycisku, z którego ewentualnie wywoływana jest metoda.
     def undo_action(self, button=None):
@@ -1727,8 +1896,6 @@ class GuiWindow(Gtk.Window):
         cr.set_source_rgb(*(0.5, 0.5, 0.5))
         cr.set_line_width(1)
 
-        self.draw_center_cross(cr)
-
         p0 = self.DRAWING_AREA_CENTER
         p1 = Utils.map_pos_canvas_to_screen(np.array((0.0, 0.0)), self.DRAWING_AREA_CENTER, self.ZOOM, self.CANVAS_PAN_VECTOR)
 
@@ -1738,30 +1905,28 @@ class GuiWindow(Gtk.Window):
 
         self.draw_canvas_cross(cr)
 
+    ## Metoda rysująca scenę: tło, siatkę i hipergraf.
+    # @param cr Obiekt biblioteki Cairo.
+    def draw_scene(self, cr):
+        cr.set_source_rgb(*(0.9, 0.9, 0.9))
+        cr.paint()
+
+        self.draw_canvas_grid(cr)
+
+        cr.set_source_rgb(*(0.5, 0.5, 0.5))
+        cr.set_line_width(1)
+
+        self.active_hg.draw(cr, self.CANVAS_PAN_VECTOR, self.DRAWING_AREA_CENTER, self.ZOOM)
+
     ## Metoda powodująca rysowanie hipergrafu.
     # Jest wywoływana przez obiekt klasy DrawingArea.
     # @param da Obiekt klasy DrawingArea z biblioteki Gtk3.
+    # Symulacja nie jest tu wykonywana - kroki symulacji i zlecanie odświeżeń realizuje on_frame_tick.
     # @param cr Obiekt biblioteki Cairo.
-    @redraw_function_decorator
     def expose(self, da, cr):
         t_start = time.time()
 
-        #def a():
-        #    self.active_hg.update(self.TIME_DELTA_SEC)
-        #    time.sleep(self.TIME_DELTA_SEC)
-
-        if self.ANIMATE:
-            self.active_hg.update(self.TIME_DELTA_SEC)
-        else:
-            time.sleep(self.TIME_DELTA_SEC)
-            
-            #self.wt = threading.Thread(target=a, args=())
-            #self.wt.start()
-            
-            # należy dorobić manager, proxy itd... nie da sie w ten sposob wspoldzielic obiektow (np active_hg)
-            # jest to jednak dosc obiecujacy sposob
-            #self.p = Process(target=a, args=()) 
-            #self.p.start()
+        self.scheduler.frame_rendered()
 
         allocation = self.frame.get_allocation()
 
@@ -1778,12 +1943,17 @@ class GuiWindow(Gtk.Window):
         cr.set_source_rgb(*(0.9, 0.9, 0.9))
         cr.paint()
 
-        self.draw_canvas_grid(cr)
+        if self.ANIMATE:
+            # podczas animacji scena zmienia się w każdej klatce - jest rysowana bezpośrednio
+            self.draw_scene(cr)
+        else:
+            self.scene_layer.paint(cr, self.active_hg, self.CANVAS_PAN_VECTOR, self.ZOOM, self.DRAWING_AREA_SIZE,
+                                   self.draw_scene, allow_preview=self.zoom_settle_source_id is not None)
 
         cr.set_source_rgb(*(0.5, 0.5, 0.5))
         cr.set_line_width(1)
 
-        self.active_hg.draw(cr, self.CANVAS_PAN_VECTOR, self.DRAWING_AREA_CENTER, self.ZOOM)
+        self.draw_center_cross(cr)
 
         if self.custom_drawables is not None and len(self.custom_drawables) > 0:
             try:
@@ -10,7 +10,10 @@ from Utils import Utils as u
 # locale.setlocale(locale.LC_NUMERIC, 'C')
 
 from HyperGraph import HyperGraph
+from Vert import HBNode
 
+import bisect
+import heapq
 import random
 
 ## Klasa HgMatrixAnalyzer.
@@ -64,74 +67,93 @@ class HgMatrixAnalyzer:
 
 
     ## Metoda wykonująca algorytm Dijkstry wyszukiwania najkrótszej drogi między dwoma punktami.
+    # Wierzchołki wybierane są z kopca binarnego, a sąsiedzi wyznaczani z rzadkiej macierzy incydencji,
+    # bez budowania gęstych macierzy A i P. Reguły przejść są takie same jak w macierzy przejść P,
+    # a wagą przejścia jest wartość parametru 'value' hipergałęzi.
     # @param hgobj Obiekt hipergrafu na którym wykonywany jest algorytm.
     # @param nid_a Id wierzchołka początkowego.
     # @param nid_b Id wierzchołka końcowego.
+    # @return Krotka (lista kroków ścieżki, lista odległości od wierzchołka początkowego).
     @staticmethod
     def return_dijkstra_path_from_a_to_b(hgobj: HyperGraph, nid_a, nid_b=None, evo=False):
         propname = 'value'
 
-        def opisznp(M):
-            print('Macierz\n{}\ntypu {} o rozmiarze {}.'.format(M, M.dtype, M.shape))
+        # Rzadka macierz incydencji A hipergrafu (linie - wierzcholki, kolumny - hipergałęzie).
 
-        # Macierz incydencji A hipergrafu (linie - wierzcholki, kolumny - hipergałęzie). Ta macierz jest w formacie NUMERYCZNYM!
+        A = hgobj.get_incidence_matrix()
 
-        A_dict = hgobj.macierz_incydencji(xid_list=None)
-        A = A_dict['matrix']
-        opisznp(A)
+        lista_id_wierzcholkow = A.nodes_id
+        lista_id_hipergalezi = A.hbid_list
+        ilosc_wierzcholkow = len(lista_id_wierzcholkow)
 
-        # Macierz przejść hipergrafu.
+        # Wektor wag hipergałęzi (wartości parametru, np 'value').
 
-        P_dict = hgobj.macierz_przejsc(nodes_id=None)
-        P = P_dict['matrix']
-        opisznp(P)
+        W = [hgobj.get_hbnode_by_id(hbid).get_property_value(propname) for hbid in lista_id_hipergalezi]
 
-        # Wektor wag hipergałęzi (wartości parametru, np 'value').
+        # Przy nieujemnych wagach odległości zdejmowane z kopca nie maleją, więc hipergałąź raz w pełni
+        # rozpatrzona z danej pozycji nie może już poprawić odległości wierzchołków leżących za tą pozycją
+        # i są one pomijane.
 
-        hbid_list = hgobj.get_all_hyperbranches_id()
-        w_l = [hgobj.get_hbnode_by_id(hbid).get_property_value(propname) for hbid in hbid_list]
-        W = np.array(w_l)
-        opisznp(W)
+        try:
+            nieujemne_wagi = bool(np.all(np.array(W, dtype=float) >= 0))
+        except (TypeError, ValueError):
+            nieujemne_wagi = False
 
-        # Zmienna ilości wierzchołków.
+        pomijanie_rozpatrzonych = nieujemne_wagi and not np.any(A.hbtypes == HBNode.HB_DUMMY)
 
-        ilosc_wierzcholkow = P.shape[0]
-        lista_id_wierzcholkow = A_dict['lines']
-        lista_id_hipergalezi = A_dict['columns']
+        rozpatrzone_od = [np.inf] * len(lista_id_hipergalezi)
 
-        # Tablica stanu wyszukiwania. Będzie to tablica numpy z możliwością zamaskowania elementów, aby nie wracać do odwiedzonych wierzchołków.
+        csr_indptr = A.csr_indptr.tolist()
+        csr_indices = A.csr_indices.tolist()
+        csr_values = A.csr_values.tolist()
+        csc_indptr = A.csc_indptr.tolist()
+        csc_rows = A.rows.tolist()
+        csc_values = A.values.tolist()
+        hbtypes = A.hbtypes.tolist()
 
-        s1 = np.ones(ilosc_wierzcholkow, dtype=np.float) * np.inf
-        s = np.ma.array(s1, mask=False)
-        np.ma.set_fill_value(s, np.inf)
-        opisznp(s)
+        # Tablica odległości i flagi odwiedzenia wierzchołków.
 
-        # **Punktem startu będzie wierzchołek o indeksie 0** w macierzy. Indeks wierzchołka w macierzy nie jest jednoznaczny z id wierzchołka w hipergrafie. Da się uzyskać id wierzchołka lub hipergałęzi ze słownika wyniku metod hipergrafu. Tutaj pominięte zostały te elementy, ponieważ nie jest istotny prawdziwy id wierzchołka na poziomie obliczeń.
-        # Ustawianie indeksu wierzchołka startowego. Ustawianie odległości do tego wierzchołka jako zero.
+        s = [np.inf] * ilosc_wierzcholkow
+        odwiedzone = [False] * ilosc_wierzcholkow
 
-        start = lista_id_wierzcholkow.index(nid_a)
-        s[start] = 0
+        start = A.node_index[nid_a]
+        s[start] = 0.0
 
-        # Ustawianie indeksu wierzchołka końcowego (opcjonalnie, może być None). Ustawianie zmiennej wynikowej sciezki. Jeśli znaleziono ścieżkę, przyjmie wartość inną niż None.
+        # Ustawianie indeksu wierzchołka końcowego (opcjonalnie, może być None). Ustawianie zmiennej wynikowej sciezki. Jeśli znaleziono ścieżkę, przyjmie wartość inną niż None.
 
-        koniec = lista_id_wierzcholkow.index(nid_b) if nid_a != nid_b else None
+        koniec = A.node_index[nid_b] if nid_b is not None and nid_a != nid_b else None
         sciezka = list()
 
+        # Wartości A[koniec, k] dla hipergałęzi wierzchołka końcowego, do sprawdzania czy jest on sąsiadem.
+
+        kolumny_konca = dict(zip(*[x.tolist() for x in A.get_row(nid_b)])) if koniec is not None else dict()
+
         # Ustawianie zmiennej poprzedników. Jest to słownik, którego kluczami są indeksy elementów, a w wartości pod danym kluczem można znaleźć indeksy poprzedników tych elementów.
 
         poprzednicy = dict()
 
-        # Ustawianie zmiennej zawierającej indeksy nieodwiedzonych wierzchołków.
+        ilosc_nieodwiedzonych = ilosc_wierzcholkow
 
-        nieodwiedzone = set(range(ilosc_wierzcholkow))
+        kopiec = [(0.0, start)]
 
         if evo:
             hgobj.deactivate_all()
 
         # Algorytm Dijkstry dostosowany do hipergrafu.
 
-        while len(nieodwiedzone) > 0:  # dla każdego wierzchołka
-            aktualny_wierzcholek = s.argmin()
+        while ilosc_nieodwiedzonych > 0:  # dla każdego wierzchołka
+            aktualny_wierzcholek = None
+
+            while kopiec:
+                odl, w = heapq.heappop(kopiec)
+
+                if not odwiedzone[w] and odl == s[w]:
+                    aktualny_wierzcholek = w
+                    break
+
+            if aktualny_wierzcholek is None:
+                # Brak osiągalnych wierzchołków - tak jak argmin na tablicy samych nieskończoności wybierany jest indeks 0.
+                aktualny_wierzcholek = 0
 
             if evo:
                 id_akt_w = lista_id_wierzcholkow[aktualny_wierzcholek]
@@ -163,37 +185,81 @@ class HgMatrixAnalyzer:
 
                 sciezka.reverse()
                 print('\tŚcieżka:\n\t\t{}'.format(sciezka))
-                
+
                 if evo:
                     hgobj.deactivate_all()
-                
+
                 break
 
-            if s.mask[aktualny_wierzcholek]:
+            if odwiedzone[aktualny_wierzcholek]:
                 break
 
-            # print('\nRozpatrywanie wierzchołka {}.'.format(aktualny_wierzcholek))
+            # Kandydaci do relaksacji: dla każdej hipergałęzi k aktualnego wierzchołka - jej wierzchołki j,
+            # dla których A[j, k] >= A[aktualny, k]. Wierzchołki w kolumnie są w kolejności rosnących wartości A.
+            # Sąsiedzi (P[aktualny, j] > 0): inne wierzchołki hiperkrawędzi, dalsze wierzchołki hiperłuku,
+            # a sam wierzchołek aktualny, jeśli należy do hiperpętli.
 
-            lista_dostepnosci = P[aktualny_wierzcholek]
-            # print('\tLista dostepnosci wierzchołków z tego wierzchołka:\n\t\t{}.'.format(lista_dostepnosci))
+            kolumny = [(csr_indices[e], csr_values[e]) for e in range(csr_indptr[aktualny_wierzcholek], csr_indptr[aktualny_wierzcholek + 1])]
 
-            indeksy_dostepnych = P[aktualny_wierzcholek].nonzero()[0]
-            # print('\tIndeksy dostępnych wierzchołków:\n\t\t{}.'.format(indeksy_dostepnych))
+            kandydaci = dict()
+            sasiedzi = set()
 
+            if any(hbtypes[k] == HBNode.HB_HYPERLOOP for k, a_akt in kolumny):
+                sasiedzi.add(aktualny_wierzcholek)
+                kandydaci[aktualny_wierzcholek] = [k for k, a_akt in kolumny]
 
-            for ind_dost in indeksy_dostepnych if koniec not in indeksy_dostepnych else [koniec]:
-                # print('\n\tRozpatrywanie drogi do wierzchołka {}.'.format(ind_dost))
-                # print('\t\tIlość dostępnych dróg: {}.'.format(lista_dostepnosci[ind_dost]))
+            koniec_sasiadem = False
 
-                hd = np.logical_and(A[ind_dost] >= A[aktualny_wierzcholek], A[aktualny_wierzcholek] != 0)
+            if koniec is not None:
+                for k, a_akt in kolumny:
+                    a_kon = kolumny_konca.get(k, 0)
 
-                # print('{} >= {}\nand\n{} != 0 \n-> {}'.format(A[ind_dost], A[aktualny_wierzcholek], A[aktualny_wierzcholek], hd))
-                hipergalezie_dostepne = hd.nonzero()[0]
-                # print('\t\tDostępności na hipergałęziach: {}'.format(hipergalezie_dostepne))
+                    if a_kon >= a_akt:
+                        kandydaci.setdefault(koniec, list()).append(k)
+
+                        if hbtypes[k] == HBNode.HB_HYPEREDGE or (hbtypes[k] == HBNode.HB_HYPERARC and a_kon > a_akt):
+                            koniec_sasiadem = True
+
+            if koniec_sasiadem:
+                do_relaksacji = [koniec]
+            else:
+                kandydaci.pop(koniec, None)
 
-                for ind_hg in hipergalezie_dostepne:
+                for k, a_akt in kolumny:
+                    hbtype = hbtypes[k]
+
+                    if hbtype == HBNode.HB_HYPERLOOP:
+                        continue
+
+                    od = bisect.bisect_left(csc_values, a_akt, csc_indptr[k], csc_indptr[k + 1])
+                    do = csc_indptr[k + 1]
+
+                    if pomijanie_rozpatrzonych:
+                        do = bisect.bisect_left(csc_values, rozpatrzone_od[k], od, do)
+
+                        # hipergałąź aktualnego wierzchołka zostanie rozpatrzona w całości od jego pozycji
+                        if a_akt < rozpatrzone_od[k]:
+                            rozpatrzone_od[k] = a_akt
+
+                    for e in range(od, do):
+                        j = csc_rows[e]
+
+                        if j != aktualny_wierzcholek:
+                            kandydaci.setdefault(j, list()).append(k)
+
+                            if hbtype == HBNode.HB_HYPEREDGE or hbtype == HBNode.HB_HYPERARC:
+                                sasiedzi.add(j)
+
+                do_relaksacji = sorted(sasiedzi)
+
+            for ind_dost in do_relaksacji:
+                if odwiedzone[ind_dost]:
+                    continue
+
+                for ind_hg in kandydaci.get(ind_dost, ()):
                     waga_hg = W[ind_hg]
-                    # print('\n\t\t\tHipergałąź {} ma wagę {}.'.format(ind_hg, waga_hg))
+
+                    # odległość aktualnego wierzchołka czytana jest na bieżąco - może się zmienić przez hiperpętlę o ujemnej wadze
                     if s[ind_dost] > waga_hg + s[aktualny_wierzcholek]:
                         s[ind_dost] = waga_hg + s[aktualny_wierzcholek]
                         poprzednicy[ind_dost] = {
@@ -201,15 +267,15 @@ class HgMatrixAnalyzer:
                             'h': ind_hg
                         }
 
-            # print('\n\tStan po wyjściu z wierzchołka {} to \n\t\t{}.'.format(aktualny_wierzcholek, s.data))
+                        heapq.heappush(kopiec, (s[ind_dost], ind_dost))
 
-            s.mask[aktualny_wierzcholek] = True
-            nieodwiedzone.remove(aktualny_wierzcholek)
+            odwiedzone[aktualny_wierzcholek] = True
+            ilosc_nieodwiedzonych -= 1
 
-        s.mask = np.ma.nomask
+        s = np.array(s, dtype=float)
 
-        # Pole *s.data* jest tablicą odległości obliczoną przez algorytm.
-        dists = [{'nid': lista_id_wierzcholkow[ind], 'mindist': s.data[ind]} for ind in range(s.data.shape[0])]
+        # Tablica *s* jest tablicą odległości obliczoną przez algorytm.
+        dists = [{'nid': lista_id_wierzcholkow[ind], 'mindist': s[ind]} for ind in range(s.shape[0])]
 
         return sciezka, dists
 
@@ -18,7 +18,15 @@ import time
 import pickle
 
 from Vert import Node, HBNode, Vert
+from VertStore import VertStore
+from SpatialGrid import SpatialGrid
+from KDTree import KDTree
+from IncidenceMatrix import IncidenceMatrix
+from GraphClosure import GraphClosure
+from MatrixCache import MatrixCache, structure_cache_decorator, geometry_cache_decorator
+from MatrixUpdater import MatrixUpdater
 from VertArranger import VertArranger
+from DensityRaster import DensityRaster
 from Utils import Utils
 from OCL import OCL
 
@@ -30,6 +38,46 @@ from OCL import OCL
 #  Model hipergrafu może ewoluować, na przykłąd na podstawie jakiegoś algorytmu.
 class HyperGraph(object):
 
+    ## Prędkość, poniżej której element uznawany jest za spokojny.
+    SLEEP_VELOCITY = 2.0
+
+    ## Przyspieszenie (siła / masa), poniżej którego element uznawany jest za spokojny.
+    SLEEP_ACCELERATION = 20.0
+
+    ## Ilość kolejnych spokojnych odświeżeń, po których element jest usypiany.
+    SLEEP_FRAMES = 60
+
+    ## Co ile odświeżeń siły liczone są dla wszystkich elementów, aby obudzić uśpione elementy popychane przez inne.
+    SLEEP_CHECK_INTERVAL = 30
+
+    ## Kolor zwykłych połączeń wierzchołek-hipergałąź.
+    EDGE_COLOR_NORMAL = (0.7, 0.7, 0.7)
+
+    ## Kolor połączeń, do których należy zaznaczony element.
+    EDGE_COLOR_SELECTED = (0.2, 0.2, 0.2)
+
+    ## Kolor połączeń pomiędzy wyróżnionymi elementami.
+    EDGE_COLOR_ACTIVATED = (0.8, 0.2, 0.0)
+
+    ## Typowy (medianowy) promień elementu na ekranie w pikselach, poniżej którego elementy rysowane są
+    # jako jednokolorowe kwadraty, bez okręgu i napisów.
+    LOD_RECT_RADIUS_PX = 3.0
+
+    ## Typowy promień elementu na ekranie w pikselach, poniżej którego hipergraf rysowany jest jako obraz gęstości.
+    LOD_DENSITY_RADIUS_PX = 1.0
+
+    ## Kolor wierzchołków w obrazie gęstości.
+    LOD_NODE_COLOR = (0.3, 0.7, 0.3)
+
+    ## Kolor hipergałęzi w obrazie gęstości.
+    LOD_HBNODE_COLOR = (0.3, 0.8, 0.9)
+
+    ## Minimalny promień (w pikselach) kwadratów rysowanych zamiast elementów.
+    LOD_MIN_RECT_RADIUS_PX = 1.0
+
+    ## Margines (w pikselach), o który poszerzany jest prostokąt rysowania przy wyborze widocznych połączeń.
+    EDGE_CULL_MARGIN_PX = 2.0
+
     # CREATE
 
     ## Konstruktor obiektu hipergrafu.
@@ -50,6 +98,33 @@ class HyperGraph(object):
         # Przykładowa zawartość:
         # {16: (6, 7), 17: (7, 8), 18: (8, 9), 19: (3, 8), 10: (0, 1), 11: (1, 2), 12: (2, 3), 13: (3, 4), 14: (4, 5), 15: (5, 6)}
         self.P = dict()
+
+        ## Indeks odwrotny relacji P: dla każdego wierzchołka słownik id hipergałęzi, do których należy, wraz z ich typem.
+        # Jest utrzymywany przez metody dodające, usuwające i wczytujące elementy hipergrafu,
+        # dzięki czemu wyszukiwanie hipergałęzi danego wierzchołka kosztuje O(stopień) zamiast O(|U|).
+        # Przykładowa zawartość:
+        # {0: {10: 0}, 1: {10: 0, 11: 1}, 2: {11: 1, 12: 2}}
+        self.node_hyperbranches_index = dict()
+
+        ## Magazyn stanu fizycznego (pozycje, prędkości, siły, masy, promienie, zaznaczenie) wszystkich elementów hipergrafu.
+        # Obiekty z X i U są widokami na wiersze tego magazynu.
+        self.store = VertStore()
+
+        ## Siatka przestrzenna nad pozycjami elementów, do wyszukiwania elementów w otoczeniu punktu.
+        self.spatial_grid = SpatialGrid(self.store)
+
+        ## Licznik zmian struktury hipergrafu (dodanie, usunięcie, wczytanie elementów).
+        # Wyniki macierzowe zapamiętane dla starszej wersji struktury są nieaktualne.
+        self.structure_version = 0
+
+        ## Pamięć podręczna wyników macierzowych, indeksowana wersją struktury i geometrii hipergrafu.
+        self.matrix_cache = MatrixCache()
+
+        ## Czy elementy, które przestały się poruszać, są usypiane (pomijane w symulacji).
+        self.sleep_enabled = True
+
+        ## Licznik odświeżeń symulacji.
+        self.update_counter = 0
         
         ## Zmienna zbioru nieuporządkowanego przechowująca identyfikatory wyróżnionych elementów hipergrafu.
         self.activated_id_set = set()
@@ -85,12 +160,15 @@ class HyperGraph(object):
         pd.update(self.project_properties['additional_node_properties'])
         pd.update(prop_dict)
 
-        ve = Node(name=name, pos=position, prop_dict=pd)
+        ve = Node(name=name, pos=position, prop_dict=pd, store=self.store)
+        self.spatial_grid.insert(ve)
 
         if normalize_pos:
             self.normalize_xnode_position(ve)
 
         self.X[ve.get_id()] = ve
+        self.node_hyperbranches_index.setdefault(ve.get_id(), dict())
+        self.increment_structure_version((MatrixUpdater.NODE_ADDED, ve.get_id()))
 
         # print(self)
 
@@ -103,11 +181,25 @@ class HyperGraph(object):
     # @param prop_dict Słownik właściwości do przypisania hipergałęzi.
     # @return Id nowoutworzonego obiektu.
     def add_hbnode(self, name, hbtype, position, prop_dict, normalize_pos=True):
+        hbid = self.create_hbnode(name=name, hbtype=hbtype, position=position, prop_dict=prop_dict, normalize_pos=normalize_pos)
+
+        self.increment_structure_version((MatrixUpdater.HYPERBRANCH_ADDED, hbid))
+
+        return hbid
+
+    ## Metoda tworząca i dołączająca do hipergrafu obiekt hipergałęzi, bez oznaczania zmiany struktury.
+    # @param name Nazwa hipergałęzi.
+    # @param type Typ hipergałęzi (hiperkrawędź, hiperłuk, hiperpętla).
+    # @param position Współrzędne utworzenia obiektu.
+    # @param prop_dict Słownik właściwości do przypisania hipergałęzi.
+    # @return Id nowoutworzonego obiektu.
+    def create_hbnode(self, name, hbtype, position, prop_dict, normalize_pos=True):
         pd = dict(self.project_properties['additional_xnode_properties'])
         pd.update(self.project_properties['additional_hbnode_properties'])
         pd.update(prop_dict)
 
-        hbnode = HBNode(name=name, hbtype=hbtype, pos=position, prop_dict=pd)
+        hbnode = HBNode(name=name, hbtype=hbtype, pos=position, prop_dict=pd, store=self.store)
+        self.spatial_grid.insert(hbnode)
 
         if normalize_pos:
             self.normalize_xnode_position(hbnode)
@@ -125,7 +217,7 @@ class HyperGraph(object):
     def add_hyperbranch(self, name, hbtype, nodes_id_list, prop_dict, normalize_pos=True):
         pos_com = self.get_xnodes_center_of_mass_by_xnodes_id_list(nodes_id_list)
 
-        hbid = self.add_hbnode(name=name, hbtype=hbtype, position=pos_com, prop_dict=prop_dict, normalize_pos=normalize_pos)
+        hbid = self.create_hbnode(name=name, hbtype=hbtype, position=pos_com, prop_dict=prop_dict, normalize_pos=normalize_pos)
 
         # hyperedge: P[hid] = [set(elems)]
         if hbtype == HBNode.HB_HYPEREDGE:
@@ -139,6 +231,11 @@ class HyperGraph(object):
         else:
             self.P[hbid] = list(nodes_id_list)
 
+        for nid in self.P[hbid]:
+            self.node_hyperbranches_index.setdefault(nid, dict())[hbid] = hbtype
+
+        self.increment_structure_version((MatrixUpdater.HYPERBRANCH_ADDED, hbid))
+
         hbnode = self.get_hbnode_by_id(hbid)
         hbnode.set_radius_from_degree(self.get_xnode_degree_by_xnode_id(hbid))
         hbnode.set_mass_from_degree(self.get_xnode_degree_by_xnode_id(hbid))
@@ -155,6 +252,27 @@ class HyperGraph(object):
 
     # READ
 
+    ## Metoda zwracająca wersję struktury hipergrafu.
+    # @return Licznik zmian struktury hipergrafu.
+    def get_structure_version(self):
+        return self.structure_version
+
+    ## Metoda zwracająca wersję geometrii hipergrafu.
+    # @return Licznik zmian pozycji elementów hipergrafu.
+    def get_geometry_version(self):
+        return self.store.geometry_version
+
+    ## Metoda zwracająca wersję wyglądu hipergrafu.
+    # Obraz hipergrafu narysowany dla tej samej wersji (i tego samego przesunięcia i powiększenia) jest aktualny.
+    # @return Krotka (wersja struktury, wersja geometrii, wersja wyglądu elementów).
+    def get_scene_version(self):
+        return self.structure_version, self.store.geometry_version, self.store.appearance_version
+
+    ## Metoda zwracająca statystyki pamięci podręcznej wyników macierzowych.
+    # @return Słownik ze statystykami (trafienia, chybienia, usunięcia, zajętość).
+    def get_matrix_cache_stats(self):
+        return self.matrix_cache.get_stats()
+
     ## Metoda zwracająca obiekt wizualnie reprezentujący element hipergrafu po jego id.
     # Może być to wierzchołek lub hipergałąź.
     # @param xid Id elementu.
@@ -321,6 +439,12 @@ class HyperGraph(object):
     def get_hyperbranch_by_id(self, hid):
         return self.P[hid]  # e.g. (4,5,6) or {1,2,3}
 
+    ## Metoda zwracająca numery wierszy magazynu stanu dla danych elementów hipergrafu.
+    # @param xid_list Lista id elementów.
+    # @return Tablica NumPy z numerami wierszy w magazynie self.store.
+    def get_xnodes_rows_by_id(self, xid_list):
+        return VertStore.get_rows_of_verts([self.get_xnode_by_id(xid) for xid in xid_list])
+
     ## Metoda zwracająca id wszystkich elementów hipergrafu.
     # Nie jest istotny typ elementu, może to być wierzchołek lub hipergałąź.
     # @return Lista id wszystkich elementów w hipergrafie.
@@ -378,15 +502,24 @@ class HyperGraph(object):
     # @param hbtype Opcjonalny typ hipergałęzi, do filtrowania.
     # @return Lista id hipergałęzi, do których wierzchołek należy.
     def get_all_hyperbranches_id_by_node_id(self, nid, hbtype=None):
-        hbid_list = self.get_all_hyperbranches_id()
-        hbid_by_id_list = []
+        hbid_types_dict = self.node_hyperbranches_index.get(nid, dict())
 
-        for hbid in hbid_list:
-            if nid in self.get_hyperbranch_by_id(hbid) and (hbtype is None or self.get_hbnode_by_id(hbid).get_hyperbranch_type() == hbtype):
-                hbid_by_id_list.append(hbid)
-                # yield hbid # metoda zwraca generator
+        # korzysta z indeksu odwrotnego, kolejność zgodna z kolejnością hipergałęzi w U
+        return [hbid for hbid, hbt in hbid_types_dict.items() if hbtype is None or hbt == hbtype]  # metoda zwraca liste
+
+    ## Metoda odbudowująca indeks odwrotny wierzchołek -> hipergałęzie na podstawie zmiennych X, U i P.
+    # Wywoływana po wczytaniu hipergrafu, gdy zmienne słownikowe zostały podmienione w całości.
+    def rebuild_node_hyperbranches_index(self):
+        index = dict((nid, dict()) for nid in self.X.keys())
+
+        for hbid in self.U.keys():
+            if hbid in self.P:
+                hbtype = self.get_hbnode_by_id(hbid).get_hyperbranch_type()
+
+                for nid in self.get_hyperbranch_by_id(hbid):
+                    index.setdefault(nid, dict())[hbid] = hbtype
 
-        return hbid_by_id_list  # metoda zwraca liste
+        self.node_hyperbranches_index = index
 
     ## Metoda zwracająca zbiór wierzchołków wspólny dla danych hipergałęzi.
     # @param hbid_list Lista id hipergałęzi do sprawdzenia.
@@ -396,56 +529,43 @@ class HyperGraph(object):
 
         for hbid in hbid_list:
             if hb_shared_nodes_id is None:
-                hb_shared_nodes_id = list(self.get_all_nodes_id_by_hyperbranch_id(hbid))
-                continue
-
-            nodes_id_for_hb = self.get_all_nodes_id_by_hyperbranch_id(hbid)
-
-            for nid in list(hb_shared_nodes_id):
-                if nid not in nodes_id_for_hb:
-                    if nid in hb_shared_nodes_id:
-                        hb_shared_nodes_id.remove(nid)
+                hb_shared_nodes_id = self.get_all_nodes_id_by_hyperbranch_id(hbid)
+            else:
+                hb_shared_nodes_id &= self.get_all_nodes_id_by_hyperbranch_id(hbid)
 
-        return set(hb_shared_nodes_id)
+        return hb_shared_nodes_id if hb_shared_nodes_id is not None else set()
 
     ## Metoda zwracająca Id elementu który jest na danej pozycji.
+    # Rozpatrywany jest element najbliższy danej pozycji. Kandydaci wybierani są z siatki przestrzennej
+    # (SpatialGrid.get_collision_candidates) - dalsze elementy i tak nie mogą kolidować.
     # @param pos Pozycja, która ma zostać sprawdzona w poszukiwaniu elementów.
     # @param rmul Mnożnik promienia, w którym należy szukać.
+    # @param exclude Opcjonalny zbiór id elementów, które należy pominąć.
     # @return Id elementu znajdującego się na danej pozycji.
-    def get_colliding_xnode_id_by_position(self, pos, rmul=4.0):
+    def get_colliding_xnode_id_by_position(self, pos, rmul=4.0, exclude=None):
+        if self.store.count > 0:
+            verts_list = self.spatial_grid.get_collision_candidates(pos, rmul)
 
-        all_xid = self.get_all_xnodes_id()
+            if exclude is not None:
+                verts_list = [ve for ve in verts_list if ve.get_id() not in exclude]
 
-        if len(all_xid) > 0:
+            if len(verts_list) > 0:
+                node_rows = VertStore.get_rows_of_verts(verts_list)
+                node_pos_array = self.store.position[node_rows]
+                node_radius_array = self.store.radius[node_rows]
 
-            node_id_list = all_xid
-            node_id_list.reverse()
+                node_dist_vecs = node_pos_array - [pos]
 
-            node_pos_array = np.zeros((len(node_id_list), 2))
-            node_radius_array = np.zeros(len(node_id_list))
+                sqrdists = node_dist_vecs[...,0]**2 + node_dist_vecs[...,1]**2
 
-            for i, xnode in enumerate([self.get_xnode_by_id(vid) for vid in node_id_list]):
-                node_pos_array[i] = xnode.get_position()
-                node_radius_array[i] = xnode.get_radius()
+                closestdistsqr = sqrdists.min()
 
-            node_dist_vecs = node_pos_array - [pos]
-            # norms = np.linalg.norm(node_dist_vecs, axis=1)
-            # tests = norms < (node_radius_array*rmul)
-            # selected = tests.nonzero()[0]
+                # przy równych odległościach wybierany jest element dodany później (hipergałęzie po wierzchołkach)
+                ties = np.flatnonzero(sqrdists == closestdistsqr).tolist()
+                closest = max(ties, key=lambda i: (verts_list[i].get_id() in self.U, verts_list[i].get_id()))
 
-            sqrdists = node_dist_vecs[...,0]**2 + node_dist_vecs[...,1]**2
-
-            closest = sqrdists.argmin()
-            closestdistsqr = sqrdists[closest]
-
-            selected = list()
-
-            if closestdistsqr < (node_radius_array[closest]*rmul)**2:
-                selected.append(closest)
-
-
-            if len(selected) > 0:
-                return node_id_list[selected[0]]
+                if closestdistsqr < (node_radius_array[closest]*rmul)**2:
+                    return verts_list[closest].get_id()
 
         return None
 
@@ -456,32 +576,84 @@ class HyperGraph(object):
         #         return ve.get_id()
         # return None
 
-    ## Metoda zwracająca id najbliższego elementu hipergrafu do id danego elementu.
-    # @param xid Id elementu, do którego należy wyszukać najbliższy element.
-    # @param xid_list Opcjonalna lista id elementów, z których należy korzystać. Jeśli nie jest ustawiona, przeszukiwane są wszystkie wierzchołki.
-    # @return Id najbliższego elemetu.
-    def get_closest_xnode_id_by_xnode_id(self, xid, xid_list=None):
-        # nodes = [self.get_node_by_id(nid) for nid in self.get_all_nodes_id()]
-
-        if xid_list is None:
-            node_id_list = self.get_all_xnodes_id()
+    ## Metoda sprawdzająca, czy dana pozycja nie koliduje z żadnym elementem hipergrafu.
+    # @param pos Pozycja do sprawdzenia.
+    # @param rmul Mnożnik promienia elementów.
+    # @param exclude Opcjonalny zbiór id elementów, które należy pominąć.
+    # @return True, jeśli pozycja jest wolna.
+    def is_position_free(self, pos, rmul=4.0, exclude=None):
+        return self.get_colliding_xnode_id_by_position(pos, rmul=rmul, exclude=exclude) is None
+
+    ## Metoda zwracająca id elementów, których środki leżą w danym promieniu od pozycji.
+    # @param pos Środek obszaru.
+    # @param radius Promień obszaru.
+    # @param vert_type Opcjonalny typ elementów (Vert.T_NODE lub Vert.T_HBRANCH).
+    # @param exclude Opcjonalny zbiór id elementów, które należy pominąć.
+    # @return Lista id elementów.
+    def get_xnodes_id_in_radius(self, pos, radius, vert_type=None, exclude=None):
+        verts_list = self.spatial_grid.get_verts_in_square(pos, radius)
+
+        if vert_type is not None:
+            verts_list = [ve for ve in verts_list if ve.is_of_vert_type(vert_type)]
+
+        if exclude is not None:
+            exclude = set(exclude)
+            verts_list = [ve for ve in verts_list if ve.get_id() not in exclude]
+
+        if len(verts_list) == 0:
+            return []
+
+        d = self.store.position[VertStore.get_rows_of_verts(verts_list)] - [pos]
+        inside = d[..., 0] ** 2 + d[..., 1] ** 2 <= radius ** 2
+
+        return [ve.get_id() for ve, ins in zip(verts_list, inside.tolist()) if ins]
+
+    ## Metoda zwracająca drzewo k-d nad pozycjami elementów hipergrafu danego typu.
+    # Drzewo jest zapamiętywane do zmiany struktury lub geometrii hipergrafu.
+    # Punkty drzewa są w kolejności get_all_xnodes_id (wierzchołki, potem hipergałęzie).
+    # @param vert_type Opcjonalny typ elementów (Vert.T_NODE lub Vert.T_HBRANCH), None - wszystkie elementy.
+    # @return Obiekt KDTree z id elementów.
+    @geometry_cache_decorator
+    def get_xnodes_kdtree(self, vert_type=None):
+        if vert_type == Vert.T_NODE:
+            xid_list = self.get_all_nodes_id()
+        elif vert_type == Vert.T_HBRANCH:
+            xid_list = self.get_all_hyperbranches_id()
         else:
-            node_id_list = list(xid_list)
+            xid_list = self.get_all_xnodes_id()
 
-        closest_xnode = None
+        return KDTree(self.store.position[self.get_xnodes_rows_by_id(xid_list)], ids=xid_list)
 
-        xnode = self.get_xnode_by_id(xid)
-        for nid in node_id_list:
-            if nid != xid:
-                if closest_xnode is None:
-                    closest_xnode = self.get_xnode_by_id(nid)
-                else:
-                    if xnode.distance_norm_from(self.get_xnode_by_id(nid)) < xnode.distance_norm_from(closest_xnode):
-                        closest_xnode = self.get_xnode_by_id(nid)
+    ## Metoda zwracająca id k elementów najbliższych danej pozycji.
+    # Przy równych odległościach pierwszeństwo ma element wcześniejszy w get_all_xnodes_id.
+    # @param pos Pozycja, dla której szukani są sąsiedzi.
+    # @param k Ilość szukanych elementów.
+    # @param vert_type Opcjonalny typ elementów (Vert.T_NODE lub Vert.T_HBRANCH).
+    # @param exclude Opcjonalny zbiór id elementów, które należy pominąć.
+    # @param xid_list Opcjonalna lista id elementów, do których należy ograniczyć wyszukiwanie.
+    # @return Lista id elementów posortowana od najbliższego (co najwyżej k).
+    def get_nearest_xnodes_id(self, pos, k=1, vert_type=None, exclude=None, xid_list=None):
+        tree = self.get_xnodes_kdtree(vert_type)
+        mask = tree.get_ids_mask(include=xid_list, exclude=exclude)
 
-        # print("closest to {} is {}".format(xid, closest_xnode.get_id()))
+        idx, dists = tree.query_nearest(pos, k=k, mask=mask)
 
-        return closest_xnode.get_id() if closest_xnode is not None else None
+        return [tree.ids[i] for i in idx]
+
+    ## Metoda zwracająca id najbliższego elementu hipergrafu do id danego elementu.
+    # Wyszukiwanie korzysta z drzewa k-d (get_nearest_xnodes_id).
+    # @param xid Id elementu, do którego należy wyszukać najbliższy element.
+    # @param xid_list Opcjonalna lista id elementów, z których należy korzystać. Jeśli nie jest ustawiona, przeszukiwane są wszystkie elementy.
+    # @param vert_type Opcjonalny typ elementów (Vert.T_NODE lub Vert.T_HBRANCH).
+    # @param exclude Opcjonalny zbiór id elementów, które należy pominąć.
+    # @return Id najbliższego elemetu.
+    def get_closest_xnode_id_by_xnode_id(self, xid, xid_list=None, vert_type=None, exclude=None):
+        exclude = {xid} if exclude is None else set(exclude) | {xid}
+
+        closest = self.get_nearest_xnodes_id(self.get_xnode_by_id(xid).position_vec, k=1, vert_type=vert_type,
+                                             exclude=exclude, xid_list=xid_list)
+
+        return closest[0] if len(closest) > 0 else None
 
     ## Metoda zwracająca listę zaznaczonych elementów hipergrafu.
     # @return Lista elementów zaznaczonych w kolejności zaznaczania (ostatni element zaznaczony jako ostatni).
@@ -545,104 +717,156 @@ class HyperGraph(object):
 
         return connodes_id
 
-    ## Metoda rysująca połączenie pomiędzy wierzchołkiem a hiperkrawędzią.
-    # Zajmuje ok 5% czasu CPU.
-    # @param pos1 Współrzędna punktu początku połączenia w bazie współrzędnych płaszczyzny rysowania elementów.
-    # @param pos2 Współrzędna punktu końca połączenia w bazie współrzędnych płaszczyzny rysowania elementów.
+    ## Metoda rysująca grupę połączeń jednym stylem.
+    # Wszystkie odcinki dodawane są do jednej ścieżki, rysowanej jednym wywołaniem stroke,
+    # więc kolor i grubość linii ustawiane są raz na grupę, a nie dla każdego połączenia.
+    # @param p1_list Tablica punktów początków połączeń (N x 2) w bazie współrzędnych ekranu.
+    # @param p2_list Tablica punktów końców połączeń (N x 2) w bazie współrzędnych ekranu.
     # @param cro Kontekst rysowania biblioteki Cairo.
-    # @param pan_vec Wektor przesunięcia punktu środka płaszczyzny rysowania elementów w stosunku do lewego górnego rogu ekranu.
-    # @param center Punkt środka ekranu w bazie współrzędnych ekranu.
-    # @param zoom Współczynnik powiększenia płaszczyzny rysowania elementów w stosunku do bazy współrzędnych ekranu.
-    # Im większy tym większe rysowane są elementy na ekranie.
-    # @param color Kolor połączenia.
+    # @param color Kolor połączeń.
     @staticmethod
-    def draw_edge(v1pos_zoomed, v2pos_zoomed, cro, zoom, color=None):
-        if color is None:
-            color = (0.7, 0.7, 0.7)
+    def draw_edges_batch(p1_list, p2_list, cro, color):
+        if len(p1_list) == 0:
+            return
 
         cro.set_source_rgb(*color)
         cro.set_line_width(1.0)
 
-        cro.move_to(v1pos_zoomed[0], v1pos_zoomed[1])
-        cro.line_to(v2pos_zoomed[0], v2pos_zoomed[1])
+        for (x1, y1), (x2, y2) in zip(p1_list.tolist(), p2_list.tolist()):
+            cro.move_to(x1, y1)
+            cro.line_to(x2, y2)
 
         cro.stroke()
 
-    ## Metoda rysująca hipergraf na płótnie rysowania.
-    # Zajmuje ok 15% czasu CPU.
-    # Rysuje wszystkie połączenia, wierzchołki i hipergałęzie a także dodatkowe informacje,
-    # na przykład osiągalność z ostatnio zaznaczonego wierzchołka
-    # lub pogrubienie połączenia, jeśli zaznaczony element do niego należy.
+    ## Metoda rysująca elementy jako jednokolorowe kwadraty (przy małym powiększeniu).
+    # Elementy grupowane są według koloru tła, a każda grupa wypełniana jest jednym wywołaniem fill.
+    # @param rows Tablica numerów wierszy magazynu rysowanych elementów.
+    # @param mapped_pos_list Tablica pozycji wszystkich elementów w bazie współrzędnych ekranu.
+    # @param radius_zoomed_list Tablica promieni wszystkich elementów na ekranie.
     # @param cro Kontekst rysowania biblioteki Cairo.
-    # @param dt Stałą czasowa, odstęp pomiędzy rysowaniem.
-    # @param pan_vec Wektor przesunięcia punktu środka płaszczyzny rysowania elementów w stosunku do lewego górnego rogu ekranu.
-    # Wyrażony w bazie płaszczyzny rysowania elementów (nie ekranu!)
-    # @param center Punkt środka ekranu w bazie współrzędnych ekranu.
-    # @param zoom Współczynnik powiększenia płaszczyzny rysowania elementów w stosunku do bazy współrzędnych ekranu.
-    # Im większy tym większe rysowane są elementy na ekranie.
-    def draw(self, cro, pan_vec, center, zoom):
-        tstart = time.time()
+    def draw_xnodes_rects(self, rows, mapped_pos_list, radius_zoomed_list, cro):
+        verts = self.store.verts
+        rows_by_color = dict()
 
-        all_xnodes_id = self.get_all_xnodes_id()
+        for row in rows.tolist():
+            rows_by_color.setdefault(verts[row].get_draw_colors()[1], list()).append(row)
 
-        if len(all_xnodes_id) > 0:
-            all_xnodes = [self.get_xnode_by_id(xid) for xid in all_xnodes_id]
-            all_xnodes_pos = [x.get_position() for x in all_xnodes]
+        for color, color_rows in rows_by_color.items():
+            cro.set_source_rgb(*color)
 
-            all_xnodes_mapped_pos = Utils.map_pos_list_canvas_to_screen(all_xnodes_pos, center, zoom, pan_vec)
-            all_xnodes_mapped_pos_dict = dict()
+            half = np.maximum(radius_zoomed_list[color_rows], HyperGraph.LOD_MIN_RECT_RADIUS_PX)
+            corners = mapped_pos_list[color_rows] - half[:, None]
 
-            # is_node_visible_list = [(pos_mapped < center * 2).all() and (pos_mapped > 0).all() for pos_mapped in all_xnodes_mapped_pos]
-            is_node_visible_list = np.logical_and(
-                np.less( all_xnodes_mapped_pos, (center * 2) ),
-                np.greater( all_xnodes_mapped_pos, 0 )
-            )
-            is_node_visible_list = np.logical_and(is_node_visible_list[:,0], is_node_visible_list[:,1])
-            is_node_visible_dict = dict()
+            for (x, y), h in zip(corners.tolist(), half.tolist()):
+                cro.rectangle(x, y, 2 * h, 2 * h)
+
+            cro.fill()
 
-            for i, xid in enumerate(all_xnodes_id):
-                all_xnodes_mapped_pos_dict[xid] = all_xnodes_mapped_pos[i]
-                is_node_visible_dict[xid]       = is_node_visible_list[i]
+    ## Metoda zwracająca i czyszcząca obszary płótna zmienione od ostatniego wywołania.
+    # Obszar zmienionego elementu to jego prostokąt przed zmianą i po niej, a także prostokąty
+    # otaczające jego połączenia (przed zmianą i po niej, bo zmienia się ich położenie lub kolor).
+    # @return Tablica prostokątów (N x 4: x0, y0, x1, y1) w bazie płótna
+    # lub None, jeśli były zmiany, których nie da się przypisać do elementów (należy odświeżyć cały widok).
+    def pop_damage_rects(self):
+        st = self.store
+        n = st.count
 
-            all_hyperbranches_id = self.get_all_hyperbranches_id()
-            # all_hbnodes = [self.get_hbnode_by_id(xid) for xid in all_hyperbranches_id]
+        damaged, untracked = st.pop_damage()
 
-            all_edges_nodes_id_pairs = list()
-            all_edges_nodes_pos_pairs = list()
-            is_edge_visible_list = list()
-            is_edge_visible_dict = dict()
+        if untracked:
+            return None
 
-            for hid in all_hyperbranches_id:
-                all_nodes_id_for_hbnode = self.get_all_nodes_id_by_hyperbranch_id(hid)
+        rows = np.fromiter((row for row in damaged.keys() if row < n), dtype=np.intp)
 
-                for nid in all_nodes_id_for_hbnode:
-                    all_edges_nodes_id_pairs.append((hid, nid))
+        if len(rows) == 0:
+            return np.zeros((0, 4))
 
-            if len(all_edges_nodes_id_pairs) > 0:
-                all_edges_nodes_pos_pairs = np.array([[all_xnodes_mapped_pos_dict[h], all_xnodes_mapped_pos_dict[n]] for h, n in all_edges_nodes_id_pairs], dtype=np.float)
+        old_position = np.array(st.position[:n])
+        old_extent = np.array(st.extent[:n])
+        old_position[rows] = [damaged[row][0] for row in rows]
+        old_extent[rows] = [damaged[row][1] for row in rows]
 
-                p0 = center
-                p1 = all_edges_nodes_pos_pairs[:,0,:]
-                p2 = all_edges_nodes_pos_pairs[:,1,:]
+        rects = list()
 
-                # test na widocznosc linii z rownania na odleglosc punktu p0 od prostej danej parą punktów (p1, p2)
-                ddl = np.abs((p2[:,1] - p1[:,1]) * p0[0] - (p2[:,0] - p1[:,0]) * p0[1] + p2[:,0] * p1[:,1] - p1[:,0] * p2[:,1])
-                ddm = np.sqrt( (p2[:,1] - p1[:,1]) ** 2 + (p2[:,0] - p1[:,0]) ** 2)
+        for position, extent in ((old_position, old_extent), (st.position[:n], st.extent[:n])):
+            rects.append(np.hstack((position[rows] - extent[rows], position[rows] + extent[rows])))
 
-                dd = ddl/ddm
+        is_damaged = np.zeros(n, dtype=bool)
+        is_damaged[rows] = True
 
-                in_the_same_quarter = np.logical_and(np.equal(np.less(p1[:,0], p0[0]), np.less(p2[:,0], p0[0])), np.equal(np.less(p1[:,1], p0[1]), np.less(p2[:,1], p0[1])))
+        hb_rows, node_rows = self.get_edges_store_rows()
+        edges = np.flatnonzero(np.logical_or(is_damaged[hb_rows], is_damaged[node_rows]))
 
-                is_edge_visible_list = np.logical_and(np.less(dd, max(*center)*1.5), np.logical_not(in_the_same_quarter))
-                # print(dd)
-                # print(is_edge_visible_list)
+        for position in (old_position, st.position[:n]):
+            p1 = position[hb_rows[edges]]
+            p2 = position[node_rows[edges]]
+            rects.append(np.hstack((np.minimum(p1, p2), np.maximum(p1, p2))))
 
-            for i, pair in enumerate(all_edges_nodes_id_pairs):
-                is_edge_visible_list[i] = is_node_visible_dict[pair[0]] or is_node_visible_dict[pair[1]] or is_edge_visible_list[i]
-                is_edge_visible_dict[pair] = is_edge_visible_list[i]
+        return np.vstack(rects)
 
-            num_nodes_visible = np.count_nonzero(is_node_visible_list)
-            num_edges_visible = np.count_nonzero(is_edge_visible_list)
+    ## Metoda wybierająca elementy i połączenia widoczne w prostokącie rysowania.
+    # Element jest widoczny, jeśli jego prostokąt (razem z etykietami) przecina prostokąt rysowania,
+    # a połączenie - jeśli odcinek pomiędzy jego końcami przecina ten prostokąt (Utils.clip_segments_to_rect).
+    # Połączenia brane są z zapamiętanych tablic get_edges_store_rows, więc nie jest potrzebne przejście po P.
+    # @param mapped_pos_list Tablica pozycji wszystkich elementów w bazie współrzędnych ekranu.
+    # @param extent_zoomed_list Tablica połówek wymiarów wszystkich elementów (N x 2) na ekranie.
+    # @param rect Prostokąt rysowania (x0, y0, x1, y1) w bazie współrzędnych ekranu.
+    # @return Krotka (tablica numerów wierszy widocznych elementów, tablica numerów widocznych połączeń).
+    def get_visible_rows_and_edges(self, mapped_pos_list, extent_zoomed_list, rect):
+        rect_p0 = np.array(rect[:2], dtype=np.double)
+        rect_p1 = np.array(rect[2:], dtype=np.double)
+
+        rows_visible = np.flatnonzero(np.logical_and(
+            np.all(mapped_pos_list + extent_zoomed_list > rect_p0, axis=1),
+            np.all(mapped_pos_list - extent_zoomed_list < rect_p1, axis=1)
+        ))
+
+        hb_rows, node_rows = self.get_edges_store_rows()
+
+        if len(hb_rows) == 0:
+            return rows_visible, np.zeros(0, dtype=np.intp)
+
+        # prostokąt poszerzony o grubość linii, aby nie gubić połączeń biegnących wzdłuż jego brzegu
+        margin = HyperGraph.EDGE_CULL_MARGIN_PX
+        inside, t0, t1 = Utils.clip_segments_to_rect(mapped_pos_list[hb_rows], mapped_pos_list[node_rows],
+                                                     (rect_p0[0] - margin, rect_p0[1] - margin,
+                                                      rect_p1[0] + margin, rect_p1[1] + margin))
+
+        return rows_visible, np.flatnonzero(inside)
+
+    ## Metoda rysująca hipergraf na płótnie rysowania.
+    # Zajmuje ok 15% czasu CPU.
+    # Rysuje wszystkie połączenia, wierzchołki i hipergałęzie a także dodatkowe informacje,
+    # na przykład osiągalność z ostatnio zaznaczonego wierzchołka
+    # lub pogrubienie połączenia, jeśli zaznaczony element do niego należy.
+    # Sposób rysowania zależy od typowego promienia elementu na ekranie (poziomy szczegółowości):
+    #  - pełny - okręgi z napisami (Vert.draw),
+    #  - od LOD_RECT_RADIUS_PX w dół - elementy jako jednokolorowe kwadraty,
+    #  - od LOD_DENSITY_RADIUS_PX w dół - zwykłe elementy i połączenia jako jeden obraz gęstości (DensityRaster).
+    # @param cro Kontekst rysowania biblioteki Cairo.
+    # @param dt Stałą czasowa, odstęp pomiędzy rysowaniem.
+    # @param pan_vec Wektor przesunięcia punktu środka płaszczyzny rysowania elementów w stosunku do lewego górnego rogu ekranu.
+    # Wyrażony w bazie płaszczyzny rysowania elementów (nie ekranu!)
+    # @param center Punkt środka ekranu w bazie współrzędnych ekranu.
+    # @param zoom Współczynnik powiększenia płaszczyzny rysowania elementów w stosunku do bazy współrzędnych ekranu.
+    # Im większy tym większe rysowane są elementy na ekranie.
+    def draw(self, cro, pan_vec, center, zoom):
+        tstart = time.time()
+
+        st = self.store
+        n = st.count
+
+        if n > 0:
+            # pozycje wszystkich elementów brane są bezpośrednio z magazynu, indeksowane numerami wierszy
+            all_xnodes_mapped_pos = Utils.map_pos_list_canvas_to_screen(st.position[:n], center, zoom, pan_vec)
+
+            # rysowany jest tylko obszar przycięcia - cały ekran albo odświeżany fragment (np. po zmianie kilku elementów)
+            rows_visible, edges_visible = self.get_visible_rows_and_edges(all_xnodes_mapped_pos, st.extent[:n] * zoom,
+                                                                          cro.clip_extents())
+            edges_hb_rows, edges_node_rows = self.get_edges_store_rows()
+
+            num_nodes_visible = len(rows_visible)
+            num_edges_visible = len(edges_visible)
             num_drawables_visible = num_nodes_visible + num_edges_visible
 
             if num_drawables_visible >= 5000:
@@ -655,28 +879,57 @@ class HyperGraph(object):
                 cro.set_tolerance(0.5)
                 cro.set_antialias(cairo.ANTIALIAS_GRAY)  # ANTIALIAS_NONE
 
-            for hid, nid in all_edges_nodes_id_pairs:
-                hbpos_zoomed = all_xnodes_mapped_pos_dict[hid]
-                npos_zoomed = all_xnodes_mapped_pos_dict[nid]
-
-                # if len(all_xnodes_id) < 1536 or is_node_visible_dict[hid] or is_node_visible_dict[nid]:
-                if is_edge_visible_dict[(hid, nid)]:
-                # if is_edge_visible_dict[(hid, nid)]:
-                    ecolor = None
-
-                    if nid in self.activated_id_set and hid in self.activated_id_set:
-                        ecolor = (0.8, 0.2, 0.0)
-                    else:
-                        if hid in self.selected_id_list or nid in self.selected_id_list:
-                            ecolor = (0.2, 0.2, 0.2)
-
-                    self.draw_edge(hbpos_zoomed, npos_zoomed, cro, zoom, color=ecolor)
-
-            for ve in all_xnodes:
-                pos_mapped = all_xnodes_mapped_pos_dict[ve.get_id()]
-
-                if is_node_visible_dict[ve.get_id()]:  # if on screen
-                    ve.draw(cro, pos_mapped, zoom)
+            is_activated_list = np.zeros(n, dtype=bool)
+            is_activated_list[self.get_xnodes_rows_by_id([xid for xid in self.activated_id_set if self.get_xnode_by_id(xid) is not None])] = True
+            is_selected_list = st.selected[:n]
+
+            # style połączeń jako maski - połączenia każdego stylu rysowane są jedną ścieżką,
+            # wyróżnione na wierzchu zaznaczonych, a zaznaczone na wierzchu zwykłych
+            vis_hb_rows = edges_hb_rows[edges_visible]
+            vis_node_rows = edges_node_rows[edges_visible]
+            edge_activated = np.logical_and(is_activated_list[vis_node_rows], is_activated_list[vis_hb_rows])
+            edge_selected = np.logical_and(np.logical_or(is_selected_list[vis_hb_rows], is_selected_list[vis_node_rows]),
+                                           np.logical_not(edge_activated))
+            edge_normal = np.logical_not(np.logical_or(edge_activated, edge_selected))
+
+            radius_zoomed = st.radius[:n] * zoom
+            lod_radius = np.median(radius_zoomed)
+
+            if lod_radius < HyperGraph.LOD_DENSITY_RADIUS_PX:
+                # bardzo małe powiększenie - zwykłe elementy i połączenia jako jeden obraz gęstości,
+                # a na nim zaznaczone i wyróżnione elementy i połączenia
+                is_special_list = np.logical_or(is_selected_list, is_activated_list)
+                rows_normal = np.flatnonzero(np.logical_not(is_special_list))
+
+                is_hb_list = np.zeros(n, dtype=bool)
+                is_hb_list[self.get_incidence_store_rows()[1]] = True
+                node_colors = np.where(is_hb_list[rows_normal, None], HyperGraph.LOD_HBNODE_COLOR, HyperGraph.LOD_NODE_COLOR)
+
+                DensityRaster.draw(cro, center * 2,
+                                   all_xnodes_mapped_pos[vis_hb_rows[edge_normal]],
+                                   all_xnodes_mapped_pos[vis_node_rows[edge_normal]],
+                                   HyperGraph.EDGE_COLOR_NORMAL,
+                                   all_xnodes_mapped_pos[rows_normal], radius_zoomed[rows_normal], node_colors)
+
+                edge_styles = ((edge_selected, HyperGraph.EDGE_COLOR_SELECTED),
+                               (edge_activated, HyperGraph.EDGE_COLOR_ACTIVATED))
+                rows_drawn = rows_visible[is_special_list[rows_visible]]
+            else:
+                edge_styles = ((edge_normal, HyperGraph.EDGE_COLOR_NORMAL),
+                               (edge_selected, HyperGraph.EDGE_COLOR_SELECTED),
+                               (edge_activated, HyperGraph.EDGE_COLOR_ACTIVATED))
+                rows_drawn = rows_visible
+
+            for style_mask, ecolor in edge_styles:
+                self.draw_edges_batch(all_xnodes_mapped_pos[vis_hb_rows[style_mask]],
+                                      all_xnodes_mapped_pos[vis_node_rows[style_mask]],
+                                      cro, ecolor)
+
+            if lod_radius < HyperGraph.LOD_RECT_RADIUS_PX:
+                self.draw_xnodes_rects(rows_drawn, all_xnodes_mapped_pos, radius_zoomed, cro)
+            else:
+                for row in rows_drawn:  # if on screen
+                    st.verts[row].draw(cro, all_xnodes_mapped_pos[row], zoom)
 
             tend = time.time()
             #print("drawn   \t{0} xnodes, \t{1} edges,   \tin {2:.5f}s, \t{3:.1f} 1/s".format(num_nodes_visible, num_edges_visible, tend-tstart, 1.0/(tend-tstart)))
@@ -736,7 +989,10 @@ class HyperGraph(object):
     # @param xnode Element hipergrafu, którego pozycja ma być znormalizowana.
     def normalize_xnode_position(self, xnode, rmul=1.5):
         radius = 100
-        while self.get_colliding_xnode_id_by_position(xnode.get_position(), rmul=rmul) is not None:
+        # element może już należeć do magazynu hipergrafu - nie koliduje sam ze sobą
+        exclude = {xnode.get_id()}
+
+        while not self.is_position_free(xnode.get_position(), rmul=rmul, exclude=exclude):
             # print("can't place here, colliding node")
             xnode.translate_by_vec((rnd.randrange(int(radius)) - radius/2, rnd.randrange(int(radius)) - radius/2))
             radius *= 1.5
@@ -749,81 +1005,213 @@ class HyperGraph(object):
     ## Metoda odświeżająca wszystkie wierzchołki i hipergałęzie hipergrafu.
     # @param dt Czas pomiędzy kolejnymi odświeżeniami.
     def update_all_xnodes(self, dt):
-        verts_id_list = self.get_all_xnodes_id()
+        st = self.store
+        n = st.count
         
-        if len(verts_id_list) > 0:
-            verts_list = [self.get_xnode_by_id(xid) for xid in verts_id_list]
-            
-            verts_f = np.array([v.force_vec for v in verts_list])
-            verts_m = [v.get_mass() for v in verts_list]
-            verts_v = np.array([v.get_velocity() for v in verts_list])
-            verts_p = np.array([v.get_position() for v in verts_list])
+        if n > 0:
+            verts_f = st.force[:n]
+            verts_m = st.mass[:n]
+            verts_v = st.velocity[:n]
+            verts_p = st.position[:n]
             
-            newa = (verts_f / np.array((verts_m, verts_m)).transpose())
+            newa = verts_f / verts_m[:, np.newaxis]
             newv = verts_v + newa * dt
             newp = verts_p + newv * dt
 
-            for i, ve in enumerate(verts_list):
-                if not ve.is_selected():
-                    ve.set_acceleration(newa[i])
-                    ve.set_velocity(newv[i])
-                    ve.set_position(newp[i])
-                    ve.force_vec *= 0
+            # elementy zaznaczone i uśpione nie są przesuwane
+            free = np.logical_not(np.logical_or(st.selected[:n], st.sleeping[:n]))
+            verts_f[st.sleeping[:n]] = 0.0
+
+            st.acceleration[:n][free] = newa[free]
+            verts_v[free] = newv[free]
+            verts_p[free] = newp[free]
+            verts_f[free] = 0.0
+
+            st.touch_geometry()
 
             # wersja wolniejsza, niezwektoryzowana
             # for ve in verts_list:
             #    ve.update(dt)
 
+    ## Metoda budząca dane elementy hipergrafu.
+    # @param xid_list Lista id elementów.
+    def wake_xnodes_by_id(self, xid_list):
+        xid_list = [xid for xid in xid_list if xid in self.X or xid in self.U]
+
+        if len(xid_list) > 0:
+            self.store.wake(self.get_xnodes_rows_by_id(xid_list))
+
+    ## Metoda wyznaczająca elementy, dla których w tym odświeżeniu liczone są siły.
+    # Najpierw budzeni są sąsiedzi (przez incydencję) elementów poruszonych - przesuniętych poza symulacją
+    # lub poruszających się szybciej niż SLEEP_VELOCITY. Co SLEEP_CHECK_INTERVAL odświeżeń siły liczone są
+    # dla wszystkich elementów, aby wykryć uśpione elementy popychane przez inne.
+    # @param inc_hb_rows Wiersze magazynu hipergałęzi kolejnych incydencji.
+    # @param inc_node_rows Wiersze magazynu wierzchołków kolejnych incydencji.
+    # @return Tablica flag elementów nieuśpionych (wiersze magazynu) lub None, jeśli siły liczone są dla wszystkich.
+    def get_awake_mask(self, inc_hb_rows, inc_node_rows):
+        st = self.store
+        n = st.count
+
+        self.update_counter += 1
+
+        if not self.sleep_enabled:
+            return None
+
+        v = st.velocity[:n]
+        moving = np.logical_or(st.disturbed[:n], v[:, 0] ** 2 + v[:, 1] ** 2 >= HyperGraph.SLEEP_VELOCITY ** 2)
+        restless = np.logical_and(moving, np.logical_not(st.sleeping[:n]))
+
+        st.wake(inc_node_rows[restless[inc_hb_rows]])
+        st.wake(inc_hb_rows[restless[inc_node_rows]])
+        st.disturbed[:n] = False
+
+        sleeping = st.sleeping[:n]
+
+        if self.update_counter % HyperGraph.SLEEP_CHECK_INTERVAL == 0 or not sleeping.any():
+            return None
+
+        return np.logical_not(sleeping)
+
+    ## Metoda budząca uśpione elementy, na które działa duża siła wypadkowa.
+    # Wywoływana po policzeniu sił dla wszystkich elementów.
+    def wake_pushed_xnodes(self):
+        st = self.store
+        n = st.count
+
+        if not self.sleep_enabled:
+            return
+
+        f = st.force[:n]
+        acc2 = (f[:, 0] ** 2 + f[:, 1] ** 2) / st.mass[:n] ** 2
+
+        st.wake(np.flatnonzero(np.logical_and(st.sleeping[:n], acc2 >= HyperGraph.SLEEP_ACCELERATION ** 2)))
+
+    ## Metoda usypiająca elementy, które przez SLEEP_FRAMES kolejnych odświeżeń prawie się nie poruszały.
+    # Uśpione elementy zatrzymywane są w miejscu.
+    def update_sleep_state(self):
+        st = self.store
+        n = st.count
+
+        if not self.sleep_enabled:
+            return
+
+        awake = np.logical_not(st.sleeping[:n])
+        v = st.velocity[:n]
+        a = st.acceleration[:n]
+
+        calm = np.logical_and(v[:, 0] ** 2 + v[:, 1] ** 2 < HyperGraph.SLEEP_VELOCITY ** 2,
+                              a[:, 0] ** 2 + a[:, 1] ** 2 < HyperGraph.SLEEP_ACCELERATION ** 2)
+
+        st.calm_frames[:n] = np.where(awake, np.where(calm, st.calm_frames[:n] + 1, 0), st.calm_frames[:n])
+
+        falling_asleep = np.logical_and(awake, st.calm_frames[:n] >= HyperGraph.SLEEP_FRAMES)
+
+        st.sleeping[:n] |= falling_asleep
+        v[falling_asleep] = 0.0
+        a[falling_asleep] = 0.0
+
+    ## Metoda zwracająca ilość nieuśpionych elementów hipergrafu.
+    # @return Ilość elementów, dla których liczone są siły.
+    def get_awake_xnodes_count(self):
+        return int(np.count_nonzero(np.logical_not(self.store.sleeping[:self.store.count])))
+
+    ## Metoda zwracająca całkowitą energię kinetyczną elementów hipergrafu.
+    # Elementy zaznaczone nie są przesuwane, więc nie są brane pod uwagę.
+    # @return Suma m * v^2 / 2 po elementach niezaznaczonych.
+    def get_kinetic_energy(self):
+        st = self.store
+        n = st.count
+
+        free = np.logical_not(st.selected[:n])
+        v = st.velocity[:n][free]
+
+        return float(0.5 * np.sum(st.mass[:n][free] * (v[:, 0] ** 2 + v[:, 1] ** 2)))
+
     ## Metoda odświeżająca hipergraf.
     # @param dt Czas pomiędzy kolejnymi odświeżeniami.
-    def update(self, dt):
+    # @param theta Opcjonalny kąt otwarcia drzewa Barnes-Hut dla układania hipergałęzi (None - obliczenia dokładne).
+    # @param verbose Czy wypisywać czas odświeżenia.
+    def update(self, dt, theta=None, verbose=True):
         tstart = time.time()
 
         hbid_list = self.get_all_hyperbranches_id()
         xid_list = self.get_all_xnodes_id()
 
+        st = self.store
+
+        # Pary HB --- V i V --- V in HB wszystkich hipergałęzi brane są z płaskich tablic macierzy incydencji,
+        # więc oba przebiegi liczone są jednym wektorowym wywołaniem zamiast osobno dla każdej hipergałęzi.
+        incidence = self.get_incidence_matrix()
+        node_rows, hb_rows = self.get_incidence_store_rows()
+
+        inc_hb_rows = hb_rows[incidence.cols]
+        inc_node_rows = node_rows[incidence.rows]
+
+        # elementy nieuśpione (wiersze magazynu) - siły liczone są tylko dla nich, None - dla wszystkich
+        awake = self.get_awake_mask(inc_hb_rows, inc_node_rows)
+
         # HB --- HB - złożoność liniowa w stosunku do ilości hipergałęzi.
         ## Układanie hipergałęzi w pewnej odległości od siebie.
         VertArranger.arrange_all(hgobj=self,
                                  xid_list=hbid_list,
                                  k=0,
-                                 grav=-1*10**7 )
+                                 grav=-1*10**7,
+                                 theta=theta,
+                                 active=awake[hb_rows] if awake is not None else None )
 
         # HB --- V
-        for hbid in hbid_list:
-            nids_for_hbid = list(self.get_all_nodes_id_by_hyperbranch_id(hbid))
-            # hid_list = []
-            nid_list = []
-            for nid in nids_for_hbid:
-                # hid_list.append(hbid)
-                nid_list.append(nid)
-
-                # nid_pairs_for_hbid.append((hbid, nid))
-
-            ## Układanie par wierzchołek-hipergałąź - złożoność liniowa w stosunku do ilości wierzchołków niewolnych.
-            VertArranger.arrange_pairs_list(hgobj=self,
-                                            list1=[hbid]*len(nid_list),
-                                            list2=nid_list,
-                                            u_mul=3,
-                                            k=2*10**6,
-                                            grav=-2*10**6 )
-
-            # V --- V in HB
-            ## Układanie wierzchołków w pewnej odległości od siebie w danej hipergałęzi
-            # Powoduje duży narzut obliczeniowy (duża złożoność).
-            VertArranger.arrange_all(hgobj=self,
-                                    xid_list=nids_for_hbid,
-                                    u_mul=7,
-                                    k=0 * 10 ** 1,
-                                    grav=-1*10**6 )
-
-
-        VertArranger.apply_drag_force(self, xid_list, drag=2 * 10 ** 3)
+        ## Układanie par wierzchołek-hipergałąź - złożoność liniowa w stosunku do ilości wierzchołków niewolnych.
+        if awake is not None:
+            pair_active = np.logical_or(awake[inc_hb_rows], awake[inc_node_rows])
+            inc_hb_rows = inc_hb_rows[pair_active]
+            inc_node_rows = inc_node_rows[pair_active]
+
+        VertArranger.arrange_pairs_rows(st,
+                                        l1_rows=inc_hb_rows,
+                                        l2_rows=inc_node_rows,
+                                        u_mul=3,
+                                        k=2*10**6,
+                                        grav=-2*10**6 )
+
+        # V --- V in HB
+        ## Układanie wierzchołków w pewnej odległości od siebie w danej hipergałęzi
+        # Powoduje duży narzut obliczeniowy (duża złożoność).
+        columns = None
+
+        if awake is not None:
+            # tylko hipergałęzie, które mają choć jeden nieuśpiony wierzchołek
+            active_columns = np.zeros(len(hb_rows), dtype=bool)
+            active_columns[incidence.cols[awake[node_rows[incidence.rows]]]] = True
+            columns = np.flatnonzero(active_columns)
+
+        pi, pj, pcols = incidence.get_column_pairs(columns)
+        pair_active = pi != pj
+
+        if awake is not None:
+            pair_active = np.logical_and(pair_active, awake[node_rows[incidence.rows[pi]]])
+
+        VertArranger.arrange_segmented_pairs_rows(st,
+                                                  l1_rows=node_rows[incidence.rows[pi[pair_active]]],
+                                                  l2_rows=node_rows[incidence.rows[pj[pair_active]]],
+                                                  u_mul=7,
+                                                  k=0 * 10 ** 1,
+                                                  grav=-1*10**6 )
+
+        if awake is None:
+            self.wake_pushed_xnodes()
+            drag_rows = np.arange(st.count, dtype=np.intp)
+        else:
+            drag_rows = np.flatnonzero(awake)
+
+        VertArranger.apply_drag_force_rows(st, drag_rows, drag=2 * 10 ** 3)
         self.update_all_xnodes(dt=dt)
+        self.update_sleep_state()
 
         tend = time.time()
-        print("updated \t{0} xnodes, \t{1} hbnodes,  \tin {2:.5f}s, \t{3:.1f} 1/s, \tOCL: {4}".format(len(xid_list), len(hbid_list),
-                                                                             tend - tstart, 1.0 / (tend - tstart), OCL.ENABLE_OPENCL and OCL.is_initialized()))
+
+        if verbose:
+            print("updated \t{0} xnodes, \t{1} hbnodes,  \tin {2:.5f}s, \t{3:.1f} 1/s, \tOCL: {4}".format(len(xid_list), len(hbid_list),
+                                                                                 tend - tstart, 1.0 / (tend - tstart), OCL.ENABLE_OPENCL and OCL.is_initialized()))
 
     # DELETE
 
@@ -846,7 +1234,10 @@ class HyperGraph(object):
         for hbid in hbids_for_nid:
             self.delete_hyperbranch_by_id(hbid)
 
-        self.X.pop(nid)
+        self.spatial_grid.remove(self.X[nid])
+        self.store.detach(self.X.pop(nid))
+        self.node_hyperbranches_index.pop(nid, None)
+        self.increment_structure_version((MatrixUpdater.NODE_REMOVED, nid))
 
     ## Metoda usuwająca hipergałąź po id.
     # @param hid Id hipergałęzi.
@@ -856,19 +1247,81 @@ class HyperGraph(object):
 
         nodes_id_list = self.get_all_nodes_id_by_hyperbranch_id(hid)
 
-        self.U.pop(hid)
+        self.spatial_grid.remove(self.U[hid])
+        self.store.detach(self.U.pop(hid))
         self.P.pop(hid)
 
+        for nid in nodes_id_list:
+            self.node_hyperbranches_index.get(nid, dict()).pop(hid, None)
+
+        self.increment_structure_version((MatrixUpdater.HYPERBRANCH_REMOVED, hid))
+        self.wake_xnodes_by_id(nodes_id_list)
+
         for nid in nodes_id_list:
             node = self.get_node_by_id(nid)
             node.set_radius_from_degree(self.get_xnode_degree_by_xnode_id(nid))
             node.set_mass_from_degree(self.get_xnode_degree_by_xnode_id(nid))
 
+    ## Metoda oznaczająca zmianę struktury hipergrafu.
+    # Wywoływana przez wszystkie metody dodające, usuwające i wczytujące elementy.
+    # Jeśli zmiana dotyczy pojedynczego elementu, zapamiętane macierze całego hipergrafu są aktualizowane
+    # zamiast liczenia ich od nowa, pozostałe wyniki są usuwane.
+    # @param change Opcjonalna krotka (rodzaj zmiany - stała MatrixUpdater, id elementu).
+    def increment_structure_version(self, change=None):
+        self.structure_version += 1
+
+        if change is not None:
+            self.matrix_cache.advance(self.structure_version - 1, self.structure_version,
+                                      lambda entries: MatrixUpdater.update_entries(self, change, entries))
+
+            # budzone są element, którego dotyczy zmiana, i elementy z nim połączone
+            xid = change[1]
+
+            self.wake_xnodes_by_id([xid] + list(self.node_hyperbranches_index.get(xid, ())) + list(self.P.get(xid, ())))
+        else:
+            self.store.wake(slice(0, self.store.count))
+
     ## Metoda zwracająca wartość tekstową hipergrafu.
     # @return Wartość tekstowa hipergrafu zawierająca słowniki X, U, P oraz listę zaznaczonych elementów.
     def __repr__(self):
         return "\nX: {}\nU:{}\nP:{}\nsel:{}\n".format(self.X, self.U, self.P, self.selected_id_list)
 
+    ## Metoda zwracająca stan obiektu hipergrafu do serializacji.
+    # Magazyn stanu nie jest zapisywany - elementy zapisują swoje wartości same, a magazyn odtwarzany jest po odczycie.
+    # Pamięć podręczna wyników macierzowych również nie jest zapisywana.
+    # @return Słownik stanu obiektu.
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('store', None)
+        state.pop('spatial_grid', None)
+        state.pop('matrix_cache', None)
+
+        return state
+
+    ## Metoda odtwarzająca stan obiektu hipergrafu po deserializacji.
+    # @param state Słownik stanu obiektu.
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('structure_version', 0)
+        self.__dict__.setdefault('sleep_enabled', True)
+        self.__dict__.setdefault('update_counter', 0)
+
+        self.matrix_cache = MatrixCache()
+        self.rebuild_vert_store()
+
+    ## Metoda tworząca od nowa magazyn stanu i dołączająca do niego wszystkie elementy hipergrafu.
+    # Wywoływana po wczytaniu hipergrafu, gdy obiekty elementów zostały podmienione.
+    # Wartości elementów odczytanych z pliku wpisywane są do magazynu i siatki przestrzennej naraz.
+    def rebuild_vert_store(self):
+        verts_list = list(self.X.values()) + list(self.U.values())
+
+        self.store = VertStore(capacity=len(verts_list))
+        self.spatial_grid = SpatialGrid(self.store)
+
+        self.store.attach_all(verts_list)
+        Vert.update_appearance_all(self.store, verts_list)
+        self.spatial_grid.insert_all(verts_list)
+
     ## Metoda zwracająca hipergraf jako krotkę jego elementów.
     # @return Krotka zawierająca elementy hipergrafu.
     def dump_hg_as_tuple(self):
@@ -889,6 +1342,10 @@ class HyperGraph(object):
         if len(hgtuple) > 6:
             self.evolution_history = hgtuple[6]
 
+        self.rebuild_node_hyperbranches_index()
+        self.rebuild_vert_store()
+        self.increment_structure_version()
+
     ## Metoda zwracająca hipergraf jako słownik wybranych elementów.
     # @param elems_to_dump Lista symboli elementów, które mają być zawarte w słowniku.
     # @return Słownik zawierający elementy hipergrafu.
@@ -946,6 +1403,28 @@ class HyperGraph(object):
         if 'H' in hgdict:
             self.evolution_history = hgdict['H']
 
+        self.rebuild_node_hyperbranches_index()
+        self.rebuild_vert_store()
+        self.increment_structure_version()
+
+    ## Metoda wypełniająca hipergraf zawartością zserializowanego pliku.
+    # Pliki *.py3hg zawierają krotkę elementów hipergrafu, pozostałe (*.hg) - słownik.
+    # @param path Ścieżka pliku.
+    def load_hg_from_file(self, path):
+        with open(path, "rb") as f:
+            hgdata = pickle.load(f)
+
+        if path.endswith('py3hg'):
+            self.load_hg_from_tuple(hgdata)
+        else:
+            self.load_hg_from_dict(hgdata)
+
+    ## Metoda zapisująca hipergraf do pliku jako zserializowany słownik elementów (*.hg).
+    # @param path Ścieżka pliku.
+    def save_hg_to_file(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self.dump_hg_as_dict(), f)
+
     ## Zapisuje aktualny stan hipergrafu jako stan jego ewolucji.
     # Jeśli licznik aktualnie aktywnego stanu nie wskazuje na ostatni stan, to wszystkie
     # stany następujące po wskazywanym zostają usunięte, a następnie do powstałej w ten sposób listy
@@ -1000,11 +1479,36 @@ class HyperGraph(object):
 
         print('n: {}'.format(self.evolution_view_current_frame))
 
-    ## Metoda zwracająca macierz incydencji A w formie stringa.
-    # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
-    # @jit
-    def macierz_incydencji_u21(self, xid_list=None):
-
+    ## Metoda zwracająca rzadką macierz incydencji hipergrafu.
+    # Macierz budowana jest jednym przejściem po zmiennej P i jest źródłem gęstych macierzy A i Ab.
+    # @return Obiekt klasy IncidenceMatrix dla wszystkich wierzchołków i hipergałęzi.
+    @structure_cache_decorator
+    def get_incidence_matrix(self):
+        return IncidenceMatrix.from_hypergraph(self)
+
+    ## Metoda zwracająca numery wierszy magazynu stanu dla wierszy i kolumn macierzy incydencji.
+    # Wiersze magazynu zmieniają się tylko przy dodawaniu i usuwaniu elementów, więc wynik zależy tylko od struktury.
+    # @return Krotka (wiersze magazynu wierzchołków, wiersze magazynu hipergałęzi) w kolejności macierzy incydencji.
+    @structure_cache_decorator
+    def get_incidence_store_rows(self):
+        incidence = self.get_incidence_matrix()
+
+        return self.get_xnodes_rows_by_id(incidence.nodes_id), self.get_xnodes_rows_by_id(incidence.hbid_list)
+
+    ## Metoda zwracająca połączenia wierzchołek-hipergałąź jako pary numerów wierszy magazynu stanu.
+    # Każda para wierzchołek-hipergałąź występuje raz, nawet jeśli wierzchołek należy do hipergałęzi wielokrotnie.
+    # @return Krotka (wiersze magazynu hipergałęzi, wiersze magazynu wierzchołków) - tablice długości ilości połączeń.
+    @structure_cache_decorator
+    def get_edges_store_rows(self):
+        incidence = self.get_incidence_matrix()
+        node_rows, hb_rows = self.get_incidence_store_rows()
+
+        return hb_rows[incidence.cols], node_rows[incidence.rows]
+
+    ## Metoda wybierająca wierzchołki i hipergałęzie do macierzy incydencji.
+    # @param xid_list Opcjonalna lista id elementów. Jeśli nie zawiera wierzchołków lub hipergałęzi, brane są wszystkie.
+    # @return Krotka (lista id wierzchołków, lista id hipergałęzi).
+    def get_incidence_lines_and_columns(self, xid_list=None):
         nodes_id = None
         hbid_list = None
 
@@ -1018,28 +1522,16 @@ class HyperGraph(object):
         if hbid_list is None or len(hbid_list) == 0:
             hbid_list = self.get_all_hyperbranches_id()
 
-        # nodes_id = self.get_all_nodes_id()
-        # hbid_list = self.get_all_hyperbranches_id()
-
-        A = np.zeros([len(nodes_id), len(hbid_list)], dtype='U21')
+        return nodes_id, hbid_list
 
-        for x, xw in enumerate(nodes_id):
-            for y, yk in enumerate(hbid_list):
-                if xw in self.get_hyperbranch_by_id(yk):
-                    hbnode = self.get_hbnode_by_id(yk)
-
-                    # print('hbnode type: ' + str(hbnode.get_hyperbranch_type()))
+    ## Metoda zwracająca macierz incydencji A w formie stringa.
+    # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
+    # @jit
+    @structure_cache_decorator
+    def macierz_incydencji_u21(self, xid_list=None):
+        nodes_id, hbid_list = self.get_incidence_lines_and_columns(xid_list)
 
-                    if hbnode.get_hyperbranch_type() == HBNode.HB_HYPEREDGE:
-                        A[x, y] = 'θ'  # kiedyś było A
-                    elif hbnode.get_hyperbranch_type() == HBNode.HB_HYPERARC:
-                        A[x, y] = str(self.get_hyperbranch_by_id(yk).index(xw) + 1)
-                    elif hbnode.get_hyperbranch_type() == HBNode.HB_HYPERLOOP:
-                        A[x, y] = 'φ'+str(len(self.get_hyperbranch_by_id(yk)))  # kiedys bylo L
-                    else:
-                        A[x, y] = str(self.get_hyperbranch_by_id(yk).index(xw) + 1)
-                else:
-                    A[x, y] = '0'
+        A = self.get_incidence_matrix().to_dense_u21(nodes_id, hbid_list)
 
         return {
             "matrix": A,
@@ -1050,47 +1542,11 @@ class HyperGraph(object):
     ## Metoda zwracająca macierz incydencji A w formie numerycznej.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def macierz_incydencji(self, xid_list=None):
+        nodes_id, hbid_list = self.get_incidence_lines_and_columns(xid_list)
 
-        nodes_id = None
-        hbid_list = None
-
-        if xid_list is not None:
-            nodes_id = [nid for nid in xid_list if self.get_xnode_by_id(nid).is_of_vert_type(Vert.T_NODE)]
-            hbid_list = [hbid for hbid in xid_list if self.get_xnode_by_id(hbid).is_of_vert_type(Vert.T_HBRANCH)]
-
-        if nodes_id is None or len(nodes_id) == 0:
-            nodes_id = self.get_all_nodes_id()
-
-        if hbid_list is None or len(hbid_list) == 0:
-            hbid_list = self.get_all_hyperbranches_id()
-
-
-        # nodes_id = self.get_all_nodes_id()
-        # hbid_list = self.get_all_hyperbranches_id()
-
-        A = np.zeros([len(nodes_id), len(hbid_list)], dtype=int)
-
-        for x, xw in enumerate(nodes_id):
-            for y, yk in enumerate(hbid_list):
-                if xw in self.get_hyperbranch_by_id(yk):
-                    hbnode = self.get_hbnode_by_id(yk)
-
-                    # print('hbnode type: ' + str(hbnode.get_hyperbranch_type()))
-
-                    if hbnode.get_hyperbranch_type() == HBNode.HB_HYPEREDGE:
-                        A[x, y] = 1 # wstawiana jest 1
-                    elif hbnode.get_hyperbranch_type() == HBNode.HB_HYPERARC:
-                        A[x, y] = self.get_hyperbranch_by_id(yk).index(xw) + 1  # wstawiany jest indeks +1
-                    elif hbnode.get_hyperbranch_type() == HBNode.HB_HYPERLOOP:
-                        A[x, y] = len(self.get_hyperbranch_by_id(yk))  # wstawiana jest krotność hiperpętli
-                    else:
-                        A[x, y] = self.get_hyperbranch_by_id(yk).index(xw) + 1  # wstawiany jest indeks +1
-                else:
-                    A[x, y] = 0
-                
-            if len(nodes_id) > 64:
-                print("matr. A: {}% done...".format(100*x/len(nodes_id)))
+        A = self.get_incidence_matrix().to_dense(nodes_id, hbid_list)
 
         return {
             "matrix": A,
@@ -1101,19 +1557,22 @@ class HyperGraph(object):
     ## Metoda zwracająca binarną macierz incydencji Ab.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def bin_macierz_incydencji(self, xid_list=None):
-        A_dict = self.macierz_incydencji_u21(xid_list=xid_list)
-        Ab = Utils.binarize_nparray(A_dict['matrix'])
+        nodes_id, hbid_list = self.get_incidence_lines_and_columns(xid_list)
+
+        Ab = self.get_incidence_matrix().to_dense_binary(nodes_id, hbid_list)
 
         return {
             "matrix" : Ab,
-            "lines"  : A_dict["lines"],
-            "columns": A_dict["columns"]
+            "lines"  : nodes_id,
+            "columns": hbid_list
         }
 
     ## Metoda zwracająca macierz przyległości wierzchołków R.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def macierz_przyleglosci_wierzcholkow(self, nodes_id=None):
 
         if nodes_id is not None:
@@ -1124,15 +1583,8 @@ class HyperGraph(object):
 
         # nodes_id = self.get_all_nodes_id()
 
-        R = np.zeros([len(nodes_id), len(nodes_id)], dtype=np.int)
-
-        # jesli jest droga z x do y to +=1
-        for x, xw in enumerate(nodes_id):
-            for y, yw in enumerate(nodes_id):
-                R[x, y] = len(self.get_connections_between_nodes_by_nodes_id(xw, yw, directed=False))
-                
-            if len(nodes_id) > 64:
-                print("matr. R: {}% done...".format(100*x/len(nodes_id)))
+        # jesli jest polaczenie pomiedzy x i y to +=1, wyznaczane z rzadkiej macierzy incydencji
+        R = self.get_incidence_matrix().to_node_adjacency_matrix(nodes_id)
 
         return {
             "matrix": R,
@@ -1143,6 +1595,7 @@ class HyperGraph(object):
     ## Metoda zwracająca binarną macierz przyległości wierzchołków Rb.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def bin_macierz_przyleglosci_wierzcholkow(self, nodes_id=None):
         R_dict = self.macierz_przyleglosci_wierzcholkow(nodes_id=nodes_id)
         Rb = Utils.binarize_nparray(R_dict['matrix'])
@@ -1156,6 +1609,7 @@ class HyperGraph(object):
     ## Metoda zwracająca macierz przyległości gałęzi B.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def macierz_przyleglosci_galezi(self, hyperbranches_id=None):
 
         if hyperbranches_id is not None:
@@ -1167,14 +1621,8 @@ class HyperGraph(object):
 
         # hyperbranches_id = self.get_all_hyperbranches_id()
 
-        B = np.zeros([len(hyperbranches_id), len(hyperbranches_id)], dtype=np.int)
-
-        for x, xk in enumerate(hyperbranches_id):
-            for y, yk in enumerate(hyperbranches_id):
-                B[x, y] = len(self.get_all_shared_nodes_id_in_hyperbranches_list((xk, yk)))
-                
-            if len(hyperbranches_id) > 64:
-                print("matr. B: {}% done...".format(100*x/len(hyperbranches_id)))
+        # B = Ab^T * Ab, wyznaczane z rzadkiej macierzy incydencji
+        B = self.get_incidence_matrix().to_hyperbranch_adjacency_matrix(hyperbranches_id)
 
         return {
             "matrix": B,
@@ -1185,6 +1633,7 @@ class HyperGraph(object):
     ## Metoda zwracająca binarną macierz przyległości gałęzi Bb.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def bin_macierz_przyleglosci_galezi(self, hyperbranches_id=None):
         B_dict = self.macierz_przyleglosci_galezi(hyperbranches_id=hyperbranches_id)
         B = B_dict["matrix"]
@@ -1198,6 +1647,7 @@ class HyperGraph(object):
     ## Metoda zwracająca macierz przejść P.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def macierz_przejsc(self, nodes_id=None):
         if not OCL.is_initialized():
             OCL.init_kernel()
@@ -1245,16 +1695,8 @@ class HyperGraph(object):
             #        print("matr. P_CL testing: {}% done...".format(100*x/len(nodes_id)))
             
         else:
-            P = np.zeros([len(nodes_id), len(nodes_id)], dtype=np.int)
-
-            for x, xw in enumerate(nodes_id):
-                for y, yw in enumerate(nodes_id):
-                    P[x, y] = len(self.get_connections_between_nodes_by_nodes_id(xw, yw, directed=True))  # duzy narzut obliczeniowy
-                    
-                if len(nodes_id) > 64:
-                    print("matr. P: {}% done...".format(100*x/len(nodes_id)))
-                
-                
+            # wersja wektorowa, wyznaczana bezpośrednio z rzadkiej macierzy incydencji
+            P = self.get_incidence_matrix().to_transition_matrix(nodes_id)
 
 
         return {
@@ -1266,6 +1708,7 @@ class HyperGraph(object):
     ## Metoda zwracająca binarną macierz przejść Pb.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def bin_macierz_przejsc(self, nodes_id=None):
         P_dict = self.macierz_przejsc(nodes_id=nodes_id)
         P = P_dict["matrix"]
@@ -1277,51 +1720,40 @@ class HyperGraph(object):
         }
 
     ## Metoda zwracająca macierz osiągalności D.
+    # Wyznaczana przez silnie spójne składowe grafu przejść i domknięcie grafu skondensowanego,
+    # wynik jest taki sam jak zbinaryzowana suma Pb + Pb^2 + ...
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def macierz_osiagalnosci(self, nodes_id=None):
-        Pb_dict = self.bin_macierz_przejsc(nodes_id=self.get_all_nodes_id())
-        Pb = Pb_dict['matrix']
-
-        D = Utils.suma_szeregu_geometrycznego_nparray(Pb, Pb.shape[0] * Pb.shape[1])
-
-        Db = Utils.binarize_nparray(D)
-
-        if nodes_id is not None:
-            nodes_id = [nid for nid in nodes_id if self.get_xnode_by_id(nid).is_of_vert_type(Vert.T_NODE)]
-        else:
-            nodes_id = []
-
-        if len(nodes_id) > 0:
-            Db_ = np.zeros((len(nodes_id), len(nodes_id)), dtype=np.float)
-
-            for i, x in enumerate(nodes_id):
-                for j, y in enumerate(nodes_id):
-                    Db_[i,j] = Db[Pb_dict['lines'].index(x), Pb_dict['columns'].index(y)]
-                    
-                if len(nodes_id) > 64:
-                    print("matr. D: {}% done...".format(100*i/len(nodes_id)))
+        incidence = self.get_incidence_matrix()
 
-            Db = Db_
-        else:
-            nodes_id = Pb_dict['lines']
+        pi, pj = incidence.get_transition_chain_pairs()
+        Db_packed = GraphClosure.reachability_packed(len(incidence.nodes_id), pi, pj)
 
-        return {
-            "matrix": Utils.binarize_nparray(Db),
-            "lines": nodes_id,
-            "columns": nodes_id
-        }
+        return self.closure_result_dict(incidence, Db_packed, nodes_id)
 
     ## Metoda zwracająca macierz spójności S.
+    # Wyznaczana strukturą zbiorów rozłącznych po przynależności wierzchołków do hipergałęzi,
+    # wynik jest taki sam jak zbinaryzowana suma Rb + Rb^2 + ...
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @structure_cache_decorator
     def macierz_spojnosci(self, nodes_id=None):
-        Rb_dict = self.bin_macierz_przyleglosci_wierzcholkow(nodes_id=self.get_all_nodes_id())
-        Rb = Rb_dict['matrix']
+        incidence = self.get_incidence_matrix()
 
-        S = Utils.suma_szeregu_geometrycznego_nparray(Rb, Rb.shape[0] * Rb.shape[1])
+        pi, pj, self_loops = incidence.get_membership_star_pairs()
+        Sb_packed = GraphClosure.connectivity_packed(len(incidence.nodes_id), pi, pj, self_loops)
 
-        Sb = Utils.binarize_nparray(S)
+        return self.closure_result_dict(incidence, Sb_packed, nodes_id)
+
+    ## Metoda rozpakowująca upakowaną bitowo macierz domknięcia (D lub S) do słownika wynikowego.
+    # @param incidence Rzadka macierz incydencji, z której wyznaczono domknięcie.
+    # @param packed Upakowane bitowo wiersze macierzy dla wszystkich wierzchołków.
+    # @param nodes_id Opcjonalna lista id wierzchołków. Jeśli nie zawiera wierzchołków, brane są wszystkie.
+    # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
+    def closure_result_dict(self, incidence, packed, nodes_id=None):
+        n = len(incidence.nodes_id)
 
         if nodes_id is not None:
             nodes_id = [nid for nid in nodes_id if self.get_xnode_by_id(nid).is_of_vert_type(Vert.T_NODE)]
@@ -1329,21 +1761,13 @@ class HyperGraph(object):
             nodes_id = []
 
         if len(nodes_id) > 0:
-            Sb_ = np.zeros((len(nodes_id), len(nodes_id)), dtype=np.float)
-
-            for i, x in enumerate(nodes_id):
-                for j, y in enumerate(nodes_id):
-                    Sb_[i, j] = Sb[Rb_dict['lines'].index(x), Rb_dict['columns'].index(y)]
-                    
-                if len(nodes_id) > 64:
-                    print("matr. S: {}% done...".format(100*i/len(nodes_id)))
-
-            Sb = Sb_
+            M = GraphClosure.unpack(packed, n, [incidence.node_index[nid] for nid in nodes_id])
         else:
-            nodes_id = Rb_dict['lines']
+            nodes_id = incidence.nodes_id
+            M = GraphClosure.unpack(packed, n)
 
         return {
-            "matrix": Utils.binarize_nparray(Sb),
+            "matrix": M,
             "lines": nodes_id,
             "columns": nodes_id
         }
@@ -1351,6 +1775,7 @@ class HyperGraph(object):
     ## Metoda zwracająca macierz skalarów odległości pomiędzy elementami hipergrafu.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @geometry_cache_decorator
     def macierz_skalarow_odleglosci(self, xid_list=None, cl=False):
         # program glowny
         if not OCL.is_initialized():
@@ -1360,19 +1785,17 @@ class HyperGraph(object):
             xid_list = self.get_all_xnodes_id()
 
         if len(xid_list) > 0:
-            xnodes_pos_list = [self.get_xnode_by_id(xid).get_position().tolist() for xid in xid_list]
-
             # zmienne numpy
-            a_np = np.array(xnodes_pos_list).astype(np.float32)
+            a_np = self.store.position[self.get_xnodes_rows_by_id(xid_list)].astype(np.float32)
 
 
             if OCL.ENABLE_OPENCL and cl:
-                res_np = np.zeros((len(xnodes_pos_list), len(xnodes_pos_list))).astype(np.float32)
+                res_np = np.zeros((len(a_np), len(a_np))).astype(np.float32)
 
                 OCL.run_with_ocl(
                     np_in_list=[a_np],
                     np_out_list=[res_np],
-                    shape=(len(xnodes_pos_list), len(xnodes_pos_list)),
+                    shape=(len(a_np), len(a_np)),
                     oclfun=OCL.prog['opencl_kernel_scalar_dist']
                 )
             else:
@@ -1400,6 +1823,7 @@ class HyperGraph(object):
     ## Metoda zwracająca macierz wektorów odległości pomiędzy elementami hipergrafu.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @geometry_cache_decorator
     def macierz_wekt_odleglosci(self, xid_list=None, cl=False):
         if not OCL.is_initialized():
             OCL.init_kernel()
@@ -1408,19 +1832,17 @@ class HyperGraph(object):
             xid_list = self.get_all_xnodes_id()
 
         if len(xid_list) > 0:
-            xnodes_pos_list = [self.get_xnode_by_id(xid).get_position().tolist() for xid in xid_list]
-
             # zmienne numpy
-            a_np = np.array(xnodes_pos_list).astype(np.float32)
+            a_np = self.store.position[self.get_xnodes_rows_by_id(xid_list)].astype(np.float32)
 
 
             if OCL.ENABLE_OPENCL and cl:
-                res_np = np.zeros((len(xnodes_pos_list), len(xnodes_pos_list), len(xnodes_pos_list[0]))).astype(np.float32)
+                res_np = np.zeros((len(a_np), len(a_np), a_np.shape[1])).astype(np.float32)
 
                 OCL.run_with_ocl(
                     np_in_list=[a_np],
                     np_out_list=[res_np],
-                    shape=(len(xnodes_pos_list), len(xnodes_pos_list)),
+                    shape=(len(a_np), len(a_np)),
                     oclfun=OCL.prog['opencl_kernel_vector_dist']
                 )
             else:
@@ -1442,6 +1864,7 @@ class HyperGraph(object):
     ## Metoda zwracająca macierz wektorów kierunku pomiędzy elementami hipergrafu.
     # @return Słownik z macierzą wraz z opisem wierszy i kolumn.
     # @jit
+    @geometry_cache_decorator
     def macierz_wekt_kierunkowych(self, xid_list=None, cl=False):
         if not OCL.is_initialized():
             OCL.init_kernel()
@@ -1450,18 +1873,16 @@ class HyperGraph(object):
             xid_list = self.get_all_xnodes_id()
 
         if len(xid_list) > 0:
-            xnodes_pos_list = [self.get_xnode_by_id(xid).get_position().tolist() for xid in xid_list]
-
             # zmienne numpy
-            xnodes_pos_array_np = np.array(xnodes_pos_list).astype(np.float32)
+            xnodes_pos_array_np = self.store.position[self.get_xnodes_rows_by_id(xid_list)].astype(np.float32)
 
             if OCL.ENABLE_OPENCL and cl:
-                res_np = np.zeros((len(xnodes_pos_list), len(xnodes_pos_list), len(xnodes_pos_list[0]))).astype(np.float32)
+                res_np = np.zeros((len(xnodes_pos_array_np), len(xnodes_pos_array_np), xnodes_pos_array_np.shape[1])).astype(np.float32)
 
                 OCL.run_with_ocl(
                     np_in_list=[xnodes_pos_array_np],
                     np_out_list=[res_np],
-                    shape=(len(xnodes_pos_list), len(xnodes_pos_list)),
+                    shape=(len(xnodes_pos_array_np), len(xnodes_pos_array_np)),
                     oclfun=OCL.prog['opencl_kernel_vector_dir']
                 )
             else:
@@ -0,0 +1,526 @@
+# -*- coding: utf-8 -*-
+
+## @file IncidenceMatrix.py
+## @package IncidenceMatrix
+
+import numpy as np
+
+from Vert import HBNode
+
+
+## Klasa IncidenceMatrix.
+# Rzadka macierz incydencji A hipergrafu (linie - wierzchołki, kolumny - hipergałęzie).
+# Przechowywane są tylko niezerowe komórki, w formacie COO (trójki wiersz, kolumna, wartość)
+# uporządkowanym kolumnami (CSC), oraz dodatkowo w formacie CSR (wiersze).
+# Wartości komórek są takie same jak w macierzy numerycznej A:
+# 1 dla hiperkrawędzi, indeks wierzchołka + 1 dla hiperłuku, krotność dla hiperpętli.
+# Macierz budowana jest jednym przejściem po zmiennej P hipergrafu, więc czas budowy
+# zależy od ilości incydencji, a nie od iloczynu ilości wierzchołków i hipergałęzi.
+class IncidenceMatrix(object):
+
+    ## Konstruktor.
+    # @param nodes_id Lista id wierzchołków (kolejność wierszy).
+    # @param hbid_list Lista id hipergałęzi (kolejność kolumn).
+    # @param hbtypes Typy hipergałęzi dla kolejnych kolumn.
+    # @param rows Numery wierszy niezerowych komórek.
+    # @param cols Numery kolumn niezerowych komórek (niemalejące).
+    # @param values Wartości niezerowych komórek.
+    def __init__(self, nodes_id, hbid_list, hbtypes, rows, cols, values):
+
+        ## Lista id wierzchołków odpowiadających wierszom.
+        self.nodes_id = list(nodes_id)
+
+        ## Lista id hipergałęzi odpowiadających kolumnom.
+        self.hbid_list = list(hbid_list)
+
+        ## Słownik id wierzchołka -> numer wiersza.
+        self.node_index = dict((nid, i) for i, nid in enumerate(self.nodes_id))
+
+        ## Słownik id hipergałęzi -> numer kolumny.
+        self.hb_index = dict((hbid, j) for j, hbid in enumerate(self.hbid_list))
+
+        ## Wektor typów hipergałęzi (HBNode.HB_*) dla kolumn.
+        self.hbtypes = np.asarray(hbtypes, dtype=np.int32)
+
+        ## Numery wierszy niezerowych komórek (COO, kolejność kolumnowa).
+        self.rows = np.asarray(rows, dtype=np.intp)
+
+        ## Numery kolumn niezerowych komórek (COO, kolejność kolumnowa).
+        self.cols = np.asarray(cols, dtype=np.intp)
+
+        ## Wartości niezerowych komórek (COO, kolejność kolumnowa).
+        self.values = np.asarray(values, dtype=np.int64)
+
+        n, m = self.get_shape()
+
+        ## Wskaźniki początków kolumn w tablicach COO (CSC).
+        self.csc_indptr = np.zeros(m + 1, dtype=np.intp)
+        np.cumsum(np.bincount(self.cols, minlength=m), out=self.csc_indptr[1:])
+
+        order = np.argsort(self.rows, kind='stable')
+
+        ## Wskaźniki początków wierszy w tablicach CSR.
+        self.csr_indptr = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(np.bincount(self.rows, minlength=n), out=self.csr_indptr[1:])
+
+        ## Numery kolumn niezerowych komórek w kolejności wierszowej (CSR).
+        self.csr_indices = self.cols[order]
+
+        ## Wartości niezerowych komórek w kolejności wierszowej (CSR).
+        self.csr_values = self.values[order]
+
+    ## Metoda budująca rzadką macierz incydencji z obiektu hipergrafu.
+    # @param hgobj Obiekt hipergrafu.
+    # @return Obiekt klasy IncidenceMatrix dla wszystkich wierzchołków i hipergałęzi.
+    @staticmethod
+    def from_hypergraph(hgobj):
+        nodes_id = hgobj.get_all_nodes_id()
+        hbid_list = hgobj.get_all_hyperbranches_id()
+
+        node_index = dict((nid, i) for i, nid in enumerate(nodes_id))
+
+        hbtypes = list()
+        rows = list()
+        cols = list()
+        values = list()
+
+        for col, hbid in enumerate(hbid_list):
+            hbtype = hgobj.get_hbnode_by_id(hbid).get_hyperbranch_type()
+            hb = hgobj.get_hyperbranch_by_id(hbid)
+
+            hbtypes.append(hbtype)
+
+            col_rows, col_values = IncidenceMatrix.get_column_entries(hbtype, hb, node_index)
+
+            rows.extend(col_rows)
+            cols.extend([col] * len(col_rows))
+            values.extend(col_values)
+
+        return IncidenceMatrix(nodes_id, hbid_list, hbtypes, rows, cols, values)
+
+    ## Metoda wyznaczająca niezerowe komórki kolumny dla jednej hipergałęzi.
+    # @param hbtype Typ hipergałęzi.
+    # @param hb Elementy hipergałęzi (zbiór lub krotka id wierzchołków).
+    # @param node_index Słownik id wierzchołka -> numer wiersza.
+    # @return Krotka (lista numerów wierszy, lista wartości) w kolejności pierwszego wystąpienia wierzchołków.
+    @staticmethod
+    def get_column_entries(hbtype, hb, node_index):
+        rows = list()
+        values = list()
+
+        seen = set()
+
+        for k, nid in enumerate(hb):
+            if nid in seen:
+                continue
+
+            seen.add(nid)
+
+            if hbtype == HBNode.HB_HYPEREDGE:
+                value = 1  # wstawiana jest 1
+            elif hbtype == HBNode.HB_HYPERLOOP:
+                value = len(hb)  # wstawiana jest krotność hiperpętli
+            else:
+                value = k + 1  # wstawiany jest indeks +1 (pierwsze wystąpienie)
+
+            rows.append(node_index[nid])
+            values.append(value)
+
+        return rows, values
+
+    ## Metoda zwracająca macierz z dodanym na końcu pustym wierszem nowego wierzchołka.
+    # @param nid Id wierzchołka.
+    # @return Nowy obiekt klasy IncidenceMatrix.
+    def with_node_added(self, nid):
+        return IncidenceMatrix(self.nodes_id + [nid], self.hbid_list, self.hbtypes, self.rows, self.cols, self.values)
+
+    ## Metoda zwracająca macierz bez wiersza danego wierzchołka.
+    # @param nid Id wierzchołka.
+    # @return Nowy obiekt klasy IncidenceMatrix.
+    def with_node_removed(self, nid):
+        i = self.node_index[nid]
+        keep = self.rows != i
+
+        rows = self.rows[keep]
+        rows = rows - (rows > i)
+
+        return IncidenceMatrix(self.nodes_id[:i] + self.nodes_id[i + 1:], self.hbid_list, self.hbtypes, rows, self.cols[keep], self.values[keep])
+
+    ## Metoda zwracająca macierz z dodaną na końcu pustą kolumną nowej hipergałęzi.
+    # @param hbid Id hipergałęzi.
+    # @param hbtype Typ hipergałęzi.
+    # @return Nowy obiekt klasy IncidenceMatrix.
+    def with_hyperbranch_added(self, hbid, hbtype):
+        return IncidenceMatrix(self.nodes_id, self.hbid_list + [hbid], np.append(self.hbtypes, hbtype), self.rows, self.cols, self.values)
+
+    ## Metoda zwracająca macierz bez kolumny danej hipergałęzi.
+    # @param hbid Id hipergałęzi.
+    # @return Nowy obiekt klasy IncidenceMatrix.
+    def with_hyperbranch_removed(self, hbid):
+        j = self.hb_index[hbid]
+        keep = self.cols != j
+
+        cols = self.cols[keep]
+        cols = cols - (cols > j)
+
+        return IncidenceMatrix(self.nodes_id, self.hbid_list[:j] + self.hbid_list[j + 1:], np.delete(self.hbtypes, j), self.rows[keep], cols, self.values[keep])
+
+    ## Metoda zwracająca macierz z nową zawartością kolumny danej hipergałęzi.
+    # @param hbid Id hipergałęzi.
+    # @param hbtype Typ hipergałęzi.
+    # @param hb Elementy hipergałęzi (zbiór lub krotka id wierzchołków).
+    # @return Nowy obiekt klasy IncidenceMatrix.
+    def with_hyperbranch_replaced(self, hbid, hbtype, hb):
+        j = self.hb_index[hbid]
+        start, end = self.csc_indptr[j], self.csc_indptr[j + 1]
+
+        col_rows, col_values = IncidenceMatrix.get_column_entries(hbtype, hb, self.node_index)
+
+        hbtypes = np.array(self.hbtypes)
+        hbtypes[j] = hbtype
+
+        rows = np.concatenate((self.rows[:start], np.asarray(col_rows, dtype=np.intp), self.rows[end:]))
+        cols = np.concatenate((self.cols[:start], np.full(len(col_rows), j, dtype=np.intp), self.cols[end:]))
+        values = np.concatenate((self.values[:start], np.asarray(col_values, dtype=np.int64), self.values[end:]))
+
+        return IncidenceMatrix(self.nodes_id, self.hbid_list, hbtypes, rows, cols, values)
+
+    ## Metoda zwracająca wymiary macierzy.
+    # @return Krotka (ilość wierszy, ilość kolumn).
+    def get_shape(self):
+        return len(self.nodes_id), len(self.hbid_list)
+
+    ## Metoda zwracająca ilość niezerowych komórek macierzy.
+    # @return Ilość incydencji.
+    def get_nnz(self):
+        return len(self.values)
+
+    ## Metoda szacująca ilość pamięci zajmowanej przez macierz.
+    # @return Rozmiar tablic i indeksów w bajtach.
+    def get_nbytes(self):
+        arrays = (self.hbtypes, self.rows, self.cols, self.values, self.csc_indptr, self.csr_indptr, self.csr_indices, self.csr_values)
+
+        return sum(arr.nbytes for arr in arrays) + 64 * (len(self.nodes_id) + len(self.hbid_list))
+
+    ## Metoda zwracająca niezerowe komórki danego wiersza.
+    # @param nid Id wierzchołka.
+    # @return Krotka (numery kolumn, wartości).
+    def get_row(self, nid):
+        i = self.node_index[nid]
+        start, end = self.csr_indptr[i], self.csr_indptr[i + 1]
+
+        return self.csr_indices[start:end], self.csr_values[start:end]
+
+    ## Metoda zwracająca niezerowe komórki danej kolumny.
+    # @param hbid Id hipergałęzi.
+    # @return Krotka (numery wierszy, wartości).
+    def get_column(self, hbid):
+        j = self.hb_index[hbid]
+        start, end = self.csc_indptr[j], self.csc_indptr[j + 1]
+
+        return self.rows[start:end], self.values[start:end]
+
+    ## Metoda zwracająca niezerowe komórki ograniczone do podzbioru wierszy i kolumn.
+    # @param nodes_id Lista id wierzchołków (wynikowa kolejność wierszy), None - wszystkie.
+    # @param hbid_list Lista id hipergałęzi (wynikowa kolejność kolumn), None - wszystkie.
+    # @return Krotka (numery wierszy, numery kolumn, maska wybranych komórek w tablicach COO) w numeracji podzbioru.
+    def get_submatrix_entries(self, nodes_id=None, hbid_list=None):
+        if nodes_id is None:
+            r = self.rows
+        else:
+            row_map = np.full(len(self.nodes_id) + 1, -1, dtype=np.intp)
+            row_map[[self.node_index[nid] for nid in nodes_id]] = np.arange(len(nodes_id))
+            r = row_map[self.rows]
+
+        if hbid_list is None:
+            c = self.cols
+        else:
+            col_map = np.full(len(self.hbid_list) + 1, -1, dtype=np.intp)
+            col_map[[self.hb_index[hbid] for hbid in hbid_list]] = np.arange(len(hbid_list))
+            c = col_map[self.cols]
+
+        mask = np.logical_and(r >= 0, c >= 0)
+
+        return r[mask], c[mask], mask
+
+    ## Metoda zwracająca gęstą, numeryczną macierz incydencji A.
+    # @param nodes_id Lista id wierzchołków (kolejność wierszy), None - wszystkie.
+    # @param hbid_list Lista id hipergałęzi (kolejność kolumn), None - wszystkie.
+    # @return Macierz NumPy.
+    def to_dense(self, nodes_id=None, hbid_list=None):
+        nodes_id = self.nodes_id if nodes_id is None else nodes_id
+        hbid_list = self.hbid_list if hbid_list is None else hbid_list
+
+        r, c, mask = self.get_submatrix_entries(nodes_id, hbid_list)
+
+        A = np.zeros([len(nodes_id), len(hbid_list)], dtype=int)
+        A[r, c] = self.values[mask]
+
+        return A
+
+    ## Metoda zwracająca gęstą, binarną macierz incydencji Ab.
+    # @param nodes_id Lista id wierzchołków (kolejność wierszy), None - wszystkie.
+    # @param hbid_list Lista id hipergałęzi (kolejność kolumn), None - wszystkie.
+    # @return Macierz NumPy z wartościami 0 i 1.
+    def to_dense_binary(self, nodes_id=None, hbid_list=None):
+        nodes_id = self.nodes_id if nodes_id is None else nodes_id
+        hbid_list = self.hbid_list if hbid_list is None else hbid_list
+
+        r, c, mask = self.get_submatrix_entries(nodes_id, hbid_list)
+
+        Ab = np.zeros([len(nodes_id), len(hbid_list)], dtype=int)
+        Ab[r, c] = 1
+
+        return Ab
+
+    ## Metoda zwracająca gęstą macierz incydencji A w formie stringa.
+    # Hiperkrawędzie oznaczane są jako 'θ', hiperpętle jako 'φ' z krotnością, hiperłuki jako indeks + 1.
+    # @param nodes_id Lista id wierzchołków (kolejność wierszy), None - wszystkie.
+    # @param hbid_list Lista id hipergałęzi (kolejność kolumn), None - wszystkie.
+    # @return Macierz NumPy typu 'U21'.
+    def to_dense_u21(self, nodes_id=None, hbid_list=None):
+        nodes_id = self.nodes_id if nodes_id is None else nodes_id
+        hbid_list = self.hbid_list if hbid_list is None else hbid_list
+
+        r, c, mask = self.get_submatrix_entries(nodes_id, hbid_list)
+
+        A = np.full([len(nodes_id), len(hbid_list)], '0', dtype='U21')
+
+        values_str = self.values[mask].astype('U21')
+        hbtypes = self.hbtypes[self.cols[mask]]
+
+        labels = np.where(hbtypes == HBNode.HB_HYPEREDGE, 'θ',  # kiedyś było A
+                          np.where(hbtypes == HBNode.HB_HYPERLOOP, np.char.add('φ', values_str), values_str))  # kiedys bylo L
+
+        A[r, c] = labels
+
+        return A
+
+    ## Metoda generująca wszystkie uporządkowane pary elementów wewnątrz grup danych wskaźnikami początków grup.
+    # Pary generowane są wektorowo, bez pętli po grupach. Zawierają także pary (i, i).
+    # @param indptr Wskaźniki początków grup (np. csc_indptr lub csr_indptr).
+    # @param groups Tablica numerów grup do rozpatrzenia.
+    # @return Krotka (indeksy pierwszych elementów, indeksy drugich elementów, numery grup).
+    @staticmethod
+    def get_group_pairs(indptr, groups):
+        groups = np.asarray(groups, dtype=np.intp)
+
+        starts = indptr[groups]
+        sizes = indptr[groups + 1] - starts
+        counts = sizes * sizes
+
+        total = int(counts.sum())
+
+        if total == 0:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, empty
+
+        pair_group = np.repeat(groups, counts)
+        pair_start = np.repeat(starts, counts)
+        pair_size = np.repeat(sizes, counts)
+
+        # numer pary wewnątrz swojej grupy
+        t = np.arange(total, dtype=np.intp) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        return pair_start + t // pair_size, pair_start + t % pair_size, pair_group
+
+    ## Metoda generująca wszystkie uporządkowane pary incydencji leżące w tej samej kolumnie (hipergałęzi).
+    # @param columns Opcjonalna tablica numerów kolumn do rozpatrzenia, None - wszystkie.
+    # @return Krotka (indeksy pierwszych incydencji, indeksy drugich incydencji, numery kolumn) - indeksy dotyczą tablic COO.
+    def get_column_pairs(self, columns=None):
+        if columns is None:
+            columns = np.arange(len(self.hbid_list), dtype=np.intp)
+
+        return IncidenceMatrix.get_group_pairs(self.csc_indptr, columns)
+
+    ## Metoda generująca wszystkie uporządkowane pary incydencji leżące w tym samym wierszu (wierzchołku).
+    # @param rows Opcjonalna tablica numerów wierszy do rozpatrzenia, None - wszystkie.
+    # @return Krotka (indeksy pierwszych incydencji, indeksy drugich incydencji, numery wierszy) - indeksy dotyczą tablic CSR.
+    def get_row_pairs(self, rows=None):
+        if rows is None:
+            rows = np.arange(len(self.nodes_id), dtype=np.intp)
+
+        return IncidenceMatrix.get_group_pairs(self.csr_indptr, rows)
+
+    ## Metoda zamieniająca listę par (współrzędnych komórek, z powtórzeniami) na gęstą macierz zliczeń.
+    # @param pi Numery wierszy.
+    # @param pj Numery kolumn.
+    # @param n Ilość wierszy i kolumn macierzy wynikowej.
+    # @return Macierz NumPy, w której komórka (i, j) jest ilością wystąpień pary (i, j).
+    @staticmethod
+    def pairs_to_dense(pi, pj, n):
+        return np.bincount(pi * n + pj, minlength=n * n).reshape((n, n))
+
+    ## Metoda zwracająca maskę wybranych kolumn.
+    # @param columns Tablica numerów kolumn, None - wszystkie.
+    # @return Tablica bool o długości równej ilości kolumn.
+    def get_column_mask(self, columns=None):
+        if columns is None:
+            return np.ones(len(self.hbid_list), dtype=bool)
+
+        column_mask = np.zeros(len(self.hbid_list), dtype=bool)
+        column_mask[np.asarray(columns, dtype=np.intp)] = True
+
+        return column_mask
+
+    ## Metoda zwracająca ilości wierzchołków wspólnych danej hipergałęzi z każdą hipergałęzią (wiersz macierzy B).
+    # @param hbid Id hipergałęzi.
+    # @return Tablica NumPy o długości równej ilości kolumn.
+    def get_hyperbranch_adjacency_row(self, hbid):
+        col_rows, col_values = self.get_column(hbid)
+
+        in_column = np.zeros(len(self.nodes_id), dtype=bool)
+        in_column[col_rows] = True
+
+        return np.bincount(self.cols[in_column[self.rows]], minlength=len(self.hbid_list)).astype(int)
+
+    ## Metoda wyznaczająca numery wierszy podzbioru dla wszystkich incydencji.
+    # @param nodes_id Lista id wierzchołków podzbioru.
+    # @return Tablica NumPy z numerem wiersza podzbioru dla każdej incydencji (COO), -1 gdy wierzchołek nie należy do podzbioru.
+    def get_entries_subset_rows(self, nodes_id):
+        r, c, mask = self.get_submatrix_entries(nodes_id, None)
+
+        entry_row = np.full(len(self.values), -1, dtype=np.intp)
+        entry_row[mask] = r
+
+        return entry_row
+
+    ## Metoda zwracająca rzadką postać macierzy przejść P jako listę par (z powtórzeniami).
+    # P(i, j) jest ilością hipergałęzi, którymi można przejść z wierzchołka i do wierzchołka j:
+    # hiperkrawędź daje wszystkie uporządkowane pary różnych wierzchołków,
+    # hiperłuk pary zgodne z kolejnością wierzchołków (A(i, k) < A(j, k)),
+    # a hiperpętla przekątną dla swojego wierzchołka - tak samo jak kernel opencl_kernel_a_to_p.
+    # @param nodes_id Lista id wierzchołków (kolejność wierszy i kolumn), None - wszystkie.
+    # @param columns Opcjonalna tablica numerów kolumn do rozpatrzenia, None - wszystkie.
+    # @return Krotka (numery wierszy, numery kolumn) w numeracji podzbioru.
+    def get_transition_pairs(self, nodes_id=None, columns=None):
+        nodes_id = self.nodes_id if nodes_id is None else nodes_id
+
+        entry_row = self.get_entries_subset_rows(nodes_id)
+        column_mask = self.get_column_mask(columns)
+
+        path_columns = np.nonzero(np.logical_or(self.hbtypes == HBNode.HB_HYPEREDGE, self.hbtypes == HBNode.HB_HYPERARC) & column_mask)[0]
+        ei, ej, ecol = self.get_column_pairs(path_columns)
+
+        is_edge = self.hbtypes[ecol] == HBNode.HB_HYPEREDGE
+        keep = np.where(is_edge, ei != ej, self.values[ei] < self.values[ej])
+        keep &= np.logical_and(entry_row[ei] >= 0, entry_row[ej] >= 0)
+
+        # hiperpętle - przejście z wierzchołka do niego samego
+        loop_entries = np.nonzero((self.hbtypes[self.cols] == HBNode.HB_HYPERLOOP) & column_mask[self.cols] & (entry_row >= 0))[0]
+
+        pi = np.concatenate((entry_row[ei[keep]], entry_row[loop_entries]))
+        pj = np.concatenate((entry_row[ej[keep]], entry_row[loop_entries]))
+
+        return pi, pj
+
+    ## Metoda zwracająca przejścia o tej samej osiągalności co macierz P, ale w ilości liniowej względem incydencji.
+    # Kolejne wierzchołki hiperłuku łączone są w łańcuch, wierzchołki hiperkrawędzi w cykl,
+    # a hiperpętle dają pętlę własną. Domknięcie przechodnie tych przejść jest równe domknięciu P.
+    # @return Krotka (numery wierszy, numery wierszy) dla wszystkich wierzchołków.
+    def get_transition_chain_pairs(self):
+        is_path_entry = np.logical_or(self.hbtypes[self.cols] == HBNode.HB_HYPEREDGE, self.hbtypes[self.cols] == HBNode.HB_HYPERARC)
+
+        # incydencje w kolumnie są w kolejności pierwszego wystąpienia, czyli rosnących wartości A dla hiperłuku
+        follows = np.logical_and(self.cols[1:] == self.cols[:-1], is_path_entry[1:])
+
+        # zamknięcie cyklu hiperkrawędzi: ostatni -> pierwszy
+        sizes = np.diff(self.csc_indptr)
+        cycle_columns = np.nonzero(np.logical_and(self.hbtypes == HBNode.HB_HYPEREDGE, sizes > 1))[0]
+
+        loop_entries = self.hbtypes[self.cols] == HBNode.HB_HYPERLOOP
+
+        pi = np.concatenate((self.rows[:-1][follows], self.rows[self.csc_indptr[cycle_columns + 1] - 1], self.rows[loop_entries]))
+        pj = np.concatenate((self.rows[1:][follows], self.rows[self.csc_indptr[cycle_columns]], self.rows[loop_entries]))
+
+        return pi, pj
+
+    ## Metoda zwracająca gęstą macierz przejść P wyznaczoną z incydencji.
+    # @param nodes_id Lista id wierzchołków (kolejność wierszy i kolumn), None - wszystkie.
+    # @return Macierz NumPy.
+    def to_transition_matrix(self, nodes_id=None):
+        nodes_id = self.nodes_id if nodes_id is None else nodes_id
+
+        pi, pj = self.get_transition_pairs(nodes_id)
+
+        return IncidenceMatrix.pairs_to_dense(pi, pj, len(nodes_id))
+
+    ## Metoda zwracająca rzadką postać macierzy przyległości wierzchołków R jako listę par (z powtórzeniami).
+    # R(i, j) jest ilością hipergałęzi łączących wierzchołki bez względu na kierunek:
+    # hiperkrawędzie i hiperłuki dają pary różnych wierzchołków (Ab * Ab^T poza przekątną),
+    # a hiperpętle przekątną.
+    # @param nodes_id Lista id wierzchołków (kolejność wierszy i kolumn), None - wszystkie.
+    # @param columns Opcjonalna tablica numerów kolumn do rozpatrzenia, None - wszystkie.
+    # @return Krotka (numery wierszy, numery kolumn) w numeracji podzbioru.
+    def get_node_adjacency_pairs(self, nodes_id=None, columns=None):
+        nodes_id = self.nodes_id if nodes_id is None else nodes_id
+
+        entry_row = self.get_entries_subset_rows(nodes_id)
+        column_mask = self.get_column_mask(columns)
+
+        path_columns = np.nonzero(np.logical_or(self.hbtypes == HBNode.HB_HYPEREDGE, self.hbtypes == HBNode.HB_HYPERARC) & column_mask)[0]
+        ei, ej, ecol = self.get_column_pairs(path_columns)
+
+        keep = np.logical_and(ei != ej, np.logical_and(entry_row[ei] >= 0, entry_row[ej] >= 0))
+
+        loop_entries = np.nonzero((self.hbtypes[self.cols] == HBNode.HB_HYPERLOOP) & column_mask[self.cols] & (entry_row >= 0))[0]
+
+        pi = np.concatenate((entry_row[ei[keep]], entry_row[loop_entries]))
+        pj = np.concatenate((entry_row[ej[keep]], entry_row[loop_entries]))
+
+        return pi, pj
+
+    ## Metoda zwracająca gęstą macierz przyległości wierzchołków R wyznaczoną z incydencji.
+    # @param nodes_id Lista id wierzchołków (kolejność wierszy i kolumn), None - wszystkie.
+    # @return Macierz NumPy.
+    def to_node_adjacency_matrix(self, nodes_id=None):
+        nodes_id = self.nodes_id if nodes_id is None else nodes_id
+
+        pi, pj = self.get_node_adjacency_pairs(nodes_id)
+
+        return IncidenceMatrix.pairs_to_dense(pi, pj, len(nodes_id))
+
+    ## Metoda zwracająca rzadką postać macierzy przyległości gałęzi B = Ab^T * Ab jako listę par (z powtórzeniami).
+    # B(x, y) jest ilością wierzchołków wspólnych dla hipergałęzi x i y.
+    # @param hbid_list Lista id hipergałęzi (kolejność wierszy i kolumn), None - wszystkie.
+    # @return Krotka (numery wierszy, numery kolumn) w numeracji podzbioru.
+    def get_hyperbranch_adjacency_pairs(self, hbid_list=None):
+        if hbid_list is None:
+            col_map = np.arange(len(self.hbid_list), dtype=np.intp)
+        else:
+            col_map = np.full(len(self.hbid_list) + 1, -1, dtype=np.intp)
+            col_map[[self.hb_index[hbid] for hbid in hbid_list]] = np.arange(len(hbid_list))
+
+        ei, ej, erow = self.get_row_pairs()
+
+        ci = col_map[self.csr_indices[ei]]
+        cj = col_map[self.csr_indices[ej]]
+
+        keep = np.logical_and(ci >= 0, cj >= 0)
+
+        return ci[keep], cj[keep]
+
+    ## Metoda zwracająca gęstą macierz przyległości gałęzi B wyznaczoną z incydencji.
+    # @param hbid_list Lista id hipergałęzi (kolejność wierszy i kolumn), None - wszystkie.
+    # @return Macierz NumPy.
+    def to_hyperbranch_adjacency_matrix(self, hbid_list=None):
+        hbid_list = self.hbid_list if hbid_list is None else hbid_list
+
+        pi, pj = self.get_hyperbranch_adjacency_pairs(hbid_list)
+
+        return IncidenceMatrix.pairs_to_dense(pi, pj, len(hbid_list))
+
+    ## Metoda zwracająca połączenia wierzchołków wystarczające do wyznaczenia spójności.
+    # Każdy wierzchołek hiperkrawędzi lub hiperłuku łączony jest tylko z pierwszym wierzchołkiem tej hipergałęzi,
+    # więc ilość par jest równa ilości incydencji, a nie kwadratowi rozmiaru hipergałęzi.
+    # @return Krotka (numery wierszy, numery wierszy, tablica bool wierszy należących do hiperpętli).
+    def get_membership_star_pairs(self):
+        is_path_entry = np.logical_or(self.hbtypes[self.cols] == HBNode.HB_HYPEREDGE, self.hbtypes[self.cols] == HBNode.HB_HYPERARC)
+
+        # pierwsza incydencja kolumny dla każdej incydencji
+        first_rows = self.rows[self.csc_indptr[self.cols[is_path_entry]]]
+
+        self_loops = np.zeros(len(self.nodes_id), dtype=bool)
+        self_loops[self.rows[self.hbtypes[self.cols] == HBNode.HB_HYPERLOOP]] = True
+
+        return first_rows, self.rows[is_path_entry], self_loops
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+## @file KDTree.py
+## @package KDTree
+
+import heapq
+
+import numpy as np
+
+
+## Klasa KDTree.
+# Drzewo k-d (k = 2) nad pozycjami elementów hipergrafu do wyszukiwania najbliższych sąsiadów,
+# k najbliższych sąsiadów i elementów w danym promieniu bez przeglądania wszystkich elementów.
+# Węzły drzewa przechowywane są w tablicach NumPy: każdy węzeł opisuje ciągły przedział tablicy order
+# (numerów punktów) oraz prostokąt obejmujący jego punkty. Liście zawierają co najwyżej LEAF_SIZE punktów.
+# Drzewo jest niezmienne - po zmianie pozycji elementów budowane jest od nowa.
+# Punkty wskazywane są numerami w kolejności z konstruktora, a przy równych odległościach
+# pierwszeństwo ma punkt o mniejszym numerze.
+class KDTree(object):
+
+    ## Maksymalna ilość punktów w liściu drzewa.
+    LEAF_SIZE = 16
+
+    ## Konstruktor - budowa drzewa.
+    # @param positions Tablica pozycji punktów (N x 2).
+    # @param ids Opcjonalna lista id elementów odpowiadających punktom.
+    def __init__(self, positions, ids=None):
+
+        ## Pozycje punktów (N x 2).
+        self.positions = np.array(positions, dtype=np.double).reshape(-1, 2)
+
+        n = len(self.positions)
+
+        ## Lista id elementów odpowiadających punktom.
+        self.ids = list(ids) if ids is not None else list(range(n))
+
+        ## Słownik id elementu -> numer punktu.
+        self.index = {xid: i for i, xid in enumerate(self.ids)}
+
+        ## Numery punktów uporządkowane tak, że każdy węzeł obejmuje ich ciągły przedział.
+        self.order = np.arange(n, dtype=np.intp)
+
+        starts, ends, lows, highs, lefts, rights = [], [], [], [], [], []
+
+        # stos (początek, koniec, numer węzła rodzica, czy lewy potomek)
+        stack = [(0, n, -1, False)] if n > 0 else []
+
+        while len(stack) > 0:
+            start, end, parent, is_left = stack.pop()
+
+            node = len(starts)
+            pts = self.positions[self.order[start:end]]
+            lo = pts.min(axis=0)
+            hi = pts.max(axis=0)
+
+            starts.append(start)
+            ends.append(end)
+            lows.append(lo)
+            highs.append(hi)
+            lefts.append(-1)
+            rights.append(-1)
+
+            if parent >= 0:
+                if is_left:
+                    lefts[parent] = node
+                else:
+                    rights[parent] = node
+
+            if end - start > KDTree.LEAF_SIZE:
+                # podział wzdłuż dłuższego boku prostokąta w medianie
+                axis = int(np.argmax(hi - lo))
+                mid = (start + end) // 2
+
+                part = np.argpartition(pts[:, axis], mid - start, kind='introselect')
+                self.order[start:end] = self.order[start:end][part]
+
+                stack.append((mid, end, node, False))
+                stack.append((start, mid, node, True))
+
+        ## Początki przedziałów węzłów w tablicy order.
+        self.starts = np.array(starts, dtype=np.intp)
+
+        ## Końce przedziałów węzłów w tablicy order.
+        self.ends = np.array(ends, dtype=np.intp)
+
+        ## Lewe dolne rogi prostokątów węzłów.
+        self.lows = np.array(lows, dtype=np.double).reshape(-1, 2)
+
+        ## Prawe górne rogi prostokątów węzłów.
+        self.highs = np.array(highs, dtype=np.double).reshape(-1, 2)
+
+        ## Numery lewych potomków węzłów (-1 dla liści).
+        self.lefts = np.array(lefts, dtype=np.intp)
+
+        ## Numery prawych potomków węzłów (-1 dla liści).
+        self.rights = np.array(rights, dtype=np.intp)
+
+    ## Metoda zwracająca ilość punktów w drzewie.
+    # @return Ilość punktów.
+    def __len__(self):
+        return len(self.positions)
+
+    ## Metoda zwracająca rozmiar drzewa w bajtach.
+    # @return Rozmiar w bajtach.
+    def get_nbytes(self):
+        return 16 * len(self.ids) + sum(a.nbytes for a in (self.positions, self.order, self.starts, self.ends,
+                                                           self.lows, self.highs, self.lefts, self.rights))
+
+    ## Metoda zwracająca tablicę flag punktów branych pod uwagę przy wyszukiwaniu.
+    # Id spoza drzewa są pomijane.
+    # @param include Opcjonalny zbiór id elementów, do których należy ograniczyć wyszukiwanie.
+    # @param exclude Opcjonalny zbiór id elementów, które należy pominąć.
+    # @return Tablica flag (N) lub None, jeśli brane są pod uwagę wszystkie punkty.
+    def get_ids_mask(self, include=None, exclude=None):
+        if include is None and exclude is None:
+            return None
+
+        if include is None:
+            mask = np.ones(len(self.ids), dtype=bool)
+        else:
+            mask = np.zeros(len(self.ids), dtype=bool)
+            mask[[self.index[xid] for xid in include if xid in self.index]] = True
+
+        if exclude is not None:
+            mask[[self.index[xid] for xid in exclude if xid in self.index]] = False
+
+        return mask
+
+    ## Metoda zwracająca kwadrat odległości punktu od prostokąta węzła.
+    # @param node Numer węzła.
+    # @param px Współrzędna x punktu.
+    # @param py Współrzędna y punktu.
+    # @return Kwadrat odległości (0 dla punktu wewnątrz prostokąta).
+    def get_node_sqrdist(self, node, px, py):
+        lo = self.lows[node]
+        hi = self.highs[node]
+
+        dx = max(lo[0] - px, 0.0, px - hi[0])
+        dy = max(lo[1] - py, 0.0, py - hi[1])
+
+        return dx * dx + dy * dy
+
+    ## Metoda zwracająca punkty liścia wraz z kwadratami odległości od danego punktu.
+    # @param node Numer liścia.
+    # @param pos Pozycja punktu.
+    # @param mask Opcjonalna tablica flag (N) - brane są pod uwagę tylko punkty z flagą True.
+    # @return Krotka (numery punktów, kwadraty odległości).
+    def get_leaf_sqrdists(self, node, pos, mask):
+        idx = self.order[self.starts[node]:self.ends[node]]
+
+        if mask is not None:
+            idx = idx[mask[idx]]
+
+        d = self.positions[idx] - pos
+
+        return idx, d[:, 0] ** 2 + d[:, 1] ** 2
+
+    ## Metoda wyszukująca k punktów najbliższych danej pozycji.
+    # Węzły przeglądane są w kolejności odległości ich prostokątów od pozycji (najpierw najbliższe),
+    # a przeszukiwanie kończy się, gdy najbliższy nieprzejrzany węzeł jest dalej niż k-ty znaleziony punkt.
+    # @param pos Pozycja, dla której szukani są sąsiedzi.
+    # @param k Ilość szukanych sąsiadów.
+    # @param mask Opcjonalna tablica flag (N) - brane są pod uwagę tylko punkty z flagą True.
+    # @return Krotka (numery punktów, odległości), posortowane od najbliższego.
+    def query_nearest(self, pos, k=1, mask=None):
+        if len(self.starts) == 0 or k <= 0:
+            return [], []
+
+        pos = np.asarray(pos, dtype=np.double)
+        px, py = float(pos[0]), float(pos[1])
+
+        # kopiec k najlepszych jako (-kwadrat odległości, -numer punktu) - na szczycie najgorszy
+        best = []
+        nodes = [(self.get_node_sqrdist(0, px, py), 0)]
+
+        while len(nodes) > 0:
+            node_sqrdist, node = heapq.heappop(nodes)
+
+            if len(best) == k and node_sqrdist > -best[0][0]:
+                break
+
+            left = self.lefts[node]
+
+            if left < 0:
+                idx, sqrdists = self.get_leaf_sqrdists(node, pos, mask)
+
+                for i, d2 in zip(idx.tolist(), sqrdists.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-d2, -i))
+                    elif (d2, i) < (-best[0][0], -best[0][1]):
+                        heapq.heapreplace(best, (-d2, -i))
+            else:
+                for child in (left, self.rights[node]):
+                    heapq.heappush(nodes, (self.get_node_sqrdist(child, px, py), child))
+
+        best = sorted((-d2, -i) for d2, i in best)
+
+        return [i for d2, i in best], [float(np.sqrt(d2)) for d2, i in best]
+
+    ## Metoda wyszukująca punkty leżące w danym promieniu od pozycji.
+    # @param pos Środek obszaru.
+    # @param radius Promień obszaru.
+    # @param mask Opcjonalna tablica flag (N) - brane są pod uwagę tylko punkty z flagą True.
+    # @return Krotka (numery punktów, odległości), posortowane od najbliższego.
+    def query_radius(self, pos, radius, mask=None):
+        if len(self.starts) == 0:
+            return [], []
+
+        pos = np.asarray(pos, dtype=np.double)
+        px, py = float(pos[0]), float(pos[1])
+        sqrradius = float(radius) ** 2
+
+        found_idx = []
+        found_sqrdists = []
+        nodes = [0]
+
+        while len(nodes) > 0:
+            node = nodes.pop()
+
+            if self.get_node_sqrdist(node, px, py) > sqrradius:
+                continue
+
+            left = self.lefts[node]
+
+            if left < 0:
+                idx, sqrdists = self.get_leaf_sqrdists(node, pos, mask)
+                inside = sqrdists <= sqrradius
+
+                found_idx.append(idx[inside])
+                found_sqrdists.append(sqrdists[inside])
+            else:
+                nodes.append(self.rights[node])
+                nodes.append(left)
+
+        if len(found_idx) == 0:
+            return [], []
+
+        idx = np.concatenate(found_idx)
+        sqrdists = np.concatenate(found_sqrdists)
+        srt = np.lexsort((idx, sqrdists))
+
+        return idx[srt].tolist(), np.sqrt(sqrdists[srt]).tolist()
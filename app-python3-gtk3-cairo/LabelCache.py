@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+## @file LabelCache.py
+## @package LabelCache
+
+from collections import OrderedDict
+
+import cairo
+
+
+## Klasa LabelCache.
+# Pamięć podręczna wymiarów etykiet elementów hipergrafu.
+# Wielkość czcionki etykiety zaokrąglana jest do przedziałów (FONT_STEPS_PER_PIXEL), a wymiary tekstu
+# (cairo text_extents) zapamiętywane są dla pary (tekst, zaokrąglona wielkość czcionki), więc w kolejnych klatkach
+# etykieta nie jest mierzona od nowa. Etykiety o czcionce mniejszej niż MIN_FONT_SIZE nie są rysowane wcale.
+class LabelCache(object):
+
+    ## Krój czcionki etykiet.
+    FONT_FACE = "Terminal"
+
+    ## Minimalna wielkość czcionki (w pikselach), przy której etykieta jest jeszcze czytelna i jest rysowana.
+    MIN_FONT_SIZE = 5.0
+
+    ## Ilość przedziałów na piksel, do których zaokrąglana jest wielkość czcionki.
+    FONT_STEPS_PER_PIXEL = 2
+
+    ## Domyślna maksymalna ilość zapamiętanych wymiarów.
+    DEFAULT_MAX_ENTRIES = 8192
+
+    ## Konstruktor.
+    # @param max_entries Maksymalna ilość zapamiętanych wymiarów.
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+
+        ## Maksymalna ilość zapamiętanych wymiarów.
+        self.max_entries = max_entries
+
+        ## Słownik (tekst, wielkość czcionki) -> wymiary tekstu, od najdawniej użytego.
+        self.entries = OrderedDict()
+
+        ## Ilość trafień.
+        self.hits = 0
+
+        ## Ilość chybień.
+        self.misses = 0
+
+    ## Metoda zwracająca zaokrągloną wielkość czcionki etykiety.
+    # @param radius_zoomed Promień elementu na ekranie.
+    # @param i Numer wiersza etykiety.
+    # @param text Tekst etykiety.
+    # @return Wielkość czcionki lub None, jeśli etykieta byłaby nieczytelna.
+    @staticmethod
+    def get_font_size(radius_zoomed, i, text):
+        font_size = radius_zoomed*(1.5/(1+i/2))*(0.2/len(text) + 0.3)
+
+        if font_size < LabelCache.MIN_FONT_SIZE:
+            return None
+
+        return round(font_size * LabelCache.FONT_STEPS_PER_PIXEL) / LabelCache.FONT_STEPS_PER_PIXEL
+
+    ## Metoda zwracająca największą możliwą wielkość czcionki etykiety elementu (pierwszy wiersz, jeden znak).
+    # Pozwala pominąć etykiety elementu bez liczenia wielkości czcionki każdej z nich.
+    # @param radius_zoomed Promień elementu na ekranie.
+    # @return Wielkość czcionki.
+    @staticmethod
+    def get_max_font_size(radius_zoomed):
+        return radius_zoomed * 0.75
+
+    ## Metoda ustawiająca krój czcionki etykiet (raz dla wszystkich etykiet elementu).
+    # @param cro Kontekst rysowania biblioteki Cairo.
+    @staticmethod
+    def select_font(cro):
+        cro.select_font_face(LabelCache.FONT_FACE, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+
+    ## Metoda ustawiająca wielkość czcionki i zwracająca wymiary tekstu.
+    # Krój czcionki musi być wcześniej ustawiony przez select_font.
+    # @param cro Kontekst rysowania biblioteki Cairo.
+    # @param text Tekst etykiety.
+    # @param font_size Wielkość czcionki (jak z get_font_size).
+    # @return Wymiary tekstu (cairo text_extents).
+    def set_font_size(self, cro, text, font_size):
+        cro.set_font_size(font_size)
+
+        key = (text, font_size)
+        extents = self.entries.get(key)
+
+        if extents is None:
+            self.misses += 1
+            extents = tuple(cro.text_extents(text))
+
+            self.entries[key] = extents
+
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return extents
+
+    ## Metoda usuwająca wszystkie zapamiętane wymiary.
+    def clear(self):
+        self.entries.clear()
+
+    ## Metoda zwracająca statystyki pamięci podręcznej.
+    # @return Słownik ze statystykami.
+    def get_stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses
+        }
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+## @file LayoutEngine.py
+## @package LayoutEngine
+
+import time
+
+from HyperGraph import HyperGraph
+from MultilevelLayout import MultilevelLayout
+
+
+## Klasa LayoutEngine.
+# Układanie hipergrafu bez interfejsu graficznego (bez GTK).
+# Symulacja HyperGraph.update wykonywana jest z ustalonym krokiem czasu, tak jak w oknie aplikacji
+# przy włączonej animacji, ale bez rysowania i bez ograniczenia do częstotliwości odświeżania okna.
+# Symulacja kończy się po zadanej ilości kroków lub wcześniej, gdy energia kinetyczna elementów
+# spadnie poniżej progu (układ się ustabilizował).
+class LayoutEngine(object):
+
+    ## Domyślny krok czasu symulacji (taki sam jak w oknie aplikacji).
+    DEFAULT_TIME_DELTA_SEC = 1.0 / 240.0
+
+    ## Konstruktor.
+    # @param hg Obiekt hipergrafu do ułożenia.
+    # @param dt Krok czasu symulacji.
+    # @param theta Opcjonalny kąt otwarcia drzewa Barnes-Hut dla układania hipergałęzi (None - obliczenia dokładne).
+    def __init__(self, hg, dt=DEFAULT_TIME_DELTA_SEC, theta=None):
+
+        ## Układany hipergraf.
+        self.hg = hg
+
+        ## Krok czasu symulacji.
+        self.dt = dt
+
+        ## Kąt otwarcia drzewa Barnes-Hut.
+        self.theta = theta
+
+        ## Ilość wykonanych kroków symulacji.
+        self.steps = 0
+
+    ## Metoda tworząca silnik układania dla hipergrafu wczytanego z pliku.
+    # @param path Ścieżka pliku hipergrafu (*.hg lub *.py3hg).
+    # @param dt Krok czasu symulacji.
+    # @param theta Opcjonalny kąt otwarcia drzewa Barnes-Hut.
+    # @return Obiekt klasy LayoutEngine.
+    @staticmethod
+    def from_file(path, dt=DEFAULT_TIME_DELTA_SEC, theta=None):
+        hg = HyperGraph()
+        hg.load_hg_from_file(path)
+
+        return LayoutEngine(hg, dt=dt, theta=theta)
+
+    ## Metoda układająca wstępnie hipergraf metodą wielopoziomową (MultilevelLayout).
+    # Dla dużych modeli symulacja startująca z takiego ułożenia potrzebuje wielokrotnie mniej kroków.
+    # @param seed Ziarno generatora liczb losowych.
+    # @return Słownik ze statystykami układania wielopoziomowego.
+    def initialize_multilevel(self, seed=0):
+        return MultilevelLayout.arrange(self.hg, seed=seed)
+
+    ## Metoda wykonująca jeden krok symulacji.
+    def step(self):
+        self.hg.update(self.dt, theta=self.theta, verbose=False)
+        self.steps += 1
+
+    ## Metoda wykonująca symulację.
+    # @param max_steps Maksymalna ilość kroków.
+    # @param energy_threshold Opcjonalny próg energii kinetycznej - symulacja kończy się, gdy energia spadnie poniżej niego.
+    # @param report_every Co ile kroków wywoływać funkcję report (None - nie wywoływać).
+    # @param report Opcjonalna funkcja przyjmująca słownik ze statystykami symulacji.
+    # @return Słownik ze statystykami symulacji.
+    def run(self, max_steps, energy_threshold=None, report_every=None, report=None):
+        tstart = time.time()
+        steps_start = self.steps
+
+        converged = False
+
+        for i in range(max_steps):
+            self.step()
+
+            energy = self.hg.get_kinetic_energy()
+            converged = energy_threshold is not None and energy < energy_threshold
+
+            if report is not None and report_every is not None and (i + 1) % report_every == 0:
+                report(self.get_stats(self.steps - steps_start, time.time() - tstart, energy, converged))
+
+            if converged:
+                break
+
+        return self.get_stats(self.steps - steps_start, time.time() - tstart, self.hg.get_kinetic_energy(), converged)
+
+    ## Metoda zwracająca słownik ze statystykami symulacji.
+    # @param steps Ilość wykonanych kroków.
+    # @param seconds Czas wykonania kroków.
+    # @param energy Energia kinetyczna po ostatnim kroku.
+    # @param converged Czy energia spadła poniżej progu.
+    # @return Słownik ze statystykami.
+    def get_stats(self, steps, seconds, energy, converged):
+        return {
+            "steps": steps,
+            "total_steps": self.steps,
+            "seconds": seconds,
+            "steps_per_sec": steps / seconds if seconds > 0 else float('inf'),
+            "kinetic_energy": energy,
+            "converged": converged
+        }
+
+    ## Metoda zapisująca ułożony hipergraf do pliku.
+    # @param path Ścieżka pliku (*.hg).
+    def save(self, path):
+        self.hg.save_hg_to_file(path)
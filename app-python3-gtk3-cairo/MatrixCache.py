@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+## @file MatrixCache.py
+## @package MatrixCache
+
+from collections import OrderedDict
+from functools import wraps
+import sys
+
+import numpy as np
+
+
+## Klasa MatrixCache.
+# Pamięć podręczna wyników macierzowych hipergrafu (A, Ab, R, B, P, D, S, macierze odległości...).
+# Wyniki zapamiętywane są dla klucza (rodzaj macierzy, argumenty - np. podzbiór id) razem z wersją hipergrafu,
+# dla której zostały policzone. Wersja to para (wersja struktury, wersja geometrii) - macierze zależne tylko od
+# struktury mają wersję geometrii równą None, więc zmiana pozycji elementów ich nie unieważnia.
+# Wyniki ze starszych wersji nie mogą być już użyte i są usuwane przy pierwszym zapytaniu z nowszą wersją.
+# Rozmiar pamięci ograniczony jest budżetem w bajtach, a przy jego przekroczeniu usuwane są wyniki
+# najdawniej używane (LRU).
+# Zapamiętane macierze są tylko do odczytu.
+class MatrixCache(object):
+
+    ## Domyślny budżet pamięci podręcznej w bajtach.
+    DEFAULT_BUDGET_BYTES = 256 * 1024 * 1024
+
+    ## Konstruktor.
+    # @param budget_bytes Maksymalna łączna wielkość zapamiętanych wyników w bajtach.
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+
+        ## Maksymalna łączna wielkość zapamiętanych wyników w bajtach.
+        self.budget_bytes = budget_bytes
+
+        ## Słownik klucz -> (wersja, wynik, rozmiar), w kolejności od najdawniej użytego.
+        self.entries = OrderedDict()
+
+        ## Łączna wielkość zapamiętanych wyników w bajtach.
+        self.used_bytes = 0
+
+        ## Ostatnio widziana wersja struktury hipergrafu.
+        self.structure_version = None
+
+        ## Ostatnio widziana wersja geometrii hipergrafu.
+        self.geometry_version = None
+
+        ## Ilość trafień.
+        self.hits = 0
+
+        ## Ilość chybień.
+        self.misses = 0
+
+        ## Ilość wyników usuniętych z powodu przekroczenia budżetu.
+        self.evictions = 0
+
+        ## Ilość wyników usuniętych z powodu zmiany wersji hipergrafu.
+        self.invalidations = 0
+
+        ## Ilość wyników zaktualizowanych do nowej wersji struktury hipergrafu bez liczenia od nowa.
+        self.updates = 0
+
+    ## Metoda zamieniająca argumenty wywołania na postać, która może być kluczem słownika.
+    # Listy, krotki i tablice NumPy zamieniane są na krotki (kolejność jest zachowana), zbiory na posortowane krotki.
+    # @param obj Obiekt do zamiany.
+    # @return Obiekt niezmienny, nadający się na klucz.
+    @staticmethod
+    def freeze(obj):
+        if isinstance(obj, (list, tuple)):
+            return tuple(MatrixCache.freeze(o) for o in obj)
+        elif isinstance(obj, np.ndarray):
+            return MatrixCache.freeze(obj.tolist())
+        elif isinstance(obj, (set, frozenset)):
+            return ('set',) + tuple(sorted(MatrixCache.freeze(o) for o in obj))
+        elif isinstance(obj, dict):
+            return ('dict',) + tuple(sorted((k, MatrixCache.freeze(v)) for k, v in obj.items()))
+        else:
+            return obj
+
+    ## Metoda szacująca rozmiar wyniku w bajtach.
+    # @param result Wynik do zapamiętania (słownik macierzy lub obiekt z metodą get_nbytes).
+    # @return Rozmiar w bajtach.
+    @staticmethod
+    def get_result_nbytes(result):
+        if isinstance(result, dict) and "matrix" in result:
+            return np.asarray(result["matrix"]).nbytes + 8 * (len(result["lines"]) + len(result["columns"]))
+        elif hasattr(result, 'get_nbytes'):
+            return result.get_nbytes()
+        else:
+            return sys.getsizeof(result)
+
+    ## Metoda przygotowująca wynik do zapamiętania - macierz staje się tylko do odczytu.
+    # @param result Wynik do zapamiętania.
+    @staticmethod
+    def freeze_result(result):
+        if isinstance(result, dict) and isinstance(result.get("matrix"), np.ndarray):
+            result["matrix"].setflags(write=False)
+
+    ## Metoda zwracająca wynik dla wywołującego.
+    # Słownik wyniku i listy opisów wierszy i kolumn są kopiowane, macierz jest współdzielona (tylko do odczytu).
+    # @param result Zapamiętany wynik.
+    # @return Wynik do zwrócenia.
+    @staticmethod
+    def copy_result(result):
+        if isinstance(result, dict) and "matrix" in result:
+            res = dict(result)
+            res["lines"] = list(result["lines"])
+            res["columns"] = list(result["columns"])
+            return res
+        else:
+            return result
+
+    ## Metoda usuwająca wyniki policzone dla wersji hipergrafu starszych niż dana.
+    # @param structure_version Aktualna wersja struktury.
+    # @param geometry_version Aktualna wersja geometrii.
+    def invalidate_older(self, structure_version, geometry_version):
+        if structure_version == self.structure_version and geometry_version == self.geometry_version:
+            return
+
+        for key in list(self.entries.keys()):
+            (sv, gv), result, nbytes = self.entries[key]
+
+            if sv != structure_version or (gv is not None and gv != geometry_version):
+                self.remove(key)
+                self.invalidations += 1
+
+        self.structure_version = structure_version
+        self.geometry_version = geometry_version
+
+    ## Metoda usuwająca wynik z pamięci podręcznej.
+    # @param key Klucz wyniku.
+    def remove(self, key):
+        version, result, nbytes = self.entries.pop(key)
+        self.used_bytes -= nbytes
+
+    ## Metoda zwracająca zapamiętany wynik lub liczącą go i zapamiętującą.
+    # @param key Klucz wyniku (rodzaj macierzy i argumenty).
+    # @param version Para (wersja struktury, wersja geometrii lub None).
+    # @param compute Funkcja bezargumentowa licząca wynik.
+    # @return Wynik.
+    def get_or_compute(self, key, version, compute):
+        structure_version, geometry_version = version
+
+        self.invalidate_older(structure_version, self.geometry_version if geometry_version is None else geometry_version)
+
+        entry = self.entries.get(key)
+
+        if entry is not None and entry[0] == version:
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return MatrixCache.copy_result(entry[1])
+
+        self.misses += 1
+
+        result = compute()
+
+        self.put(key, version, result)
+
+        return MatrixCache.copy_result(result)
+
+    ## Metoda przenosząca zapamiętane wyniki do nowej wersji struktury hipergrafu.
+    # Wyniki aktualnej wersji przekazywane są do funkcji aktualizującej, a zwrócone przez nią wyniki
+    # zapamiętywane są dla nowej wersji. Pozostałe wyniki są usuwane.
+    # @param old_structure_version Wersja struktury, dla której policzono wyniki.
+    # @param new_structure_version Nowa wersja struktury.
+    # @param update Funkcja przyjmująca słownik klucz -> wynik i zwracająca słownik zaktualizowanych wyników.
+    def advance(self, old_structure_version, new_structure_version, update):
+        current = OrderedDict((key, entry[1]) for key, entry in self.entries.items() if entry[0] == (old_structure_version, None))
+
+        updated = update(current) if len(current) > 0 else dict()
+
+        for key in updated:
+            self.remove(key)
+
+        self.invalidate_older(new_structure_version, self.geometry_version)
+
+        for key in current:
+            if updated.get(key) is not None:
+                self.put(key, (new_structure_version, None), updated[key])
+                self.updates += 1
+
+    ## Metoda zapamiętująca wynik.
+    # Jeśli wynik jest większy niż cały budżet, nie jest zapamiętywany.
+    # @param key Klucz wyniku.
+    # @param version Para (wersja struktury, wersja geometrii lub None).
+    # @param result Wynik do zapamiętania.
+    def put(self, key, version, result):
+        nbytes = MatrixCache.get_result_nbytes(result)
+
+        if key in self.entries:
+            self.remove(key)
+
+        if nbytes > self.budget_bytes:
+            return
+
+        MatrixCache.freeze_result(result)
+
+        self.entries[key] = (version, result, nbytes)
+        self.used_bytes += nbytes
+
+        while self.used_bytes > self.budget_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    ## Metoda usuwająca wszystkie zapamiętane wyniki.
+    def clear(self):
+        self.entries.clear()
+        self.used_bytes = 0
+
+    ## Metoda zwracająca statystyki pamięci podręcznej.
+    # @return Słownik ze statystykami.
+    def get_stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "updates": self.updates,
+            "entries": len(self.entries),
+            "used_bytes": self.used_bytes,
+            "budget_bytes": self.budget_bytes
+        }
+
+    def __repr__(self):
+        return 'MatrixCache({})'.format(self.get_stats())
+
+
+## Dekorator na metody hipergrafu zwracające wyniki zależne tylko od struktury hipergrafu.
+#  Wynik jest zapamiętywany w pamięci podręcznej hipergrafu dla danych argumentów i wersji struktury.
+# @param method Metoda, która ma zostać obudowana.
+# @return Zwraca dalej funkcję, która obudowuje daną funkcję.
+def structure_cache_decorator(method):
+    @wraps(method)
+    def _impl(hgobj, *method_args, **method_kwargs):
+        key = (method.__name__, MatrixCache.freeze(method_args), MatrixCache.freeze(method_kwargs))
+        version = (hgobj.get_structure_version(), None)
+
+        return hgobj.matrix_cache.get_or_compute(key, version, lambda: method(hgobj, *method_args, **method_kwargs))
+
+    return _impl
+
+
+## Dekorator na metody hipergrafu zwracające wyniki zależne od pozycji elementów.
+#  Wynik jest zapamiętywany w pamięci podręcznej hipergrafu dla danych argumentów, wersji struktury i wersji geometrii.
+# @param method Metoda, która ma zostać obudowana.
+# @return Zwraca dalej funkcję, która obudowuje daną funkcję.
+def geometry_cache_decorator(method):
+    @wraps(method)
+    def _impl(hgobj, *method_args, **method_kwargs):
+        key = (method.__name__, MatrixCache.freeze(method_args), MatrixCache.freeze(method_kwargs))
+        version = (hgobj.get_structure_version(), hgobj.get_geometry_version())
+
+        return hgobj.matrix_cache.get_or_compute(key, version, lambda: method(hgobj, *method_args, **method_kwargs))
+
+    return _impl
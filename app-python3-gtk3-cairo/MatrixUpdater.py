@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+## @file MatrixUpdater.py
+## @package MatrixUpdater
+
+import numpy as np
+
+
+## Klasa MatrixUpdater.
+# Klasa aktualizująca zapamiętane macierze hipergrafu po zmianie pojedynczego elementu,
+# bez liczenia ich od nowa.
+# Aktualizowane są macierze liczone dla całego hipergrafu: rzadka macierz incydencji oraz A, Ab, A (string), R, Rb, B, Bb, P i Pb.
+# Każda zmiana sprowadzana jest do prostych operacji:
+# - dodanie pustego wiersza (wierzchołek) lub pustej kolumny (hipergałąź) na końcu,
+# - usunięcie pustego wiersza lub pustej kolumny,
+# - podmiana zawartości jednej kolumny - A dostaje nową kolumnę, do R i P odejmowane są przejścia starej
+#   zawartości i dodawane przejścia nowej (aktualizacja rzędu k), a w B liczony jest od nowa jeden wiersz i jedna kolumna.
+# Zapamiętane macierze są tylko do odczytu, więc każda aktualizacja tworzy nową macierz.
+class MatrixUpdater:
+
+    ## Zmiana: dodano wierzchołek.
+    NODE_ADDED = 'node_added'
+
+    ## Zmiana: usunięto wierzchołek.
+    NODE_REMOVED = 'node_removed'
+
+    ## Zmiana: dodano hipergałąź.
+    HYPERBRANCH_ADDED = 'hyperbranch_added'
+
+    ## Zmiana: usunięto hipergałąź.
+    HYPERBRANCH_REMOVED = 'hyperbranch_removed'
+
+    ## Nazwa metody hipergrafu zwracającej rzadką macierz incydencji.
+    INCIDENCE_KIND = 'get_incidence_matrix'
+
+    ## Rodzaje wymiarów (wierzchołki lub hipergałęzie) wierszy i kolumn aktualizowanych macierzy.
+    KIND_AXES = {
+        'macierz_incydencji':                     ('node', 'hb'),
+        'bin_macierz_incydencji':                 ('node', 'hb'),
+        'macierz_incydencji_u21':                 ('node', 'hb'),
+        'macierz_przyleglosci_wierzcholkow':      ('node', 'node'),
+        'bin_macierz_przyleglosci_wierzcholkow':  ('node', 'node'),
+        'macierz_przejsc':                        ('node', 'node'),
+        'bin_macierz_przejsc':                    ('node', 'node'),
+        'macierz_przyleglosci_galezi':            ('hb', 'hb'),
+        'bin_macierz_przyleglosci_galezi':        ('hb', 'hb')
+    }
+
+    ## Macierze binarne i macierze, z których są wyznaczane.
+    BINARY_SOURCES = {
+        'bin_macierz_przyleglosci_wierzcholkow':  'macierz_przyleglosci_wierzcholkow',
+        'bin_macierz_przejsc':                    'macierz_przejsc',
+        'bin_macierz_przyleglosci_galezi':        'macierz_przyleglosci_galezi'
+    }
+
+    ## Metoda sprawdzająca, czy klucz pamięci podręcznej dotyczy wyniku dla całego hipergrafu.
+    # @param key Klucz (nazwa metody, argumenty, argumenty nazwane).
+    # @return True, jeśli wszystkie argumenty są równe None.
+    @staticmethod
+    def is_full_graph_key(key):
+        name, args, kwargs = key
+
+        return all(a is None for a in args) and all(v is None for k, v in kwargs[1:])
+
+    ## Metoda aktualizująca zapamiętane wyniki po zmianie hipergrafu.
+    # @param hgobj Obiekt hipergrafu (już po zmianie).
+    # @param change Krotka (rodzaj zmiany, id elementu).
+    # @param entries Słownik klucz -> wynik dla poprzedniej wersji struktury.
+    # @return Słownik klucz -> zaktualizowany wynik. Wyniki, których nie da się zaktualizować, są pomijane.
+    @staticmethod
+    def update_entries(hgobj, change, entries):
+        incidence_keys = [key for key in entries if key[0] == MatrixUpdater.INCIDENCE_KIND]
+
+        if len(incidence_keys) == 0:
+            return dict()
+
+        incidence = entries[incidence_keys[0]]
+
+        results = dict((key, result) for key, result in entries.items()
+                       if key[0] in MatrixUpdater.KIND_AXES and MatrixUpdater.is_full_graph_key(key)
+                       and MatrixUpdater.has_incidence_labels(result, incidence, MatrixUpdater.KIND_AXES[key[0]]))
+
+        steps = MatrixUpdater.get_steps(hgobj, change, incidence)
+
+        if steps is None:
+            return dict()
+
+        for step in steps:
+            new_incidence = MatrixUpdater.apply_step_to_incidence(step, incidence)
+
+            if new_incidence is None:
+                return dict()
+
+            results = MatrixUpdater.apply_step_to_results(step, incidence, new_incidence, results)
+            incidence = new_incidence
+
+        results[incidence_keys[0]] = incidence
+
+        return results
+
+    ## Metoda sprawdzająca, czy opis wierszy i kolumn wyniku zgadza się z macierzą incydencji.
+    # @param result Słownik z macierzą wraz z opisem wierszy i kolumn.
+    # @param incidence Rzadka macierz incydencji.
+    # @param axes Rodzaje wymiarów wierszy i kolumn.
+    # @return True, jeśli wynik może zostać zaktualizowany.
+    @staticmethod
+    def has_incidence_labels(result, incidence, axes):
+        labels = {'node': incidence.nodes_id, 'hb': incidence.hbid_list}
+
+        return list(result["lines"]) == labels[axes[0]] and list(result["columns"]) == labels[axes[1]]
+
+    ## Metoda rozkładająca zmianę hipergrafu na proste operacje.
+    # @param hgobj Obiekt hipergrafu (już po zmianie).
+    # @param change Krotka (rodzaj zmiany, id elementu).
+    # @param incidence Rzadka macierz incydencji sprzed zmiany.
+    # @return Lista krotek operacji lub None, jeśli zmiany nie da się tak rozłożyć.
+    @staticmethod
+    def get_steps(hgobj, change, incidence):
+        kind, xid = change
+
+        if kind == MatrixUpdater.NODE_ADDED:
+            return [('append', 'node', xid)]
+
+        elif kind == MatrixUpdater.NODE_REMOVED:
+            return [('delete', 'node', xid)]
+
+        elif kind == MatrixUpdater.HYPERBRANCH_ADDED:
+            hbtype = hgobj.get_hbnode_by_id(xid).get_hyperbranch_type()
+            elements = hgobj.P.get(xid, ())
+
+            if len(elements) == 0:
+                return [('append', 'hb', xid, hbtype)]
+
+            return [('append', 'hb', xid, hbtype),
+                    ('replace', 'hb', xid, hbtype, elements)]
+
+        elif kind == MatrixUpdater.HYPERBRANCH_REMOVED and xid in incidence.hb_index:
+            hbtype = int(incidence.hbtypes[incidence.hb_index[xid]])
+
+            return [('replace', 'hb', xid, hbtype, ()),
+                    ('delete', 'hb', xid)]
+
+        return None
+
+    ## Metoda wykonująca prostą operację na rzadkiej macierzy incydencji.
+    # @param step Krotka operacji.
+    # @param incidence Rzadka macierz incydencji.
+    # @return Nowa macierz incydencji lub None, jeśli operacji nie da się wykonać.
+    @staticmethod
+    def apply_step_to_incidence(step, incidence):
+        op, axis, xid = step[:3]
+
+        if op == 'append':
+            if axis == 'node':
+                return incidence.with_node_added(xid)
+            else:
+                return incidence.with_hyperbranch_added(xid, step[3])
+
+        elif op == 'delete':
+            # usuwane mogą być tylko puste wiersze i kolumny - wtedy pozostałe komórki macierzy się nie zmieniają
+            if axis == 'node':
+                if xid not in incidence.node_index or len(incidence.get_row(xid)[0]) > 0:
+                    return None
+
+                return incidence.with_node_removed(xid)
+            else:
+                if xid not in incidence.hb_index or len(incidence.get_column(xid)[0]) > 0:
+                    return None
+
+                return incidence.with_hyperbranch_removed(xid)
+
+        elif op == 'replace':
+            if xid not in incidence.hb_index or any(nid not in incidence.node_index for nid in step[4]):
+                return None
+
+            return incidence.with_hyperbranch_replaced(xid, step[3], step[4])
+
+        return None
+
+    ## Metoda wykonująca prostą operację na wszystkich gęstych wynikach.
+    # @param step Krotka operacji.
+    # @param old_incidence Rzadka macierz incydencji sprzed operacji.
+    # @param new_incidence Rzadka macierz incydencji po operacji.
+    # @param results Słownik klucz -> wynik.
+    # @return Słownik klucz -> zaktualizowany wynik.
+    @staticmethod
+    def apply_step_to_results(step, old_incidence, new_incidence, results):
+        updated = dict()
+
+        # macierze binarne aktualizowane są na podstawie już zaktualizowanych macierzy źródłowych
+        ordered_keys = sorted(results.keys(), key=lambda k: k[0] in MatrixUpdater.BINARY_SOURCES)
+
+        for key in ordered_keys:
+            kind = key[0]
+            axes = MatrixUpdater.KIND_AXES[kind]
+            M = results[key]["matrix"]
+
+            if step[0] == 'append':
+                M = MatrixUpdater.append_empty(M, axes, step[1])
+
+            elif step[0] == 'delete':
+                index = old_incidence.node_index[step[2]] if step[1] == 'node' else old_incidence.hb_index[step[2]]
+                M = MatrixUpdater.delete_line(M, axes, step[1], index)
+
+            elif step[0] == 'replace':
+                source = MatrixUpdater.find_updated_source(kind, updated)
+
+                if kind in MatrixUpdater.BINARY_SOURCES and source is None:
+                    continue
+
+                M = MatrixUpdater.replace_hyperbranch(kind, M, step[2], old_incidence, new_incidence, source)
+
+            labels = {'node': new_incidence.nodes_id, 'hb': new_incidence.hbid_list}
+
+            updated[key] = {
+                "matrix": M,
+                "lines": list(labels[axes[0]]),
+                "columns": list(labels[axes[1]])
+            }
+
+        return updated
+
+    ## Metoda wyszukująca zaktualizowaną macierz, z której wyznaczana jest dana macierz binarna.
+    # @param kind Rodzaj macierzy.
+    # @param updated Słownik klucz -> zaktualizowany wynik.
+    # @return Macierz źródłowa lub None.
+    @staticmethod
+    def find_updated_source(kind, updated):
+        source_kind = MatrixUpdater.BINARY_SOURCES.get(kind)
+
+        for key, result in updated.items():
+            if key[0] == source_kind:
+                return result["matrix"]
+
+        return None
+
+    ## Metoda dodająca pusty wiersz i/lub kolumnę na końcu macierzy.
+    # @param M Macierz NumPy.
+    # @param axes Rodzaje wymiarów wierszy i kolumn macierzy.
+    # @param axis Rodzaj dodawanego elementu ('node' lub 'hb').
+    # @return Nowa macierz NumPy.
+    @staticmethod
+    def append_empty(M, axes, axis):
+        shape = tuple(size + 1 if axes[d] == axis else size for d, size in enumerate(M.shape))
+
+        M2 = np.full(shape, '0' if M.dtype.kind == 'U' else 0, dtype=M.dtype)
+        M2[:M.shape[0], :M.shape[1]] = M
+
+        return M2
+
+    ## Metoda usuwająca wiersz i/lub kolumnę macierzy.
+    # @param M Macierz NumPy.
+    # @param axes Rodzaje wymiarów wierszy i kolumn macierzy.
+    # @param axis Rodzaj usuwanego elementu ('node' lub 'hb').
+    # @param index Numer usuwanego wiersza lub kolumny.
+    # @return Nowa macierz NumPy.
+    @staticmethod
+    def delete_line(M, axes, axis, index):
+        for d in range(2):
+            if axes[d] == axis:
+                M = np.delete(M, index, axis=d)
+
+        return M
+
+    ## Metoda aktualizująca macierz po podmianie zawartości kolumny hipergałęzi.
+    # @param kind Rodzaj macierzy.
+    # @param M Macierz NumPy sprzed zmiany.
+    # @param hbid Id hipergałęzi.
+    # @param old_incidence Rzadka macierz incydencji sprzed zmiany.
+    # @param new_incidence Rzadka macierz incydencji po zmianie.
+    # @param source Zaktualizowana macierz źródłowa (dla macierzy binarnych) lub None.
+    # @return Nowa macierz NumPy.
+    @staticmethod
+    def replace_hyperbranch(kind, M, hbid, old_incidence, new_incidence, source):
+        # macierz z pamięci podręcznej jest tylko do odczytu, macierz utworzona w poprzedniej operacji może być zmieniana
+        if not M.flags.writeable:
+            M = np.array(M)
+        j = new_incidence.hb_index[hbid]
+
+        if kind == 'macierz_incydencji':
+            M[:, j] = new_incidence.to_dense(None, [hbid])[:, 0]
+
+        elif kind == 'bin_macierz_incydencji':
+            M[:, j] = new_incidence.to_dense_binary(None, [hbid])[:, 0]
+
+        elif kind == 'macierz_incydencji_u21':
+            M[:, j] = new_incidence.to_dense_u21(None, [hbid])[:, 0]
+
+        elif kind in ('macierz_przyleglosci_galezi', 'bin_macierz_przyleglosci_galezi'):
+            if source is None:
+                row = new_incidence.get_hyperbranch_adjacency_row(hbid)
+            else:
+                row = np.where(source[j] != 0, 1, 0)
+
+            M[j, :] = row
+            M[:, j] = row
+
+        else:
+            if kind in ('macierz_przejsc', 'bin_macierz_przejsc'):
+                old_pi, old_pj = old_incidence.get_transition_pairs(columns=[j])
+                new_pi, new_pj = new_incidence.get_transition_pairs(columns=[j])
+            else:
+                old_pi, old_pj = old_incidence.get_node_adjacency_pairs(columns=[j])
+                new_pi, new_pj = new_incidence.get_node_adjacency_pairs(columns=[j])
+
+            if source is None:
+                np.subtract.at(M, (old_pi, old_pj), 1)
+                np.add.at(M, (new_pi, new_pj), 1)
+            else:
+                pi = np.concatenate((old_pi, new_pi))
+                pj = np.concatenate((old_pj, new_pj))
+
+                M[pi, pj] = np.where(source[pi, pj] != 0, 1, 0)
+
+        return M
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+## @file MultilevelLayout.py
+## @package MultilevelLayout
+
+import time
+
+import numpy as np
+
+from VertStore import VertStore
+from VertArranger import VertArranger
+from QuadTree import QuadTree
+
+
+## Klasa MultilevelLayout.
+# Wielopoziomowe wstępne układanie dużych hipergrafów (zgrubne ułożenie - rzutowanie - poprawianie).
+# Hipergraf traktowany jest jako graf dwudzielny elementów (wierzchołków i hipergałęzi) połączonych
+# krawędziami incydencji. Graf jest kolejno zgrubiany przez łączenie par elementów:
+#  - najpierw element z sąsiadem, z którym łączy go najcięższa krawędź (np. hipergałąź z jej wierzchołkiem),
+#  - potem pozostałe, niepołączone wierzchołki tej samej hipergałęzi (sąsiedzi wspólnego elementu) parami,
+#  - na końcu pozostałe elementy bez połączeń parami.
+# Najmniejszy graf układany jest od zera, a następnie pozycje rzutowane są na coraz dokładniejsze poziomy
+# (elementy dostają pozycję swojej grupy z niewielkim przesunięciem) i poprawiane kilkudziesięcioma iteracjami.
+# Siły są takie jak w HyperGraph.update, z tymi samymi stałymi: sprężyny i odpychanie par hipergałąź-wierzchołek
+# (VertArranger.arrange_pairs_rows), odpychanie hipergałęzi i odpychanie wierzchołków (drzewem QuadTree).
+# Element zgrubiony ma osobno masę zawartych hipergałęzi i masę zawartych wierzchołków, a odpychanie wierzchołków
+# działa pomiędzy wszystkimi grupami (w symulacji - tylko wewnątrz hipergałęzi).
+# Przesunięcie w jednej iteracji ograniczone jest malejącą "temperaturą", więc poprawianie jest stabilne
+# niezależnie od mas i stałych sił. Poziom najdokładniejszy (sam hipergraf) jest tylko rzutowany -
+# poprawia go już zwykła symulacja HyperGraph.update.
+class MultilevelLayout(object):
+
+    ## Ilość elementów, poniżej której graf nie jest dalej zgrubiany.
+    COARSEST_SIZE = 32
+
+    ## Maksymalna ilość poziomów.
+    MAX_LEVELS = 40
+
+    ## Zgrubianie kończy się, gdy poziom zmniejsza ilość elementów mniej niż do tej części.
+    MIN_REDUCTION = 0.95
+
+    ## Ilość iteracji układania najmniejszego grafu.
+    COARSEST_ITERATIONS = 300
+
+    ## Ilość iteracji poprawiania na każdym kolejnym poziomie.
+    LEVEL_ITERATIONS = 40
+
+    ## Mnożnik długości sprężyn krawędzi incydencji (jak dla par hipergałąź-wierzchołek w HyperGraph.update).
+    SPRING_U_MUL = 3
+
+    ## Stała sprężystości krawędzi incydencji (jak dla par hipergałąź-wierzchołek w HyperGraph.update).
+    SPRING_K = 2 * 10 ** 6
+
+    ## Stała grawitacyjna par hipergałąź-wierzchołek (jak w HyperGraph.update).
+    SPRING_GRAV = -2 * 10 ** 6
+
+    ## Stała grawitacyjna odpychania hipergałęzi (jak w HyperGraph.update).
+    HB_REPULSION_GRAV = -1 * 10 ** 7
+
+    ## Stała grawitacyjna odpychania wierzchołków (jak dla wierzchołków hipergałęzi w HyperGraph.update).
+    NODE_REPULSION_GRAV = -1 * 10 ** 6
+
+    ## Kąt otwarcia drzewa Barnes-Hut dla odpychania.
+    THETA = 0.8
+
+    ## Współczynnik zamiany przyspieszenia na przesunięcie w jednej iteracji.
+    STEP_GAIN = 1e-4
+
+    ## Współczynnik chłodzenia - temperatura mnożona jest przez niego po każdej iteracji.
+    COOLING = 0.95
+
+    ## Typowa długość krawędzi w układzie (do skalowania temperatury i przesunięć przy rzutowaniu).
+    EDGE_LENGTH = 400.0
+
+    ## Metoda zwracająca krawędzie incydencji hipergrafu jako pary wierszy magazynu stanu.
+    # @param hgobj Obiekt hipergrafu.
+    # @return Krotka (wiersze hipergałęzi, wiersze wierzchołków, wagi krawędzi, flagi wierszy hipergałęzi).
+    @staticmethod
+    def get_hypergraph_edges(hgobj):
+        incidence = hgobj.get_incidence_matrix()
+        node_rows, hb_rows = hgobj.get_incidence_store_rows()
+
+        u = hb_rows[incidence.cols]
+        v = node_rows[incidence.rows]
+
+        is_hb = np.zeros(hgobj.store.count, dtype=bool)
+        is_hb[hb_rows] = True
+
+        return u, v, np.ones(len(u), dtype=np.double), is_hb
+
+    ## Metoda wyznaczająca grupy elementów łączonych w jeden element następnego poziomu.
+    # @param n Ilość elementów poziomu.
+    # @param u Pierwsze elementy krawędzi.
+    # @param v Drugie elementy krawędzi.
+    # @param w Wagi krawędzi.
+    # @param mass Masy elementów (N x 2, przy równych wagach łączone są lżejsze elementy).
+    # @return Krotka (numer grupy każdego elementu, ilość grup).
+    @staticmethod
+    def get_matching(n, u, v, w, mass):
+        match = np.full(n, -1, dtype=np.intp)
+
+        # sąsiedztwo w postaci skompresowanej (CSR), w obu kierunkach
+        src = np.concatenate((u, v))
+        dst = np.concatenate((v, u))
+        ww = np.concatenate((w, w))
+
+        srt = np.argsort(src, kind='stable')
+        dst = dst[srt]
+        ww = ww[srt]
+        indptr = np.searchsorted(src[srt], np.arange(n + 1))
+        degree = np.diff(indptr)
+
+        # 1. łączenie z sąsiadem przez najcięższą krawędź, od elementów o najmniejszym stopniu
+        for x in np.argsort(degree, kind='stable').tolist():
+            if match[x] >= 0 or degree[x] == 0:
+                continue
+
+            nb = dst[indptr[x]:indptr[x + 1]]
+            free = np.logical_and(match[nb] < 0, nb != x)
+
+            if not np.any(free):
+                continue
+
+            nb = nb[free]
+            nb_w = ww[indptr[x]:indptr[x + 1]][free]
+
+            y = nb[np.lexsort((mass[nb].sum(axis=1), -nb_w))[0]]
+
+            match[x] = y
+            match[y] = x
+
+        # 2. łączenie parami niepołączonych sąsiadów wspólnego elementu (np. wierzchołków tej samej hipergałęzi)
+        for x in np.argsort(-degree, kind='stable').tolist():
+            if degree[x] < 2:
+                break
+
+            nb = dst[indptr[x]:indptr[x + 1]]
+            nb = np.unique(nb[np.logical_and(match[nb] < 0, nb != x)])
+
+            if len(nb) < 2:
+                continue
+
+            a = nb[0:len(nb) - 1:2]
+            b = nb[1::2]
+
+            match[a] = b
+            match[b] = a
+
+        # 3. łączenie parami pozostałych elementów bez połączeń
+        lonely = np.flatnonzero(np.logical_and(match < 0, degree == 0))
+        a = lonely[0:len(lonely) - 1:2]
+        b = lonely[1::2]
+
+        match[a] = b
+        match[b] = a
+
+        # numer grupy - mniejszy numer elementu w parze
+        root = np.arange(n, dtype=np.intp)
+        paired = match >= 0
+        root[paired] = np.minimum(root[paired], match[paired])
+
+        roots, parent = np.unique(root, return_inverse=True)
+
+        return parent, len(roots)
+
+    ## Metoda tworząca graf następnego (mniejszego) poziomu.
+    # Krawędzie wewnątrz grup są usuwane, a powtarzające się krawędzie pomiędzy grupami łączone z sumą wag.
+    # @param u Pierwsze elementy krawędzi.
+    # @param v Drugie elementy krawędzi.
+    # @param w Wagi krawędzi.
+    # @param mass Masy elementów (N x 2 - masa hipergałęzi i masa wierzchołków).
+    # @param radius Promienie elementów.
+    # @param parent Numery grup elementów.
+    # @param nc Ilość grup.
+    # @return Krotka (u, v, w, masy, promienie) następnego poziomu.
+    @staticmethod
+    def coarsen(u, v, w, mass, radius, parent, nc):
+        pu = parent[u]
+        pv = parent[v]
+
+        keep = pu != pv
+        a = np.minimum(pu[keep], pv[keep])
+        b = np.maximum(pu[keep], pv[keep])
+
+        keys, inverse = np.unique(a * nc + b, return_inverse=True)
+        cw = np.bincount(inverse, weights=w[keep], minlength=len(keys))
+
+        cmass = np.stack((np.bincount(parent, weights=mass[:, 0], minlength=nc),
+                          np.bincount(parent, weights=mass[:, 1], minlength=nc)), axis=1)
+        cradius = np.sqrt(np.bincount(parent, weights=radius ** 2, minlength=nc))
+
+        return keys // nc, keys % nc, cw, cmass, cradius
+
+    ## Metoda tworząca magazyn stanu dla elementów jednego poziomu.
+    # @param position Pozycje elementów (N x 2).
+    # @param mass Masy elementów (N x 2 - masa hipergałęzi i masa wierzchołków), w magazynie zapisywana jest ich suma.
+    # @param radius Promienie elementów (N).
+    # @return Obiekt klasy VertStore z N wierszami (bez obiektów elementów).
+    @staticmethod
+    def get_level_store(position, mass, radius):
+        n = len(mass)
+
+        st = VertStore(capacity=n)
+        st.count = n
+        st.position[:n] = position
+        st.mass[:n] = mass.sum(axis=1)
+        st.radius[:n] = radius
+
+        return st
+
+    ## Metoda poprawiająca pozycje elementów jednego poziomu.
+    # @param st Magazyn stanu elementów poziomu.
+    # @param u Pierwsze elementy krawędzi.
+    # @param v Drugie elementy krawędzi.
+    # @param w Wagi krawędzi.
+    # @param mass Masy elementów (N x 2 - masa hipergałęzi i masa wierzchołków).
+    # @param iterations Ilość iteracji.
+    # @param temperature Początkowe maksymalne przesunięcie elementu w jednej iteracji.
+    # @param min_temperature Minimalne maksymalne przesunięcie.
+    @staticmethod
+    def refine(st, u, v, w, mass, iterations, temperature, min_temperature):
+        n = st.count
+
+        for i in range(iterations):
+            st.force[:n] = 0.0
+
+            VertArranger.arrange_pairs_rows(st, u, v,
+                                            u_mul=MultilevelLayout.SPRING_U_MUL,
+                                            k=MultilevelLayout.SPRING_K * w,
+                                            grav=MultilevelLayout.SPRING_GRAV)
+
+            for channel, grav in ((0, MultilevelLayout.HB_REPULSION_GRAV), (1, MultilevelLayout.NODE_REPULSION_GRAV)):
+                quadtree = QuadTree(st.position[:n], mass[:, channel])
+                st.force[:n] += quadtree.get_gravity_forces(grav=grav, theta=MultilevelLayout.THETA)
+
+            acc = st.force[:n] / st.mass[:n, np.newaxis]
+            norm = np.sqrt(acc[:, 0] ** 2 + acc[:, 1] ** 2)
+
+            step = np.minimum(norm * MultilevelLayout.STEP_GAIN, temperature)
+            scale = np.divide(step, norm, out=np.zeros_like(norm), where=norm > 0)
+
+            st.position[:n] += acc * scale[:, np.newaxis]
+
+            temperature = max(temperature * MultilevelLayout.COOLING, min_temperature)
+
+        st.force[:n] = 0.0
+
+    ## Metoda układająca hipergraf metodą wielopoziomową.
+    # Pozycje elementów niezaznaczonych są nadpisywane, a ich prędkości zerowane.
+    # @param hgobj Obiekt hipergrafu.
+    # @param seed Ziarno generatora liczb losowych (pozycje początkowe i przesunięcia przy rzutowaniu).
+    # @param verbose Czy wypisywać rozmiary poziomów i czas.
+    # @return Słownik ze statystykami: "levels" (ilości elementów kolejnych poziomów), "seconds".
+    @staticmethod
+    def arrange(hgobj, seed=0, verbose=False):
+        tstart = time.time()
+
+        hg_st = hgobj.store
+        n = hg_st.count
+
+        if n == 0:
+            return {"levels": [], "seconds": 0.0}
+
+        rnd = np.random.RandomState(seed)
+        L = MultilevelLayout.EDGE_LENGTH
+
+        u, v, w, is_hb = MultilevelLayout.get_hypergraph_edges(hgobj)
+
+        # masa hipergałęzi i masa wierzchołków każdego elementu
+        mass = np.zeros((n, 2), dtype=np.double)
+        mass[is_hb, 0] = hg_st.mass[:n][is_hb]
+        mass[np.logical_not(is_hb), 1] = hg_st.mass[:n][np.logical_not(is_hb)]
+
+        radius = np.array(hg_st.radius[:n])
+
+        # ZGRUBIANIE
+        levels = [(n, u, v, w, mass, radius)]
+        parents = []
+
+        while n > MultilevelLayout.COARSEST_SIZE and len(levels) < MultilevelLayout.MAX_LEVELS:
+            parent, nc = MultilevelLayout.get_matching(n, u, v, w, mass)
+
+            if nc > MultilevelLayout.MIN_REDUCTION * n:
+                break
+
+            u, v, w, mass, radius = MultilevelLayout.coarsen(u, v, w, mass, radius, parent, nc)
+            n = nc
+
+            parents.append(parent)
+            levels.append((n, u, v, w, mass, radius))
+
+        # UKŁADANIE NAJMNIEJSZEGO GRAFU
+        n, u, v, w, mass, radius = levels[-1]
+
+        spread = L * np.sqrt(n)
+        position = rnd.uniform(-spread, spread, (n, 2))
+
+        st = MultilevelLayout.get_level_store(position, mass, radius)
+        MultilevelLayout.refine(st, u, v, w, mass, MultilevelLayout.COARSEST_ITERATIONS, spread / 4, L / 20)
+
+        # RZUTOWANIE I POPRAWIANIE
+        for level in range(len(levels) - 2, -1, -1):
+            n, u, v, w, mass, radius = levels[level]
+            parent = parents[level]
+
+            position = st.position[parent] + rnd.uniform(-L / 10, L / 10, (n, 2))
+
+            st = MultilevelLayout.get_level_store(position, mass, radius)
+
+            if level > 0:
+                MultilevelLayout.refine(st, u, v, w, mass, MultilevelLayout.LEVEL_ITERATIONS, L, L / 20)
+
+        # przeniesienie wyniku do hipergrafu - środek układu pozostaje w miejscu
+        n = hg_st.count
+        free = np.logical_not(hg_st.selected[:n])
+
+        result = st.position[:n]
+        result += (np.mean(hg_st.position[:n], axis=0) - np.mean(result, axis=0))
+
+        hg_st.position[:n][free] = result[free]
+        hg_st.velocity[:n][free] = 0.0
+        hg_st.touch_geometry()
+        hg_st.wake(slice(0, n))
+
+        stats = {"levels": [lv[0] for lv in levels], "seconds": time.time() - tstart}
+
+        if verbose:
+            print("multilevel layout \t{0} levels {1}, \tin {2:.3f}s".format(len(levels), stats["levels"], stats["seconds"]))
+
+        return stats
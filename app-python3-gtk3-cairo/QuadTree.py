@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+## @file QuadTree.py
+## @package QuadTree
+
+import numpy as np
+
+
+## Klasa QuadTree.
+# Drzewo czwórkowe (Barnes-Hut) do przybliżonego liczenia sił grawitacji pomiędzy wszystkimi parami elementów
+# w czasie O(n log n) zamiast O(n^2) i bez macierzy odległości n x n.
+# Drzewo budowane jest wektorowo z kodów Mortona: elementy sortowane są po kodzie, a komórki kolejnych poziomów
+# to ciągłe przedziały posortowanych elementów o wspólnym prefiksie kodu.
+# Komórka dostatecznie daleka od elementu (rozmiar / odległość < theta) zastępowana jest jednym ciałem
+# o łącznej masie komórki położonym w jej środku masy.
+class QuadTree(object):
+
+    ## Maksymalna głębokość drzewa (ilość bitów na współrzędną w kodzie Mortona).
+    MAX_DEPTH = 16
+
+    ## Konstruktor - budowa drzewa.
+    # @param positions Tablica pozycji elementów (N x 2).
+    # @param masses Tablica mas elementów (N).
+    def __init__(self, positions, masses):
+
+        ## Pozycje elementów (N x 2).
+        self.positions = np.asarray(positions, dtype=np.double)
+
+        ## Masy elementów (N).
+        self.masses = np.asarray(masses, dtype=np.double)
+
+        n = len(self.masses)
+
+        ## Dla każdego poziomu: klucze komórek, początki przedziałów, ilości elementów, masy i środki mas.
+        self.levels = list()
+
+        ## Dla każdego poziomu (poza ostatnim): zakresy komórek potomnych w tablicach następnego poziomu.
+        self.children = list()
+
+        if n == 0:
+            return
+
+        lo = self.positions.min(axis=0)
+        hi = self.positions.max(axis=0)
+
+        ## Długość boku kwadratu obejmującego wszystkie elementy (korzeń drzewa).
+        self.size = max(float(np.max(hi - lo)), 1.0) * (1.0 + 1e-9)
+
+        cells_per_side = 1 << QuadTree.MAX_DEPTH
+        q = np.minimum(((self.positions - lo) / self.size * cells_per_side).astype(np.int64), cells_per_side - 1)
+
+        ## Kody Mortona elementów w kolejności z konstruktora.
+        self.body_codes = QuadTree.interleave_bits(q[:, 0]) | (QuadTree.interleave_bits(q[:, 1]) << 1)
+
+        ## Numery elementów posortowane po kodach Mortona.
+        self.order = np.argsort(self.body_codes, kind='stable')
+
+        ## Posortowane kody Mortona elementów.
+        self.codes = self.body_codes[self.order]
+
+        sorted_positions = self.positions[self.order]
+        sorted_masses = self.masses[self.order]
+        sorted_moments = sorted_positions * sorted_masses[:, np.newaxis]
+
+        for level in range(QuadTree.MAX_DEPTH + 1):
+            keys = self.codes >> (2 * (QuadTree.MAX_DEPTH - level))
+            starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+            counts = np.diff(np.append(starts, n))
+
+            cell_masses = np.add.reduceat(sorted_masses, starts)
+            cell_com = np.add.reduceat(sorted_positions, starts, axis=0) / counts[:, np.newaxis]
+
+            # środek masy, a dla komórek o zerowej masie - środek geometryczny elementów
+            has_mass = cell_masses != 0
+            cell_com[has_mass] = np.add.reduceat(sorted_moments, starts, axis=0)[has_mass] / cell_masses[has_mass, np.newaxis]
+
+            self.levels.append({
+                "keys": keys[starts],
+                "starts": starts,
+                "counts": counts,
+                "masses": cell_masses,
+                "com": cell_com
+            })
+
+        for level in range(QuadTree.MAX_DEPTH):
+            child_parent = np.searchsorted(self.levels[level]["keys"], self.levels[level + 1]["keys"] >> 2)
+            first_child = np.searchsorted(child_parent, np.arange(len(self.levels[level]["keys"])))
+            last_child = np.searchsorted(child_parent, np.arange(len(self.levels[level]["keys"])), side='right')
+
+            self.children.append((first_child, last_child - first_child))
+
+    ## Metoda rozsuwająca bity liczby (bit i na pozycję 2i) - składowa kodu Mortona.
+    # @param v Tablica liczb całkowitych (co najwyżej 16-bitowych).
+    # @return Tablica liczb z rozsuniętymi bitami.
+    @staticmethod
+    def interleave_bits(v):
+        v = v.astype(np.int64) & 0xFFFF
+        v = (v | (v << 8)) & 0x00FF00FF
+        v = (v | (v << 4)) & 0x0F0F0F0F
+        v = (v | (v << 2)) & 0x33333333
+        v = (v | (v << 1)) & 0x55555555
+
+        return v
+
+    ## Metoda licząca siły grawitacji działające na wszystkie elementy.
+    # Siła pomiędzy elementami (lub elementem i komórką) jest taka sama jak w VertArranger.get_gravity_force:
+    # grav * m1 * m2 / max(d, min_dist)^2 w kierunku od elementu do drugiego ciała.
+    # @param grav Stała grawitacyjna (ujemna - odpychanie).
+    # @param theta Kąt otwarcia - komórka jest przybliżana, gdy jej rozmiar / odległość < theta. Dla 0 wynik jest dokładny.
+    # @param min_dist Minimalna odległość używana w mianowniku.
+    # @param bodies Opcjonalna tablica numerów elementów, dla których liczone są siły (None - wszystkie).
+    # @return Tablica sił (N x 2) w kolejności elementów z konstruktora (dla elementów spoza bodies - zera).
+    def get_gravity_forces(self, grav, theta, min_dist=32.0, bodies=None):
+        n = len(self.masses)
+        forces = np.zeros((n, 2), dtype=np.double)
+
+        if n < 2:
+            return forces
+
+        # para (element, komórka) - wszystkie elementy zaczynają od korzenia
+        bodies = np.arange(n, dtype=np.intp) if bodies is None else np.asarray(bodies, dtype=np.intp)
+        cells = np.zeros(len(bodies), dtype=np.intp)
+
+        for level in range(QuadTree.MAX_DEPTH + 1):
+            if len(bodies) == 0:
+                break
+
+            lv = self.levels[level]
+            cell_size = self.size / (1 << level)
+
+            body_keys = self.body_codes[bodies] >> (2 * (QuadTree.MAX_DEPTH - level))
+            contains = lv["keys"][cells] == body_keys
+
+            delta = lv["com"][cells] - self.positions[bodies]
+            dist = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+
+            single = lv["counts"][cells] == 1
+            accept = np.logical_and(np.logical_not(contains), np.logical_or(single, cell_size < theta * dist))
+
+            self.add_forces(forces, bodies[accept], lv["masses"][cells[accept]], delta[accept], dist[accept], grav, min_dist)
+
+            # komórki zawierające tylko dany element są pomijane, pozostałe są dzielone
+            expand = np.logical_not(np.logical_or(accept, np.logical_and(contains, single)))
+
+            bodies = bodies[expand]
+            cells = cells[expand]
+
+            if level == QuadTree.MAX_DEPTH:
+                # ostatni poziom - elementy o (prawie) tych samych współrzędnych liczone dokładnie
+                self.add_leaf_forces(forces, bodies, cells, lv, grav, min_dist)
+                break
+
+            first_child, child_count = self.children[level]
+
+            counts = child_count[cells]
+            bodies = np.repeat(bodies, counts)
+            cells = np.repeat(first_child[cells], counts) + QuadTree.get_group_offsets(counts)
+
+        return forces
+
+    ## Metoda zwracająca numery kolejnych pozycji wewnątrz grup (0, 1, ..., count - 1 dla każdej grupy).
+    # @param counts Tablica liczności grup.
+    # @return Tablica o długości sumy liczności.
+    @staticmethod
+    def get_group_offsets(counts):
+        return np.arange(int(counts.sum()), dtype=np.intp) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    ## Metoda dodająca siły grawitacji od ciał (elementów lub komórek) do elementów.
+    # @param forces Tablica sił (N x 2), do której dodawane są wyniki.
+    # @param bodies Numery elementów.
+    # @param masses Masy ciał przyciągających.
+    # @param delta Wektory od elementów do ciał.
+    # @param dist Odległości od elementów do ciał.
+    # @param grav Stała grawitacyjna.
+    # @param min_dist Minimalna odległość używana w mianowniku.
+    def add_forces(self, forces, bodies, masses, delta, dist, grav, min_dist):
+        if len(bodies) == 0:
+            return
+
+        safe_dist = np.where(dist != 0, dist, 1.0)
+        scale = grav * self.masses[bodies] * masses / np.maximum(dist, min_dist) ** 2 / safe_dist
+        scale[dist == 0] = 0.0
+
+        # sumowanie przez np.bincount - znacznie szybsze od np.add.at przy powtarzających się numerach
+        n = len(forces)
+        forces[:, 0] += np.bincount(bodies, weights=delta[:, 0] * scale, minlength=n)
+        forces[:, 1] += np.bincount(bodies, weights=delta[:, 1] * scale, minlength=n)
+
+    ## Metoda dodająca siły od wszystkich innych elementów komórek ostatniego poziomu.
+    # @param forces Tablica sił (N x 2), do której dodawane są wyniki.
+    # @param bodies Numery elementów.
+    # @param cells Numery komórek ostatniego poziomu.
+    # @param lv Słownik opisu ostatniego poziomu.
+    # @param grav Stała grawitacyjna.
+    # @param min_dist Minimalna odległość używana w mianowniku.
+    def add_leaf_forces(self, forces, bodies, cells, lv, grav, min_dist):
+        counts = lv["counts"][cells]
+
+        pair_bodies = np.repeat(bodies, counts)
+        others = self.order[np.repeat(lv["starts"][cells], counts) + QuadTree.get_group_offsets(counts)]
+
+        keep = pair_bodies != others
+        pair_bodies = pair_bodies[keep]
+        others = others[keep]
+
+        delta = self.positions[others] - self.positions[pair_bodies]
+        dist = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+
+        self.add_forces(forces, pair_bodies, self.masses[others], delta, dist, grav, min_dist)
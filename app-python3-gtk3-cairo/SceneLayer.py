@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+## @file SceneLayer.py
+## @package SceneLayer
+
+import cairo
+
+import numpy as np
+
+
+## Klasa SceneLayer.
+# Obraz sceny (tło, siatka i hipergraf) przechowywany poza ekranem, razem z wersją hipergrafu
+# (HyperGraph.get_scene_version), przesunięciem i powiększeniem, dla których został narysowany.
+# Przy odświeżeniu okna:
+#  - jeśli nic się nie zmieniło, obraz jest tylko kopiowany na ekran,
+#  - przy samym przesunięciu widoku obraz kopiowany jest z odpowiednim przesunięciem, a rysowane są od nowa
+#    tylko odsłonięte pasy na brzegach,
+#  - przy zmianie powiększenia (w trakcie przewijania rolką) może zostać pokazany przeskalowany obraz poprzedni,
+#  - jeśli zmieniło się tylko kilka elementów, a okno zgłosiło ich obszar (add_damage), rysowany jest od nowa
+#    tylko ten obszar,
+#  - pełne rysowanie następuje po pozostałych zmianach geometrii, zaznaczenia lub wyglądu elementów
+#    (np. po kroku symulacji), zmianie wielkości okna albo po zakończeniu zmiany powiększenia.
+class SceneLayer(object):
+
+    ## Dopuszczalna różnica (w pikselach) pomiędzy przesunięciem obrazu a całą liczbą pikseli.
+    # Przy większej obraz jest rysowany od nowa, aby nie był rozmywany.
+    SUBPIXEL_TOLERANCE = 0.01
+
+    ## Konstruktor.
+    def __init__(self):
+
+        ## Powierzchnia z obrazem sceny.
+        self.surface = None
+
+        ## Druga powierzchnia, do której kopiowany jest przesunięty obraz.
+        self.back_surface = None
+
+        ## Wymiary obrazu w pikselach (szerokość, wysokość).
+        self.size = None
+
+        ## Hipergraf, którego obraz jest przechowywany.
+        self.hg = None
+
+        ## Magazyn stanu hipergrafu w chwili rysowania.
+        self.store = None
+
+        ## Wersja hipergrafu w chwili rysowania (None - obraz nieaktualny).
+        self.scene_version = None
+
+        ## Wektor przesunięcia płótna, dla którego narysowany jest obraz.
+        self.pan_vec = None
+
+        ## Powiększenie, dla którego narysowany jest obraz.
+        self.zoom = None
+
+        ## Lista prostokątów (x, y, szerokość, wysokość) obrazu do narysowania od nowa.
+        self.damage_rects = list()
+
+        ## Wersja hipergrafu, do której obraz zostanie doprowadzony po narysowaniu damage_rects.
+        self.damage_version = None
+
+        ## Ilość rysowań zmienionych obszarów.
+        self.damage_renders = 0
+
+        ## Ilość pełnych rysowań sceny.
+        self.renders = 0
+
+        ## Ilość przesunięć obrazu z rysowaniem odsłoniętych pasów.
+        self.scrolls = 0
+
+        ## Ilość pokazanych przeskalowanych podglądów.
+        self.previews = 0
+
+    ## Metoda unieważniająca obraz (np. po zmianie, której nie obejmuje wersja hipergrafu).
+    def invalidate(self):
+        self.scene_version = None
+        self.damage_rects = list()
+        self.damage_version = None
+
+    ## Metoda zgłaszająca zmieniony obszar obrazu.
+    # Zgłoszenie jest przyjmowane tylko wtedy, gdy obejmuje wszystkie zmiany od wersji obrazu (lub poprzedniego
+    # zgłoszenia) - w przeciwnym razie obraz jest unieważniany i zostanie narysowany w całości.
+    # @param rect Prostokąt (x, y, szerokość, wysokość) w pikselach ekranu.
+    # @param from_version Wersja hipergrafu przed zmianą.
+    # @param to_version Wersja hipergrafu po zmianie.
+    def add_damage(self, rect, from_version, to_version):
+        if self.scene_version is None:
+            return
+
+        current_version = self.damage_version if self.damage_version is not None else self.scene_version
+
+        if current_version != from_version:
+            self.invalidate()
+            return
+
+        self.damage_rects.append(rect)
+        self.damage_version = to_version
+
+    ## Metoda rysująca scenę na ekranie, w razie potrzeby aktualizując obraz.
+    # @param cr Kontekst rysowania biblioteki Cairo (ekran).
+    # @param hg Rysowany hipergraf.
+    # @param pan_vec Wektor przesunięcia płótna.
+    # @param zoom Powiększenie płótna.
+    # @param size Wymiary obszaru rysowania w pikselach.
+    # @param render Funkcja render(ctx) rysująca całą scenę dla aktualnego przesunięcia i powiększenia.
+    # @param allow_preview Czy przy zmianie powiększenia można pokazać przeskalowany obraz zamiast rysować scenę.
+    def paint(self, cr, hg, pan_vec, zoom, size, render, allow_preview=False):
+        size = (int(size[0]), int(size[1]))
+        scene_version = hg.get_scene_version()
+
+        if self.surface is None or size != self.size or hg is not self.hg or hg.store is not self.store:
+            self.render(hg, pan_vec, zoom, size, render)
+        elif scene_version != self.scene_version:
+            if scene_version == self.damage_version and zoom == self.zoom and \
+                    np.all(np.abs(pan_vec - self.pan_vec) * zoom <= SceneLayer.SUBPIXEL_TOLERANCE):
+                self.render_damage(render)
+            else:
+                self.render(hg, pan_vec, zoom, size, render)
+        elif zoom != self.zoom:
+            if allow_preview:
+                self.paint_preview(cr, pan_vec, zoom)
+                return
+
+            self.render(hg, pan_vec, zoom, size, render)
+        else:
+            offset = (pan_vec - self.pan_vec) * zoom
+            offset_px = np.round(offset)
+
+            if np.any(np.abs(offset - offset_px) > SceneLayer.SUBPIXEL_TOLERANCE) or \
+                    np.any(np.abs(offset_px) >= size):
+                self.render(hg, pan_vec, zoom, size, render)
+            elif np.any(offset_px != 0):
+                self.scroll(int(offset_px[0]), int(offset_px[1]), render)
+
+        cr.set_source_surface(self.surface, 0, 0)
+        cr.paint()
+
+    ## Metoda rysująca całą scenę do obrazu.
+    # @param hg Rysowany hipergraf.
+    # @param pan_vec Wektor przesunięcia płótna.
+    # @param zoom Powiększenie płótna.
+    # @param size Wymiary obrazu w pikselach.
+    # @param render Funkcja rysująca scenę.
+    def render(self, hg, pan_vec, zoom, size, render):
+        if self.surface is None or size != self.size:
+            self.surface = cairo.ImageSurface(cairo.FORMAT_RGB24, size[0], size[1])
+            self.back_surface = None
+
+        render(cairo.Context(self.surface))
+
+        self.size = size
+        self.hg = hg
+        self.store = hg.store
+        self.scene_version = hg.get_scene_version()
+        self.pan_vec = np.array(pan_vec, dtype=np.double)
+        self.zoom = zoom
+        self.damage_rects = list()
+        self.damage_version = None
+        self.renders += 1
+
+    ## Metoda rysująca od nowa zgłoszone zmienione obszary obrazu.
+    # @param render Funkcja rysująca scenę.
+    def render_damage(self, render):
+        ctx = cairo.Context(self.surface)
+
+        for x, y, w, h in self.damage_rects:
+            ctx.rectangle(x, y, w, h)
+
+        ctx.clip()
+        render(ctx)
+
+        self.scene_version = self.damage_version
+        self.damage_rects = list()
+        self.damage_version = None
+        self.damage_renders += 1
+
+    ## Metoda przesuwająca obraz i rysująca odsłonięte pasy.
+    # @param dx Przesunięcie poziome w pikselach.
+    # @param dy Przesunięcie pionowe w pikselach.
+    # @param render Funkcja rysująca scenę.
+    def scroll(self, dx, dy, render):
+        width, height = self.size
+
+        if self.back_surface is None:
+            self.back_surface = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+
+        ctx = cairo.Context(self.back_surface)
+        ctx.set_operator(cairo.OPERATOR_SOURCE)
+        ctx.set_source_surface(self.surface, dx, dy)
+        ctx.paint()
+        ctx.set_operator(cairo.OPERATOR_OVER)
+
+        strips = list()
+
+        if dx > 0:
+            strips.append((0, 0, dx, height))
+        elif dx < 0:
+            strips.append((width + dx, 0, -dx, height))
+
+        if dy > 0:
+            strips.append((0, 0, width, dy))
+        elif dy < 0:
+            strips.append((0, height + dy, width, -dy))
+
+        for x, y, w, h in strips:
+            ctx.save()
+            ctx.rectangle(x, y, w, h)
+            ctx.clip()
+            render(ctx)
+            ctx.restore()
+
+        self.surface, self.back_surface = self.back_surface, self.surface
+
+        # obraz odpowiada przesunięciu o całą liczbę pikseli, a reszta zostaje do następnego przesunięcia
+        self.pan_vec = self.pan_vec + np.array((dx, dy), dtype=np.double) / self.zoom
+        self.scrolls += 1
+
+    ## Metoda rysująca przeskalowany obraz jako podgląd przy zmianie powiększenia.
+    # Punkt płótna p widoczny na obrazie w miejscu (p + pan_vec_obrazu) * zoom_obrazu + środek
+    # rysowany jest w miejscu (p + pan_vec) * zoom + środek.
+    # @param cr Kontekst rysowania biblioteki Cairo (ekran).
+    # @param pan_vec Wektor przesunięcia płótna.
+    # @param zoom Powiększenie płótna.
+    def paint_preview(self, cr, pan_vec, zoom):
+        center = np.array(self.size, dtype=np.double) / 2
+        k = zoom / self.zoom
+        t = center * (1.0 - k) + (pan_vec - self.pan_vec) * zoom
+
+        cr.save()
+        cr.translate(t[0], t[1])
+        cr.scale(k, k)
+        cr.set_source_surface(self.surface, 0, 0)
+        cr.paint()
+        cr.restore()
+
+        self.previews += 1
+
+    ## Metoda zwracająca statystyki obrazu sceny.
+    # @return Słownik ze statystykami.
+    def get_stats(self):
+        return {"renders": self.renders, "damage_renders": self.damage_renders, "scrolls": self.scrolls,
+                "previews": self.previews}
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+## @file SharedPositionBuffer.py
+## @package SharedPositionBuffer
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+## Klasa SharedPositionBuffer.
+# Bufor pozycji i prędkości elementów hipergrafu w pamięci współdzielonej (multiprocessing.shared_memory),
+# przez który proces symulacji przekazuje stan układu do procesu okna bez kopiowania przez potoki.
+# Bufor składa się z nagłówka (HEADER_SIZE liczb) i dwóch tablic capacity x 2: pozycji i prędkości.
+# Zapis i odczyt chronione są licznikiem sekwencji (seqlock): piszący zwiększa licznik przed zapisem
+# (wartość nieparzysta) i po zapisie (wartość parzysta), a czytający ponawia odczyt, jeśli licznik
+# był nieparzysty lub zmienił się w trakcie kopiowania. Dzięki temu żaden z procesów nie czeka na drugi.
+# Bufor ma jednego piszącego (proces symulacji) i jednego czytającego (okno).
+class SharedPositionBuffer(object):
+
+    ## Numer pola nagłówka - licznik sekwencji.
+    H_SEQUENCE = 0
+
+    ## Numer pola nagłówka - numer synchronizacji, do której należą dane (0 - brak danych).
+    H_EPOCH = 1
+
+    ## Numer pola nagłówka - ilość zapisanych elementów.
+    H_COUNT = 2
+
+    ## Numer pola nagłówka - ilość wykonanych kroków symulacji.
+    H_STEPS = 3
+
+    ## Numer pola nagłówka - ilość kroków symulacji na sekundę.
+    H_STEPS_PER_SEC = 4
+
+    ## Numer pola nagłówka - energia kinetyczna elementów.
+    H_KINETIC_ENERGY = 5
+
+    ## Numer pola nagłówka - ilość nieuśpionych elementów.
+    H_AWAKE_COUNT = 6
+
+    ## Ilość pól nagłówka.
+    HEADER_SIZE = 8
+
+    ## Maksymalna ilość prób odczytu spójnego stanu.
+    READ_RETRIES = 8
+
+    ## Konstruktor.
+    # @param capacity Ilość elementów, które mieści bufor.
+    # @param name Opcjonalna nazwa istniejącego bloku pamięci współdzielonej (None - tworzony jest nowy blok).
+    def __init__(self, capacity, name=None):
+
+        ## Ilość elementów, które mieści bufor.
+        self.capacity = max(1, int(capacity))
+
+        nbytes = 8 * (SharedPositionBuffer.HEADER_SIZE + 4 * self.capacity)
+
+        ## Czy blok pamięci został utworzony przez ten obiekt (tylko twórca usuwa blok).
+        self.owner = name is None
+
+        ## Blok pamięci współdzielonej.
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=nbytes)
+
+        ## Nagłówek bufora.
+        self.header = np.ndarray((SharedPositionBuffer.HEADER_SIZE,), dtype=np.double, buffer=self.shm.buf)
+
+        offset = 8 * SharedPositionBuffer.HEADER_SIZE
+
+        ## Tablica pozycji elementów (capacity x 2).
+        self.position = np.ndarray((self.capacity, 2), dtype=np.double, buffer=self.shm.buf, offset=offset)
+
+        ## Tablica prędkości elementów (capacity x 2).
+        self.velocity = np.ndarray((self.capacity, 2), dtype=np.double, buffer=self.shm.buf,
+                                   offset=offset + 16 * self.capacity)
+
+        if self.owner:
+            self.header[:] = 0
+
+    ## Metoda zwracająca nazwę bloku pamięci współdzielonej.
+    # @return Nazwa, pod którą inny proces może dołączyć bufor.
+    def get_name(self):
+        return self.shm.name
+
+    ## Metoda zwracająca licznik sekwencji bufora.
+    # Licznik zmienia się przy każdym zapisie, więc pozwala sprawdzić, czy są nowe dane, bez kopiowania tablic.
+    # @return Wartość licznika sekwencji.
+    def get_sequence(self):
+        return int(self.header[SharedPositionBuffer.H_SEQUENCE])
+
+    ## Metoda zapisująca stan elementów do bufora.
+    # @param epoch Numer synchronizacji, do której należą dane.
+    # @param position Tablica pozycji (N x 2), N <= capacity.
+    # @param velocity Tablica prędkości (N x 2).
+    # @param stats Opcjonalny słownik {numer pola nagłówka: wartość} ze statystykami symulacji.
+    def write(self, epoch, position, velocity, stats=None):
+        n = len(position)
+        hdr = self.header
+
+        hdr[SharedPositionBuffer.H_SEQUENCE] += 1
+
+        self.position[:n] = position
+        self.velocity[:n] = velocity
+
+        hdr[SharedPositionBuffer.H_EPOCH] = epoch
+        hdr[SharedPositionBuffer.H_COUNT] = n
+
+        if stats is not None:
+            for field, value in stats.items():
+                hdr[field] = value
+
+        hdr[SharedPositionBuffer.H_SEQUENCE] += 1
+
+    ## Metoda odczytująca spójny stan elementów z bufora.
+    # @param position Tablica (capacity x 2), do której kopiowane są pozycje.
+    # @param velocity Tablica (capacity x 2), do której kopiowane są prędkości.
+    # @return Kopia nagłówka lub None, jeśli nie udało się odczytać spójnego stanu (piszący był w trakcie zapisu).
+    def read(self, position, velocity):
+        hdr = self.header
+
+        for i in range(SharedPositionBuffer.READ_RETRIES):
+            seq = hdr[SharedPositionBuffer.H_SEQUENCE]
+
+            if seq % 2 == 1:
+                continue
+
+            header = np.array(hdr)
+            n = int(header[SharedPositionBuffer.H_COUNT])
+
+            position[:n] = self.position[:n]
+            velocity[:n] = self.velocity[:n]
+
+            if hdr[SharedPositionBuffer.H_SEQUENCE] == seq:
+                return header
+
+        return None
+
+    ## Metoda odłączająca bufor od procesu, a w procesie twórcy także usuwająca blok pamięci.
+    def close(self):
+        # widoki NumPy muszą zostać zwolnione przed zamknięciem bloku
+        self.header = self.position = self.velocity = None
+        self.shm.close()
+
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+## @file SimulationProcess.py
+## @package SimulationProcess
+
+import multiprocessing
+
+import numpy as np
+
+from LayoutEngine import LayoutEngine
+from SharedPositionBuffer import SharedPositionBuffer
+from SimulationWorker import SimulationWorker
+
+
+## Klasa SimulationProcess.
+# Symulacja układania hipergrafu w osobnym procesie (SimulationWorker), strona okna aplikacji.
+# Okno nie wykonuje HyperGraph.update - przy rysowaniu wywołuje jedynie read_positions, które kopiuje
+# najnowsze pozycje i prędkości z pamięci współdzielonej do magazynu stanu rysowanego hipergrafu.
+# Zmiany wprowadzone w oknie przekazywane są do procesu symulacji przez potok poleceń:
+#  - zmiana struktury (lub podmiana hipergrafu) - elementy hipergrafu (X, U, P i lista zaznaczonych) przesyłane są ponownie
+#    (polecenie "sync"), bez historii ewolucji i ustawień projektu, których symulacja nie używa,
+#  - zmiana zaznaczenia - przypięcie lub odpięcie elementów (polecenie "pins"),
+#  - przesunięcie elementów zaznaczonych (np. myszą) - ich nowe pozycje (polecenie "move"),
+#  - zmiana parametrów symulacji (polecenie "params").
+# Zmiany wykrywane są przy każdym odczycie, więc okno nie musi zgłaszać ich osobno.
+# Proces tworzony jest metodą "spawn", aby nie dziedziczył stanu biblioteki GTK po procesie okna.
+class SimulationProcess(object):
+
+    ## Symbole elementów hipergrafu przesyłanych przy synchronizacji (zob. HyperGraph.dump_hg_as_dict).
+    SYNC_ELEMENTS = ['X', 'U', 'P', 'S']
+
+    ## Konstruktor - uruchomienie procesu symulacji.
+    # @param dt Krok czasu symulacji.
+    # @param theta Opcjonalny kąt otwarcia drzewa Barnes-Hut dla układania hipergałęzi.
+    def __init__(self, dt=LayoutEngine.DEFAULT_TIME_DELTA_SEC, theta=None):
+        ctx = multiprocessing.get_context("spawn")
+
+        ## Koniec potoku, przez który wysyłane są polecenia.
+        self.connection, worker_connection = ctx.Pipe()
+
+        ## Proces symulacji.
+        self.process = ctx.Process(target=SimulationWorker.main, args=(worker_connection,), daemon=True)
+        self.process.start()
+
+        worker_connection.close()
+
+        ## Bufor pamięci współdzielonej z pozycjami elementów.
+        self.buffer = None
+
+        ## Tablica, do której kopiowane są pozycje z bufora.
+        self.position = None
+
+        ## Tablica, do której kopiowane są prędkości z bufora.
+        self.velocity = None
+
+        ## Hipergraf przesłany przy ostatniej synchronizacji.
+        self.hg = None
+
+        ## Wersja struktury hipergrafu przy ostatniej synchronizacji.
+        self.structure_version = None
+
+        ## Numer ostatniej synchronizacji.
+        self.epoch = 0
+
+        ## Lista id elementów w kolejności, w jakiej zapisywane są w buforze.
+        self.xid_list = list()
+
+        ## Numery wierszy magazynu hipergrafu okna odpowiadające elementom bufora.
+        self.rows = np.zeros(0, dtype=np.intp)
+
+        ## Flagi przypięcia elementów wysłane do procesu symulacji.
+        self.pins = np.zeros(0, dtype=bool)
+
+        ## Wersja geometrii magazynu hipergrafu okna po ostatnim odczycie.
+        self.geometry_version = None
+
+        ## Licznik sekwencji bufora przy ostatnim udanym odczycie.
+        self.sequence = None
+
+        ## Kopia nagłówka bufora z ostatniego udanego odczytu (statystyki symulacji).
+        self.header = np.zeros(SharedPositionBuffer.HEADER_SIZE, dtype=np.double)
+
+        self.set_params(dt=dt, theta=theta)
+
+    ## Metoda wysyłająca polecenie do procesu symulacji.
+    # @param command Krotka (nazwa polecenia, argumenty...).
+    def send(self, *command):
+        if self.process is not None:
+            self.connection.send(command)
+
+    ## Metoda przesyłająca elementy hipergrafu do procesu symulacji.
+    # Przesyłane są tylko elementy potrzebne do symulacji, więc koszt nie rośnie wraz z historią ewolucji hipergrafu.
+    # W razie potrzeby tworzony jest większy bufor pamięci współdzielonej.
+    # @param hg Obiekt hipergrafu.
+    def sync(self, hg):
+        xid_list = hg.get_all_xnodes_id()
+        n = len(xid_list)
+
+        buffer_name = None
+
+        if self.buffer is None or self.buffer.capacity < n:
+            if self.buffer is not None:
+                self.buffer.close()
+
+            self.buffer = SharedPositionBuffer(max(n, 2 * self.buffer.capacity if self.buffer is not None else n))
+            self.position = np.zeros((self.buffer.capacity, 2), dtype=np.double)
+            self.velocity = np.zeros((self.buffer.capacity, 2), dtype=np.double)
+            buffer_name = self.buffer.get_name()
+
+        self.epoch += 1
+        self.hg = hg
+        self.structure_version = hg.structure_version
+        self.xid_list = xid_list
+        self.rows = hg.get_xnodes_rows_by_id(xid_list)
+        self.pins = np.array(hg.store.selected[self.rows])
+        self.geometry_version = hg.store.geometry_version
+        self.sequence = None
+
+        self.send("sync", hg.dump_hg_as_dict(elems_to_dump=SimulationProcess.SYNC_ELEMENTS), self.epoch, xid_list, buffer_name, self.buffer.capacity)
+
+    ## Metoda wysyłająca do procesu symulacji zmiany zaznaczenia i pozycje przesuniętych elementów zaznaczonych.
+    # @param hg Obiekt hipergrafu.
+    def send_local_changes(self, hg):
+        st = hg.store
+
+        pins = st.selected[self.rows]
+        changed = np.flatnonzero(pins != self.pins)
+
+        if len(changed) > 0:
+            self.send("pins", [self.xid_list[i] for i in changed], pins[changed].tolist())
+            self.pins = np.array(pins)
+
+        if st.geometry_version != self.geometry_version:
+            pinned = np.flatnonzero(pins)
+
+            if len(pinned) > 0:
+                self.send("move", [self.xid_list[i] for i in pinned], np.array(st.position[self.rows[pinned]]))
+
+    ## Metoda kopiująca najnowszy stan z procesu symulacji do magazynu stanu hipergrafu.
+    # Jeśli hipergraf został podmieniony lub zmieniła się jego struktura, jest on najpierw przesyłany ponownie.
+    # Elementy zaznaczone w oknie nie są nadpisywane (mogą być właśnie przeciągane).
+    # @param hg Obiekt rysowanego hipergrafu.
+    # @return True, jeśli skopiowano nowy stan odpowiadający aktualnej strukturze hipergrafu
+    # (False - brak nowych danych, np. gdy symulacja jest wstrzymana lub wszystkie elementy są uśpione).
+    def read_positions(self, hg):
+        if hg is not self.hg or hg.structure_version != self.structure_version:
+            self.sync(hg)
+        else:
+            self.send_local_changes(hg)
+
+        if self.buffer.get_sequence() == self.sequence:
+            self.geometry_version = hg.store.geometry_version
+            return False
+
+        header = self.buffer.read(self.position, self.velocity)
+
+        if header is None or int(header[SharedPositionBuffer.H_EPOCH]) != self.epoch:
+            self.geometry_version = hg.store.geometry_version
+            return False
+
+        self.header = header
+        self.sequence = int(header[SharedPositionBuffer.H_SEQUENCE])
+
+        st = hg.store
+        free = np.logical_not(st.selected[self.rows])
+        rows = self.rows[free]
+
+        st.position[rows] = self.position[:len(self.rows)][free]
+        st.velocity[rows] = self.velocity[:len(self.rows)][free]
+        st.touch_geometry()
+
+        self.geometry_version = st.geometry_version
+
+        return True
+
+    ## Metoda zmieniająca parametry symulacji.
+    # @param params Nowe wartości parametrów: dt, theta, sleep_enabled.
+    def set_params(self, **params):
+        self.send("params", params)
+
+    ## Metoda wstrzymująca symulację.
+    def pause(self):
+        self.send("pause")
+
+    ## Metoda wznawiająca symulację.
+    def resume(self):
+        self.send("resume")
+
+    ## Metoda zwracająca statystyki symulacji z ostatniego odczytu.
+    # @return Słownik ze statystykami symulacji.
+    def get_stats(self):
+        return {
+            "total_steps": int(self.header[SharedPositionBuffer.H_STEPS]),
+            "steps_per_sec": float(self.header[SharedPositionBuffer.H_STEPS_PER_SEC]),
+            "kinetic_energy": float(self.header[SharedPositionBuffer.H_KINETIC_ENERGY]),
+            "awake_count": int(self.header[SharedPositionBuffer.H_AWAKE_COUNT])
+        }
+
+    ## Metoda kończąca proces symulacji i zwalniająca pamięć współdzieloną.
+    def stop(self):
+        if self.process is None:
+            return
+
+        try:
+            self.send("stop")
+        except (BrokenPipeError, EOFError):
+            pass
+
+        self.process.join(timeout=1.0)
+
+        if self.process.is_alive():
+            self.process.terminate()
+
+        self.process = None
+        self.connection.close()
+
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
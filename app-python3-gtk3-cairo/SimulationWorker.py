@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+## @file SimulationWorker.py
+## @package SimulationWorker
+
+import time
+
+import numpy as np
+
+from HyperGraph import HyperGraph
+from LayoutEngine import LayoutEngine
+from SharedPositionBuffer import SharedPositionBuffer
+
+
+## Klasa SimulationWorker.
+# Pętla symulacji wykonywana w osobnym procesie (uruchamiana przez SimulationProcess).
+# Proces ma własną kopię hipergrafu, na której wykonuje kroki HyperGraph.update tak szybko, jak potrafi,
+# a po każdym kroku zapisuje pozycje i prędkości elementów do bufora SharedPositionBuffer.
+# Polecenia od okna odbierane są przez potok (multiprocessing.Pipe) jako krotki (nazwa polecenia, argumenty...):
+#  - ("sync", słownik elementów hipergrafu (HyperGraph.dump_hg_as_dict), numer synchronizacji, lista id elementów, nazwa bufora lub None, pojemność),
+#  - ("pins", lista id, lista flag) - przypięcie (zaznaczenie) elementów, które symulacja ma nie przesuwać,
+#  - ("move", lista id, tablica pozycji) - przesunięcie elementów (np. przeciąganych myszą),
+#  - ("params", słownik) - zmiana parametrów: "dt", "theta", "sleep_enabled",
+#  - ("pause",), ("resume",), ("stop",).
+class SimulationWorker(object):
+
+    ## Czas oczekiwania na polecenia, gdy symulacja jest wstrzymana lub wszystkie elementy są uśpione.
+    IDLE_WAIT_SEC = 0.05
+
+    ## Co ile sekund przeliczana jest ilość kroków na sekundę.
+    STATS_INTERVAL_SEC = 0.5
+
+    ## Konstruktor.
+    # @param connection Koniec potoku, z którego odbierane są polecenia.
+    def __init__(self, connection):
+
+        ## Koniec potoku poleceń.
+        self.connection = connection
+
+        ## Silnik układania z kopią hipergrafu (None przed pierwszą synchronizacją).
+        self.engine = None
+
+        ## Bufor pamięci współdzielonej, do którego zapisywany jest stan.
+        self.buffer = None
+
+        ## Numer aktualnej synchronizacji.
+        self.epoch = 0
+
+        ## Numery wierszy magazynu kopii hipergrafu w kolejności id przesłanej przy synchronizacji.
+        self.rows = np.zeros(0, dtype=np.intp)
+
+        ## Czy symulacja jest wstrzymana.
+        self.paused = False
+
+        ## Czy pętla ma zostać zakończona.
+        self.running = True
+
+        ## Parametry symulacji.
+        self.params = {"dt": LayoutEngine.DEFAULT_TIME_DELTA_SEC, "theta": None, "sleep_enabled": True}
+
+        ## Statystyki symulacji zapisywane w nagłówku bufora.
+        self.stats = {SharedPositionBuffer.H_STEPS: 0,
+                      SharedPositionBuffer.H_STEPS_PER_SEC: 0.0,
+                      SharedPositionBuffer.H_KINETIC_ENERGY: 0.0,
+                      SharedPositionBuffer.H_AWAKE_COUNT: 0}
+
+    ## Funkcja wejściowa procesu symulacji.
+    # @param connection Koniec potoku, z którego odbierane są polecenia.
+    @staticmethod
+    def main(connection):
+        worker = SimulationWorker(connection)
+
+        try:
+            worker.run()
+        finally:
+            if worker.buffer is not None:
+                worker.buffer.close()
+
+            connection.close()
+
+    ## Metoda wykonująca pętlę symulacji do otrzymania polecenia "stop" lub zamknięcia potoku.
+    def run(self):
+        tstats = time.time()
+        steps_stats = 0
+
+        while self.running:
+            idle = self.engine is None or self.paused or (self.engine.hg.sleep_enabled and
+                                                           self.stats[SharedPositionBuffer.H_AWAKE_COUNT] == 0)
+
+            try:
+                if self.connection.poll(SimulationWorker.IDLE_WAIT_SEC if idle else 0):
+                    while self.running and self.connection.poll():
+                        self.handle_command(self.connection.recv())
+                    continue
+            except EOFError:
+                break
+
+            if idle:
+                continue
+
+            self.engine.step()
+
+            hg = self.engine.hg
+
+            self.stats[SharedPositionBuffer.H_STEPS] = self.engine.steps
+            self.stats[SharedPositionBuffer.H_AWAKE_COUNT] = hg.get_awake_xnodes_count() if hg.sleep_enabled else hg.store.count
+
+            tnow = time.time()
+
+            if tnow - tstats >= SimulationWorker.STATS_INTERVAL_SEC:
+                self.stats[SharedPositionBuffer.H_STEPS_PER_SEC] = (self.engine.steps - steps_stats) / (tnow - tstats)
+                self.stats[SharedPositionBuffer.H_KINETIC_ENERGY] = hg.get_kinetic_energy()
+                tstats = tnow
+                steps_stats = self.engine.steps
+
+            self.publish()
+
+    ## Metoda zapisująca stan kopii hipergrafu do bufora.
+    def publish(self):
+        if self.buffer is None or self.engine is None:
+            return
+
+        st = self.engine.hg.store
+
+        self.buffer.write(self.epoch, st.position[self.rows], st.velocity[self.rows], self.stats)
+
+    ## Metoda wykonująca polecenie otrzymane od okna.
+    # @param command Krotka (nazwa polecenia, argumenty...).
+    def handle_command(self, command):
+        name = command[0]
+
+        if name == "sync":
+            self.sync(*command[1:])
+        elif name == "pins":
+            self.set_pins(*command[1:])
+        elif name == "move":
+            self.move_xnodes(*command[1:])
+        elif name == "params":
+            self.set_params(command[1])
+        elif name == "pause":
+            self.paused = True
+        elif name == "resume":
+            self.paused = False
+        elif name == "stop":
+            self.running = False
+
+    ## Metoda podmieniająca kopię hipergrafu po zmianie jego struktury w oknie.
+    # Kopia odtwarzana jest ze słownika elementów hipergrafu (HyperGraph.load_hg_from_dict).
+    # @param hg_dict Słownik elementów hipergrafu.
+    # @param epoch Numer synchronizacji.
+    # @param xid_list Lista id elementów w kolejności, w jakiej zapisywane są do bufora.
+    # @param buffer_name Nazwa nowego bufora lub None, jeśli bufor się nie zmienił.
+    # @param capacity Pojemność nowego bufora.
+    def sync(self, hg_dict, epoch, xid_list, buffer_name, capacity):
+        hg = HyperGraph()
+        hg.load_hg_from_dict(hg_dict)
+        hg.sleep_enabled = self.params["sleep_enabled"]
+
+        if self.engine is None:
+            self.engine = LayoutEngine(hg, dt=self.params["dt"], theta=self.params["theta"])
+        else:
+            self.engine.hg = hg
+
+        if buffer_name is not None:
+            if self.buffer is not None:
+                self.buffer.close()
+
+            self.buffer = SharedPositionBuffer(capacity, name=buffer_name)
+
+        self.epoch = epoch
+        self.rows = hg.get_xnodes_rows_by_id(xid_list)
+        self.stats[SharedPositionBuffer.H_AWAKE_COUNT] = hg.store.count
+
+        self.publish()
+
+    ## Metoda przypinająca lub odpinająca elementy.
+    # Element przypięty (zaznaczony) nie jest przesuwany przez symulację.
+    # @param xid_list Lista id elementów.
+    # @param flags Lista flag przypięcia.
+    def set_pins(self, xid_list, flags):
+        hg = self.engine.hg
+
+        for xid, pinned in zip(xid_list, flags):
+            xnode = hg.get_xnode_by_id(xid)
+            xnode.selected = pinned
+
+            if pinned:
+                xnode.stop_movement()
+
+        hg.wake_xnodes_by_id(xid_list)
+        self.stats[SharedPositionBuffer.H_AWAKE_COUNT] = hg.store.count
+
+    ## Metoda przesuwająca elementy na dane pozycje.
+    # @param xid_list Lista id elementów.
+    # @param positions Tablica pozycji (N x 2).
+    def move_xnodes(self, xid_list, positions):
+        hg = self.engine.hg
+
+        for xid, pos in zip(xid_list, positions):
+            hg.get_xnode_by_id(xid).position_vec = pos
+
+        self.stats[SharedPositionBuffer.H_AWAKE_COUNT] = hg.store.count
+        self.publish()
+
+    ## Metoda zmieniająca parametry symulacji.
+    # @param params Słownik z nowymi wartościami parametrów "dt", "theta", "sleep_enabled".
+    def set_params(self, params):
+        self.params.update(params)
+
+        if self.engine is not None:
+            self.engine.dt = self.params["dt"]
+            self.engine.theta = self.params["theta"]
+            self.engine.hg.sleep_enabled = self.params["sleep_enabled"]
+            self.stats[SharedPositionBuffer.H_AWAKE_COUNT] = self.engine.hg.store.count
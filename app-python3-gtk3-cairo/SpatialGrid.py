@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+## @file SpatialGrid.py
+## @package SpatialGrid
+
+import math
+
+import numpy as np
+
+
+## Klasa SpatialGrid.
+# Jednorodna siatka (hasz przestrzenny) nad pozycjami elementów hipergrafu przechowywanych w magazynie VertStore.
+# Każda komórka siatki (kwadrat o boku cell_size) przechowuje zbiór obiektów elementów, których środki w niej leżą.
+# Numer komórki każdego elementu zapisywany jest w tablicy cell magazynu, dzięki czemu po zmianie pozycji
+# wystarczy wektorowo porównać nowe numery komórek z zapisanymi i przenieść tylko te elementy, które zmieniły komórkę.
+# Zapytania o otoczenie punktu przeglądają tylko kilka komórek, więc ich koszt nie zależy od ilości elementów.
+# Elementy o promieniu większym niż połowa boku komórki (duże hipergałęzie) pamiętane są dodatkowo osobno,
+# aby pojedynczy duży element nie powiększał obszaru przeglądanego przy każdym wyszukiwaniu kolizji.
+class SpatialGrid(object):
+
+    ## Domyślny bok komórki siatki.
+    DEFAULT_CELL_SIZE = 128.0
+
+    ## Stosunek promienia elementu do boku komórki, powyżej którego element jest traktowany jako duży.
+    LARGE_RADIUS_RATIO = 0.5
+
+    ## Konstruktor.
+    # @param store Magazyn stanu elementów (VertStore).
+    # @param cell_size Bok komórki siatki.
+    def __init__(self, store, cell_size=DEFAULT_CELL_SIZE):
+
+        ## Magazyn stanu elementów.
+        self.store = store
+
+        ## Bok komórki siatki.
+        self.cell_size = float(cell_size)
+
+        ## Słownik numer komórki -> zbiór obiektów elementów.
+        self.buckets = dict()
+
+        ## Promień, powyżej którego element jest traktowany jako duży.
+        self.large_radius = self.cell_size * SpatialGrid.LARGE_RADIUS_RATIO
+
+        ## Zbiór obiektów dużych elementów, sprawdzanych przy wyszukiwaniu kolizji niezależnie od komórek.
+        self.large_verts = set()
+
+        ## Ograniczenie górne promieni pozostałych elementów.
+        # Rośnie przy dodaniu lub powiększeniu elementu, a dokładnie przeliczane jest przy pełnym odświeżeniu siatki.
+        self.small_max_radius = 0.0
+
+    ## Metoda zwracająca numer komórki dla danych współrzędnych komórki.
+    # @param ix Współrzędna x komórki (liczba całkowita lub tablica).
+    # @param iy Współrzędna y komórki (liczba całkowita lub tablica).
+    # @return Numer komórki (64-bitowy).
+    @staticmethod
+    def get_cell_key(ix, iy):
+        return (ix << 32) | (iy & 0xFFFFFFFF)
+
+    ## Metoda zwracająca numery komórek dla tablicy pozycji.
+    # @param positions Tablica pozycji (N x 2).
+    # @return Tablica numerów komórek (N).
+    def get_cell_keys(self, positions):
+        cells = np.floor(np.asarray(positions, dtype=np.double) / self.cell_size).astype(np.int64)
+
+        return SpatialGrid.get_cell_key(cells[:, 0], cells[:, 1])
+
+    ## Metoda dodająca element do siatki.
+    # Element musi być już dołączony do magazynu.
+    # @param vert Obiekt elementu hipergrafu.
+    def insert(self, vert):
+        row = vert.store_row
+        key = int(self.get_cell_keys(self.store.position[row:row + 1])[0])
+
+        self.store.cell[row] = key
+        self.buckets.setdefault(key, set()).add(vert)
+
+        self.classify(vert, float(self.store.radius[row]))
+
+    ## Metoda dodająca do siatki wiele elementów naraz.
+    # Numery komórek liczone są wektorowo. Elementy muszą być już dołączone do magazynu.
+    # @param verts_list Lista obiektów elementów hipergrafu.
+    def insert_all(self, verts_list):
+        if len(verts_list) == 0:
+            return
+
+        st = self.store
+        rows = np.fromiter((vert.store_row for vert in verts_list), dtype=np.intp, count=len(verts_list))
+        keys = self.get_cell_keys(st.position[rows])
+
+        st.cell[rows] = keys
+
+        for vert, key, radius in zip(verts_list, keys.tolist(), st.radius[rows].tolist()):
+            self.buckets.setdefault(key, set()).add(vert)
+            self.classify(vert, radius)
+
+    ## Metoda usuwająca element z siatki.
+    # Wywoływana przed odłączeniem elementu od magazynu.
+    # @param vert Obiekt elementu hipergrafu.
+    def remove(self, vert):
+        key = int(self.store.cell[vert.store_row])
+        bucket = self.buckets.get(key)
+
+        if bucket is not None:
+            bucket.discard(vert)
+
+            if len(bucket) == 0:
+                del self.buckets[key]
+
+        self.large_verts.discard(vert)
+
+    ## Metoda zapamiętująca, czy element jest duży, oraz aktualizująca ograniczenie promieni pozostałych elementów.
+    # @param vert Obiekt elementu hipergrafu.
+    # @param radius Promień elementu.
+    def classify(self, vert, radius):
+        if radius > self.large_radius:
+            self.large_verts.add(vert)
+        else:
+            self.large_verts.discard(vert)
+            self.small_max_radius = max(self.small_max_radius, radius)
+
+    ## Metoda odświeżająca siatkę po zmianie pozycji lub promieni elementów.
+    # Rozpatrywane są tylko wiersze zapamiętane przez magazyn (VertStore.pop_regrid), np. element przesunięty myszą.
+    # Po przesunięciu elementów bez podania wierszy (np. krok symulacji) numery komórek liczone są wektorowo dla wszystkich.
+    # W obu przypadkach przenoszone są tylko elementy, które zmieniły komórkę.
+    def refresh(self):
+        st = self.store
+
+        regrid_rows, untracked = st.pop_regrid()
+
+        if untracked:
+            n = st.count
+            rows = np.arange(n, dtype=np.intp)
+
+            radius = st.radius[:n]
+            large = radius > self.large_radius
+
+            self.large_verts = set(st.verts[row] for row in np.flatnonzero(large).tolist())
+            self.small_max_radius = float(radius[np.logical_not(large)].max()) if n > len(self.large_verts) else 0.0
+        elif len(regrid_rows) > 0:
+            rows = np.fromiter(regrid_rows, dtype=np.intp, count=len(regrid_rows))
+
+            for row, radius in zip(rows.tolist(), st.radius[rows].tolist()):
+                self.classify(st.verts[row], radius)
+        else:
+            return
+
+        new_keys = self.get_cell_keys(st.position[rows])
+        changed_idx = np.flatnonzero(new_keys != st.cell[rows])
+        changed = rows[changed_idx]
+
+        for row, old_key, new_key in zip(changed.tolist(), st.cell[changed].tolist(), new_keys[changed_idx].tolist()):
+            vert = st.verts[row]
+
+            bucket = self.buckets.get(old_key)
+
+            if bucket is not None:
+                bucket.discard(vert)
+
+                if len(bucket) == 0:
+                    del self.buckets[old_key]
+
+            self.buckets.setdefault(new_key, set()).add(vert)
+
+        st.cell[changed] = new_keys[changed_idx]
+
+    ## Metoda zwracająca elementy, których środki mogą leżeć w kwadracie o danym środku i połowie boku.
+    # Zwracane są wszystkie elementy z komórek przecinających kwadrat - wynik należy dalej filtrować odległością.
+    # @param pos Środek kwadratu.
+    # @param half_size Połowa boku kwadratu.
+    # @return Lista obiektów elementów.
+    def get_verts_in_square(self, pos, half_size):
+        self.refresh()
+
+        x0 = int(math.floor((pos[0] - half_size) / self.cell_size))
+        x1 = int(math.floor((pos[0] + half_size) / self.cell_size))
+        y0 = int(math.floor((pos[1] - half_size) / self.cell_size))
+        y1 = int(math.floor((pos[1] + half_size) / self.cell_size))
+
+        # przy bardzo dużym kwadracie szybciej jest przejrzeć wszystkie pozycje wektorowo
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.buckets):
+            st = self.store
+            d = np.abs(st.position[:st.count] - np.asarray(pos, dtype=np.double))
+            rows = np.flatnonzero(np.logical_and(d[:, 0] <= half_size, d[:, 1] <= half_size))
+
+            return [st.verts[row] for row in rows.tolist()]
+
+        verts_list = list()
+
+        for ix in range(x0, x1 + 1):
+            for iy in range(y0, y1 + 1):
+                bucket = self.buckets.get(SpatialGrid.get_cell_key(ix, iy))
+
+                if bucket is not None:
+                    verts_list.extend(bucket)
+
+        return verts_list
+
+    ## Metoda zwracająca elementy, które mogą kolidować z daną pozycją.
+    # Element koliduje, jeśli pozycja leży bliżej niż rmul razy jego promień - przeglądane są więc komórki
+    # w odległości rmul razy ograniczenie promieni zwykłych elementów, a duże elementy dołączane są zawsze.
+    # Wynik należy dalej filtrować odległością.
+    # @param pos Sprawdzana pozycja.
+    # @param rmul Mnożnik promienia elementów.
+    # @return Lista obiektów elementów.
+    def get_collision_candidates(self, pos, rmul):
+        # odświeżenie przed odczytem ograniczenia promieni, które może się przy nim zmienić
+        self.refresh()
+
+        verts_list = self.get_verts_in_square(pos, self.small_max_radius * rmul)
+
+        if len(self.large_verts) > 0:
+            verts_list = [ve for ve in verts_list if ve not in self.large_verts]
+            verts_list.extend(self.large_verts)
+
+        return verts_list
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+## @file SpriteCache.py
+## @package SpriteCache
+
+from collections import OrderedDict
+import math
+
+import cairo
+
+
+## Klasa SpriteCache.
+# Pamięć podręczna obrazków (sprite'ów) elementów hipergrafu.
+# Element rysowany jest raz do powierzchni cairo.ImageSurface, a w kolejnych klatkach jego obrazek jest jedynie
+# kopiowany na ekran (set_source_surface + fill), zamiast rysowania okręgu, tła i napisów od nowa.
+# Kluczem obrazka są wszystkie dane, od których zależy jego wygląd (typ elementu, kolory dla stanu zaznaczenia,
+# teksty etykiet, zaokrąglony promień na ekranie), więc zmiana właściwości elementu daje po prostu inny klucz,
+# a nieużywane już obrazki usuwane są jako najdawniej używane (LRU) po przekroczeniu budżetu pamięci.
+class SpriteCache(object):
+
+    ## Domyślny budżet pamięci podręcznej w bajtach.
+    DEFAULT_BUDGET_BYTES = 32 * 1024 * 1024
+
+    ## Maksymalna średnica elementu na ekranie (w pikselach), dla której obrazek jest zapamiętywany.
+    # Większe elementy rysowane są bezpośrednio - na ekranie mieści się ich niewiele.
+    MAX_SPRITE_SIZE = 256
+
+    ## Ilość przedziałów na piksel, do których zaokrąglany jest promień elementu na ekranie.
+    RADIUS_STEPS_PER_PIXEL = 4
+
+    ## Margines obrazka w pikselach (na wygładzanie krawędzi).
+    MARGIN = 2
+
+    ## Konstruktor.
+    # @param budget_bytes Maksymalna łączna wielkość zapamiętanych obrazków w bajtach.
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+
+        ## Maksymalna łączna wielkość zapamiętanych obrazków w bajtach.
+        self.budget_bytes = budget_bytes
+
+        ## Słownik klucz -> (powierzchnia, x środka, y środka, szerokość, wysokość, rozmiar), od najdawniej użytego.
+        self.entries = OrderedDict()
+
+        ## Łączna wielkość zapamiętanych obrazków w bajtach.
+        self.used_bytes = 0
+
+        ## Kontekst pomocniczy do mierzenia tekstu przed utworzeniem obrazka (tworzony przy pierwszym użyciu).
+        self.measure_context = None
+
+        ## Ilość trafień.
+        self.hits = 0
+
+        ## Ilość chybień.
+        self.misses = 0
+
+        ## Ilość obrazków usuniętych z powodu przekroczenia budżetu.
+        self.evictions = 0
+
+    ## Metoda zaokrąglająca promień elementu na ekranie do przedziału używanego w kluczu obrazka.
+    # @param radius_zoomed Promień elementu na ekranie.
+    # @return Zaokrąglony promień.
+    @staticmethod
+    def quantize_radius(radius_zoomed):
+        return round(radius_zoomed * SpriteCache.RADIUS_STEPS_PER_PIXEL) / SpriteCache.RADIUS_STEPS_PER_PIXEL
+
+    ## Metoda rysująca obrazek o danym kluczu, w razie potrzeby tworząc go.
+    # @param cro Kontekst rysowania biblioteki Cairo.
+    # @param key Klucz obrazka (krotka).
+    # @param pos Pozycja środka obrazka na ekranie.
+    # @param get_bounds Funkcja get_bounds(ctx) zwracająca prostokąt (x0, y0, x1, y1) obrazka względem jego środka.
+    # @param render Funkcja render(ctx, center) rysująca element o środku w punkcie center.
+    def paint(self, cro, key, pos, get_bounds, render):
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            entry = self.create_sprite(key, get_bounds, render)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        surface, cx, cy, width, height, nbytes = entry
+
+        # pozycja zaokrąglana jest do całych pikseli, aby obrazek nie był rozmywany przy kopiowaniu
+        x = round(pos[0]) - cx
+        y = round(pos[1]) - cy
+
+        cro.set_source_surface(surface, x, y)
+        cro.rectangle(x, y, width, height)
+        cro.fill()
+
+    ## Metoda tworząca obrazek i dodająca go do pamięci podręcznej.
+    # @param key Klucz obrazka.
+    # @param get_bounds Funkcja zwracająca prostokąt obrazka względem jego środka.
+    # @param render Funkcja rysująca element.
+    # @return Wpis pamięci podręcznej (powierzchnia, x środka, y środka, szerokość, wysokość, rozmiar).
+    def create_sprite(self, key, get_bounds, render):
+        if self.measure_context is None:
+            self.measure_context = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+
+        x0, y0, x1, y1 = get_bounds(self.measure_context)
+
+        cx = SpriteCache.MARGIN - math.floor(x0)
+        cy = SpriteCache.MARGIN - math.floor(y0)
+        width = cx + math.ceil(x1) + SpriteCache.MARGIN
+        height = cy + math.ceil(y1) + SpriteCache.MARGIN
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        render(cairo.Context(surface), (cx, cy))
+
+        nbytes = 4 * width * height
+        entry = (surface, cx, cy, width, height, nbytes)
+
+        self.entries[key] = entry
+        self.used_bytes += nbytes
+
+        while self.used_bytes > self.budget_bytes and len(self.entries) > 1:
+            old_key, old_entry = self.entries.popitem(last=False)
+            self.used_bytes -= old_entry[5]
+            self.evictions += 1
+
+        return entry
+
+    ## Metoda usuwająca wszystkie obrazki.
+    def clear(self):
+        self.entries.clear()
+        self.used_bytes = 0
+
+    ## Metoda zwracająca statystyki pamięci podręcznej.
+    # @return Słownik ze statystykami.
+    def get_stats(self):
+        return {
+            "entries": len(self.entries),
+            "used_bytes": self.used_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
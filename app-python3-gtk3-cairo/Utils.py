@@ -74,6 +74,36 @@ class Utils:
     def map_vec_screen_to_canvas(vec, zoom):
         return vec / zoom
 
+    ## Metoda przycinająca odcinki do prostokąta (algorytm Lianga-Barsky'ego, wersja numpy).
+    # @param p1_list Tablica punktów początków odcinków (N x 2).
+    # @param p2_list Tablica punktów końców odcinków (N x 2).
+    # @param rect Prostokąt (x0, y0, x1, y1).
+    # @return Krotka (maska odcinków przecinających prostokąt, parametr t0, parametr t1) - przycięty odcinek
+    # to p1 + t * (p2 - p1) dla t z przedziału [t0, t1].
+    @staticmethod
+    def clip_segments_to_rect(p1_list, p2_list, rect):
+        x0, y0, x1, y1 = rect
+        d = p2_list - p1_list
+
+        t0 = np.zeros(len(p1_list))
+        t1 = np.ones(len(p1_list))
+        inside = np.ones(len(p1_list), dtype=bool)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for p, q in ((-d[:, 0], p1_list[:, 0] - x0), (d[:, 0], x1 - p1_list[:, 0]),
+                         (-d[:, 1], p1_list[:, 1] - y0), (d[:, 1], y1 - p1_list[:, 1])):
+                r = q / p
+                parallel = p == 0
+                inside &= np.logical_not(np.logical_and(parallel, q < 0))
+                entering = p < 0
+                leaving = p > 0
+                t0 = np.where(entering, np.maximum(t0, r), t0)
+                t1 = np.where(leaving, np.minimum(t1, r), t1)
+
+        inside &= t0 <= t1
+
+        return inside, t0, t1
+
     ## Metoda pomocnicza zwracająca wybraną ilość najmniejszych elementów z listy.
     # @param list_to_check Lista elementów do przeskanowania.
     # @param n Maksymalna ilość elementów do zwrócenia.
@@ -147,27 +177,3 @@ class Utils:
         print("matr. {} binarizing done".format(shape))
 
         return binarr
-
-    ## Metoda wykonująca sumę na macierzy A: A^1 + A^2 + ....
-    # @param nparray Macierz NumPy, na której pracuje metoda.
-    # @param n Maksymalna wartość potęgi.
-    # @return Macierz wynikowa NumPy.
-    @staticmethod
-    # @jit
-    def suma_szeregu_geometrycznego_nparray(nparray, n):
-
-        sumarr = np.zeros((nparray.shape[0], nparray.shape[1]), dtype=np.int)
-
-        old_sumarr = np.zeros((nparray.shape[0], nparray.shape[1]), dtype=np.int)
-
-        for i in range(n):
-            sumarr = Utils.binarize_nparray(old_sumarr + np.linalg.matrix_power(nparray, (i+1)))
-
-            if (sumarr == old_sumarr).all():
-                print('brak zmian po {} iteracjach'.format(i+1))
-                break
-
-            old_sumarr = sumarr
-
-        return sumarr
-
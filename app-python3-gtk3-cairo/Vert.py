@@ -5,11 +5,12 @@
 
 import math
 
-import cairo
-
 import numpy as np
 
+from LabelCache import LabelCache
+from SpriteCache import SpriteCache
 from Utils import Utils
+from VertStore import VertStore
 
 
 ## Klasa abstrakcyjna Vert.
@@ -49,10 +50,33 @@ class Vert(object):
     ## Zmienna klasy inkrementowana przy utworzeniu nowego elementu hipergrafu.
     vert_number = 0
 
+    ## Przybliżona (zawyżona) szerokość znaku etykiety jako ułamek wielkości czcionki.
+    # Służy do szacowania obszaru zajmowanego przez element bez mierzenia tekstu.
+    LABEL_CHAR_WIDTH = 0.75
+
+    ## Pamięć podręczna obrazków elementów, wspólna dla wszystkich elementów.
+    sprite_cache = SpriteCache()
+
+    ## Pamięć podręczna wymiarów etykiet, wspólna dla wszystkich elementów.
+    label_cache = LabelCache()
+
+    ## Nazwy atrybutów przechowywanych w magazynie VertStore, a nie w słowniku obiektu, wraz z nazwami tablic magazynu.
+    # Przy serializacji są one zapisywane jako zwykłe atrybuty, dzięki czemu format plików się nie zmienia.
+    store_attributes = {'position_vec': 'position', 'velocity_vec': 'velocity', 'acceleration_vec': 'acceleration',
+                        'force_vec': 'force', 'mass': 'mass', 'radius': 'radius', 'selected': 'selected'}
+
     # CREATE
 
     ## Konstruktor.
-    def __init__(self, name, pos, prop_dict, vtype=T_NODE):
+    # @param store Opcjonalny magazyn, do którego element jest od razu dołączany (np. magazyn hipergrafu).
+    def __init__(self, name, pos, prop_dict, vtype=T_NODE, store=None):
+
+        # Bez podanego magazynu element otrzymuje własny, jednoelementowy magazyn stanu.
+        # Po dodaniu do hipergrafu przenoszony jest do magazynu hipergrafu.
+        if store is None:
+            store = VertStore(capacity=1)
+
+        store.attach(self)
 
         ## ID aktualnego elementu (numer obiektu klasy Vert).
         self.id = Vert.vert_number
@@ -99,6 +123,126 @@ class Vert(object):
 
         # print("{} : {}".format(self, self.properties_dict))
 
+    ## Metoda zwracająca stan obiektu do serializacji.
+    # Wartości przechowywane w magazynie kopiowane są do słownika stanu pod dotychczasowymi nazwami atrybutów.
+    # @return Słownik stanu obiektu.
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state.pop('store', None)
+        state.pop('store_row', None)
+
+        st, row = self.store, self.store_row
+
+        # wiersze tablic magazynu są ciągłe, więc przy serializacji zapisywane są tylko ich dane
+        state['position_vec'] = st.position[row]
+        state['velocity_vec'] = st.velocity[row]
+        state['acceleration_vec'] = st.acceleration[row]
+        state['force_vec'] = st.force[row]
+        state['mass'] = float(st.mass[row])
+        state['radius'] = float(st.radius[row])
+        state['selected'] = bool(st.selected[row])
+
+        return state
+
+    ## Metoda odtwarzająca stan obiektu po deserializacji.
+    # Obiekt nie otrzymuje jeszcze magazynu - odczytane wartości zapamiętywane są w słowniku pending_store_values
+    # i wpisywane do magazynu hipergrafu razem z wartościami pozostałych elementów (VertStore.attach_all).
+    # @param state Słownik stanu obiektu.
+    def __setstate__(self, state):
+        store_values = {array_name: state.pop(name) for name, array_name in Vert.store_attributes.items() if name in state}
+
+        self.__dict__.update(state)
+
+        ## Wartości tablic magazynu odczytane z pliku, do czasu dołączenia elementu do magazynu.
+        self.pending_store_values = store_values
+
+    ## Metoda wywoływana przy odwołaniu do nieistniejącego atrybutu.
+    # Jeśli element odczytany z pliku jest używany przed dołączeniem do magazynu hipergrafu,
+    # otrzymuje własny, jednoelementowy magazyn z odczytanymi wartościami.
+    # @param name Nazwa atrybutu.
+    def __getattr__(self, name):
+        if name in ('store', 'store_row') and 'pending_store_values' in self.__dict__:
+            store = VertStore(capacity=1)
+            store.attach_all([self])
+            Vert.update_appearance_all(store, [self])
+
+            return self.__dict__[name]
+
+        raise AttributeError(name)
+
+    # STORE VIEWS
+
+    ## Wektor siły przypisany do elementu (widok na wiersz magazynu).
+    @property
+    def force_vec(self):
+        return self.store.force[self.store_row]
+
+    @force_vec.setter
+    def force_vec(self, vec):
+        self.store.force[self.store_row] = vec
+
+    ## Wektor przyspieszenia elementu (widok na wiersz magazynu).
+    @property
+    def acceleration_vec(self):
+        return self.store.acceleration[self.store_row]
+
+    @acceleration_vec.setter
+    def acceleration_vec(self, vec):
+        self.store.acceleration[self.store_row] = vec
+
+    ## Wektor prędkości elementu (widok na wiersz magazynu).
+    @property
+    def velocity_vec(self):
+        return self.store.velocity[self.store_row]
+
+    @velocity_vec.setter
+    def velocity_vec(self, vec):
+        self.store.velocity[self.store_row] = vec
+
+    ## Współrzędne elementu (widok na wiersz magazynu).
+    @property
+    def position_vec(self):
+        return self.store.position[self.store_row]
+
+    @position_vec.setter
+    def position_vec(self, vec):
+        self.store.mark_damaged(self.store_row)
+        self.store.position[self.store_row] = vec
+        self.store.touch_geometry(self.store_row)
+        self.store.wake(self.store_row, disturbed=True)
+
+    ## Masa elementu przechowywana w magazynie.
+    @property
+    def mass(self):
+        return self.store.mass[self.store_row]
+
+    @mass.setter
+    def mass(self, mass):
+        self.store.mass[self.store_row] = mass
+
+    ## Promień elementu przechowywany w magazynie.
+    @property
+    def radius(self):
+        return self.store.radius[self.store_row]
+
+    @radius.setter
+    def radius(self, rad):
+        self.store.mark_damaged(self.store_row)
+        self.store.radius[self.store_row] = rad
+        self.store.mark_regrid(self.store_row)
+        self.update_appearance()
+
+    ## Flaga zaznaczenia elementu przechowywana w magazynie.
+    @property
+    def selected(self):
+        return bool(self.store.selected[self.store_row])
+
+    @selected.setter
+    def selected(self, sel):
+        self.store.mark_damaged(self.store_row)
+        self.store.selected[self.store_row] = sel
+        self.update_appearance()
+
     # READ
 
     ## Metoda zwracająca id obiektu.
@@ -134,12 +278,16 @@ class Vert(object):
     # @param pname Nazwa właściwości.
     # @param pval Wartość ustawiana.
     def set_property_value(self, pname, pval):
+        self.store.mark_damaged(self.store_row)
         self.properties_dict[pname] = pval
+        self.update_appearance()
 
     ## Metoda aktualizująca właściwości obiektu.
     # @param prop_dict Słownik nowych wartości właściwości.
     def update_properties(self, prop_dict):
+        self.store.mark_damaged(self.store_row)
         self.properties_dict.update(prop_dict)
+        self.update_appearance()
 
     ## Metoda zwracająca promień elementu hipergrafu.
     # @return Wartość liczbowa promienia elementu.
@@ -273,71 +421,181 @@ class Vert(object):
     #     cro.line_to(*(pos0 + vec/10))
     #     cro.stroke()
 
-    ## Metoda rysująca dany element
-    # Zajmuje ok 10% czasu CPU.
+    ## Metoda zwracająca kolory elementu odpowiednie dla jego stanu (zaznaczony, wyróżniony, zwykły).
+    # @return Krotka (kolor okręgu, kolor tła, kolor tekstu).
+    def get_draw_colors(self):
+        if self.is_selected():
+            prefix = 'selected_'
+        elif self.is_activated():
+            prefix = 'activated_'
+        else:
+            prefix = ''
+
+        return (tuple(self.get_property_value(prefix + 'ring_color')),
+                tuple(self.get_property_value(prefix + 'bg_color')),
+                tuple(self.get_property_value(prefix + 'text_color')))
+
+    ## Metoda zwracająca etykiety elementu (lista elementów hipergałęzi tylko dla zaznaczonego elementu).
+    # @return Krotka par (numer wiersza etykiety, tekst).
+    def get_labels(self):
+        labels = list()
+
+        for i, prop in enumerate(('id', 'name', 'value', 'elements')):
+            if prop in self.properties_dict:
+                if not prop == 'elements' or self.is_selected():
+                    propval = self.get_property_value(prop)
+                    if propval is not None:
+                        text = str(propval)
+                        if len(text) > 0:
+                            labels.append((i, text))
+
+        return tuple(labels)
+
+    ## Metoda zwracająca połówki szerokości i wysokości obszaru rysowanego elementu (okrąg z etykietami).
+    # Szerokość etykiet jest szacowana z ilości znaków (LABEL_CHAR_WIDTH), więc wynik nie zależy od kontekstu Cairo.
+    # @return Krotka (połówka szerokości, połówka wysokości) w bazie płótna.
+    def get_draw_half_extents(self):
+        r = self.radius
+        cx, cy = self.get_draw_half_extents_per_radius()
+
+        return cx * r, cy * r
+
+    ## Metoda zwracająca połówki szerokości i wysokości obszaru rysowanego elementu na jednostkę promienia.
+    # Wielkość czcionek etykiet jest proporcjonalna do promienia, więc cały obszar również.
+    # @return Krotka (połówka szerokości, połówka wysokości) dla promienia równego 1.
+    def get_draw_half_extents_per_radius(self):
+        cx = 1.05
+        labels = self.get_labels()
+
+        for i, text in labels:
+            font_size = (1.5/(1+i/2))*(0.2/len(text) + 0.3)
+            cx = max(cx, Vert.LABEL_CHAR_WIDTH * font_size * len(text) / 2)
+
+        cy = 1.35 if len(labels) > 0 else 1.05
+
+        return cx, cy
+
+    ## Metoda wywoływana po zmianie wyglądu elementu (zaznaczenie, wyróżnienie, właściwości, promień).
+    # Przed zmianą element powinien zostać zapamiętany przez VertStore.mark_damaged.
+    def update_appearance(self):
+        self.store.extent[self.store_row] = self.get_draw_half_extents()
+        self.store.touch_appearance(self.store_row)
+
+    ## Metoda wyznaczająca obszary rysowania wielu elementów naraz, np. po dołączeniu ich do magazynu (VertStore.attach_all).
+    # Promienie mnożone są wektorowo przez obszary na jednostkę promienia.
+    # @param store Magazyn, do którego należą elementy.
+    # @param verts_list Lista obiektów elementów.
+    @staticmethod
+    def update_appearance_all(store, verts_list):
+        if len(verts_list) == 0:
+            return
+
+        rows = VertStore.get_rows_of_verts(verts_list)
+        per_radius = np.array([ve.get_draw_half_extents_per_radius() for ve in verts_list], dtype=np.double)
+
+        store.extent[rows] = per_radius * store.radius[rows][:, np.newaxis]
+        store.touch_appearance()
+
+    ## Metoda zwracająca czytelne na ekranie etykiety elementu razem z wielkością ich czcionki.
+    # Etykiety o czcionce mniejszej niż LabelCache.MIN_FONT_SIZE są pomijane.
+    # @param radius_zoomed Promień elementu na ekranie.
+    # @return Krotka trójek (numer wiersza etykiety, tekst, wielkość czcionki).
+    def get_drawn_labels(self, radius_zoomed):
+        if LabelCache.get_max_font_size(radius_zoomed) < LabelCache.MIN_FONT_SIZE:
+            return ()
+
+        labels = list()
+
+        for i, text in self.get_labels():
+            font_size = LabelCache.get_font_size(radius_zoomed, i, text)
+
+            if font_size is not None:
+                labels.append((i, text, font_size))
+
+        return tuple(labels)
+
+    ## Metoda zwracająca prostokąt zajmowany przez narysowany element względem jego środka.
+    # @param cro Kontekst rysowania biblioteki Cairo (do mierzenia tekstu).
+    # @param radius_zoomed Promień elementu na ekranie.
+    # @param labels Etykiety elementu (jak z get_drawn_labels).
+    # @return Krotka (x0, y0, x1, y1).
+    @staticmethod
+    def get_shape_bounds(cro, radius_zoomed, labels):
+        r = radius_zoomed * 1.05
+        x0, y0, x1, y1 = -r, -r, r, r
+
+        if len(labels) > 0:
+            LabelCache.select_font(cro)
+
+        for i, text, font_size in labels:
+            e_xbearing, e_ybearing, e_width, e_height, e_xadvance, e_yadvance = Vert.label_cache.set_font_size(cro, text, font_size)
+            ty = (i - 0.6)*radius_zoomed/2
+            x0 = min(x0, -e_width/2)
+            x1 = max(x1, e_width/2)
+            y0 = min(y0, ty + e_ybearing)
+            y1 = max(y1, ty + e_ybearing + e_height)
+
+        return x0, y0, x1, y1
+
+    ## Metoda rysująca element (okrąg, tło i etykiety).
     # @param cro Kontekst rysowania biblioteki Cairo.
-    # @param pan_vec Wektor przesunięcia punktu środka płaszczyzny rysowania elementów w stosunku do lewego górnego rogu ekranu.
-    # Wyrażony w bazie płaszczyzny rysowania elementów (nie ekranu!)
-    # @param center Punkt środka ekranu w bazie współrzędnych ekranu.
-    # @param zoom Współczynnik powiększenia płaszczyzny rysowania elementów w stosunku do bazy współrzędnych ekranu.
-    # Im większy tym większe rysowane są elementy na ekranie.
-    def draw(self, cro, pos_zoomed, zoom):
+    # @param pos_zoomed Pozycja środka elementu na ekranie.
+    # @param radius_zoomed Promień elementu na ekranie.
+    # @param colors Kolory elementu (jak z get_draw_colors).
+    # @param labels Etykiety elementu (jak z get_drawn_labels).
+    @staticmethod
+    def draw_shape(cro, pos_zoomed, radius_zoomed, colors, labels):
+        ring_color, bg_color, text_color = colors
 
-        # pos_zoomed = Utils.map_pos_canvas_to_screen(self.position_vec, center, zoom, pan_vec)
-
-        radius_zoomed = self.radius * zoom
         cro.set_line_width(radius_zoomed / 10.0)
 
         # RING DRAWING
-        if not self.is_selected():
-            if self.is_activated():
-                cro.set_source_rgb(*self.get_property_value('activated_ring_color'))
-            else:
-                cro.set_source_rgb(*self.get_property_value('ring_color'))
-        else:
-            cro.set_source_rgb(*self.get_property_value('selected_ring_color'))
+        cro.set_source_rgb(*ring_color)
         cro.arc(pos_zoomed[0], pos_zoomed[1], radius_zoomed, 0, 2 * math.pi)
         cro.stroke_preserve()
 
         # BACKGROUND DRAWING
-
-        if not self.is_selected():
-            if self.is_activated():
-                cro.set_source_rgb(*self.get_property_value('activated_bg_color'))
-            else:
-                cro.set_source_rgb(*self.get_property_value('bg_color'))
-
-        else:
-            cro.set_source_rgb(*self.get_property_value('selected_bg_color'))
-
+        cro.set_source_rgb(*bg_color)
         cro.fill()
 
         # TEXT DRAWING
-        if radius_zoomed > 10:
-            if not self.is_selected():
-                if self.is_activated():
-                    cro.set_source_rgb(*self.get_property_value('activated_text_color'))
-                else:
-                    cro.set_source_rgb(*self.get_property_value('text_color'))
-            else:
-                cro.set_source_rgb(*self.get_property_value('selected_text_color'))
-
-            for i, prop in enumerate(('id', 'name', 'value', 'elements')):
-                if prop in self.properties_dict:
-                    if not prop == 'elements' or self.is_selected():
-                        propval = self.get_property_value(prop)
-                        if propval is not None:
-                            text = str(propval)
-                            if len(text) > 0:
-                                cro.select_font_face("Terminal", cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
-                                font_size = radius_zoomed*(1.5/(1+i/2))*(0.2/len(text) + 0.3)
-                                # cro.set_font_size(radius_zoomed*1.5*(0.5/len(text) + 0.2))
-                                cro.set_font_size(font_size)
-                                e_xbearing, e_ybearing, e_width, e_height, e_xadvance, e_yadvance = cro.text_extents(text)
-                                cro.move_to(*(pos_zoomed + (-(e_width/2 + e_xbearing), (i - 0.6)*radius_zoomed/2)))
-                                cro.show_text(text)
+        if len(labels) > 0:
+            cro.set_source_rgb(*text_color)
+            LabelCache.select_font(cro)
+
+            for i, text, font_size in labels:
+                e_xbearing, e_ybearing, e_width, e_height, e_xadvance, e_yadvance = Vert.label_cache.set_font_size(cro, text, font_size)
+                cro.move_to(pos_zoomed[0] - (e_width/2 + e_xbearing), pos_zoomed[1] + (i - 0.6)*radius_zoomed/2)
+                cro.show_text(text)
             cro.stroke()
 
+    ## Metoda rysująca dany element
+    # Element rysowany jest raz do obrazka w pamięci podręcznej Vert.sprite_cache, a później tylko kopiowany.
+    # Bardzo duże elementy (przy dużym powiększeniu) rysowane są bezpośrednio.
+    # Etykiety rysowane są tylko wtedy, gdy są czytelne (LabelCache.MIN_FONT_SIZE).
+    # @param cro Kontekst rysowania biblioteki Cairo.
+    # @param pos_zoomed Pozycja środka elementu na ekranie.
+    # @param zoom Współczynnik powiększenia płaszczyzny rysowania elementów w stosunku do bazy współrzędnych ekranu.
+    # Im większy tym większe rysowane są elementy na ekranie.
+    def draw(self, cro, pos_zoomed, zoom):
+
+        # pos_zoomed = Utils.map_pos_canvas_to_screen(self.position_vec, center, zoom, pan_vec)
+
+        radius_zoomed = self.radius * zoom
+        colors = self.get_draw_colors()
+
+        if 2 * radius_zoomed > SpriteCache.MAX_SPRITE_SIZE:
+            Vert.draw_shape(cro, pos_zoomed, radius_zoomed, colors, self.get_drawn_labels(radius_zoomed))
+            return
+
+        radius_q = SpriteCache.quantize_radius(radius_zoomed)
+        labels = self.get_drawn_labels(radius_q)
+        key = (self.vert_type, colors, labels, radius_q)
+
+        Vert.sprite_cache.paint(cro, key, pos_zoomed,
+                                lambda ctx: Vert.get_shape_bounds(ctx, radius_q, labels),
+                                lambda ctx, center: Vert.draw_shape(ctx, center, radius_q, colors, labels))
+
         # VECTORS DRAWING
         # self.draw_vector(pos_zoomed, self.get_acceleration() * zoom/100, radius_zoomed / 10.0, (1, 0, 0), cro)
 
@@ -370,11 +628,15 @@ class Vert(object):
 
     ## Metoda wyróżniająca element.
     def activate(self):
+        self.store.mark_damaged(self.store_row)
         self.activated = True
+        self.update_appearance()
 
     ## Metoda zmieniająca stan elementu z wyróżninego na normalny.
     def deactivate(self):
+        self.store.mark_damaged(self.store_row)
         self.activated = False
+        self.update_appearance()
 
     ## Metoda dodająca siłę do sił elementu.
     # @param F Siła do dodania.
@@ -421,7 +683,7 @@ class Vert(object):
         ds = self.get_velocity() * dt
 
         if not self.is_selected():
-            self.position_vec += ds
+            self.position_vec = self.position_vec + ds
 
         # print('force vec: {}'.format(self.force_vec))
         self.force_vec *= 0
@@ -430,7 +692,8 @@ class Vert(object):
     ## Metoda pozwalająca przeusnąc element za pomocą wektora.
     # @param vec Wektor, o który przesunięty zostanie element.
     def translate_by_vec(self, vec):
-        self.position_vec += vec
+        # nowa tablica, a nie zmiana w miejscu - setter musi zobaczyć pozycję sprzed przesunięcia
+        self.position_vec = self.position_vec + vec
 
 
 ## Klasa Node.
@@ -442,8 +705,9 @@ class Node(Vert):
     }
 
     ## Konstruktor.
-    def __init__(self, name, pos, prop_dict):
-        super(Node, self).__init__(name=name, pos=pos, vtype=Vert.T_NODE, prop_dict=prop_dict)
+    # @param store Opcjonalny magazyn, do którego element jest od razu dołączany.
+    def __init__(self, name, pos, prop_dict, store=None):
+        super(Node, self).__init__(name=name, pos=pos, vtype=Vert.T_NODE, prop_dict=prop_dict, store=store)
 
         self.properties_dict.update(Node.node_properties)
 
@@ -473,11 +737,12 @@ class HBNode(Vert):
     }
 
     ## Konstruktor
-    def __init__(self, name, hbtype, pos, prop_dict):
+    # @param store Opcjonalny magazyn, do którego element jest od razu dołączany.
+    def __init__(self, name, hbtype, pos, prop_dict, store=None):
         if hbtype == HBNode.HB_DUMMY:
-            super(HBNode, self).__init__(name=name, pos=pos, vtype=Vert.T_DUMMY, prop_dict=prop_dict)
+            super(HBNode, self).__init__(name=name, pos=pos, vtype=Vert.T_DUMMY, prop_dict=prop_dict, store=store)
         else:
-            super(HBNode, self).__init__(name=name, pos=pos, vtype=Vert.T_HBRANCH, prop_dict=prop_dict)
+            super(HBNode, self).__init__(name=name, pos=pos, vtype=Vert.T_HBRANCH, prop_dict=prop_dict, store=store)
 
         ## Zmienna oznaczająca typ hipergałęzi (hiperkrawędź, hiperłuk, hiperpętla).
         self.hyperbranch_type = hbtype
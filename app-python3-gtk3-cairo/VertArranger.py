@@ -12,6 +12,7 @@ import time
 # import hashlib
 
 from OCL import OCL
+from QuadTree import QuadTree
 
 ## Klasa VertArranger.
 # Klasa wspomagająca obliczanie nowych współrzędnych wierzchołków 
@@ -71,57 +72,14 @@ class VertArranger:
     def arrange_pairs_list(hgobj, list1, list2, u_mul=1.0, k=0.0, grav=0.0):
         tstart = time.time()
 
-        l1_xnodes = [hgobj.get_xnode_by_id(xid) for xid in list1]
-        l2_xnodes = [hgobj.get_xnode_by_id(xid) for xid in list2]
+        if len(list1) == 0:
+            return
 
-        l1_pos = [x.get_position() for x in l1_xnodes]
-        l2_pos = [x.get_position() for x in l2_xnodes]
+        # numery wierszy magazynu stanu dla obu list elementów
+        l1_rows = hgobj.get_xnodes_rows_by_id(list1)
+        l2_rows = hgobj.get_xnodes_rows_by_id(list2)
 
-        l1_mass = [x.get_mass() for x in l1_xnodes]
-        l2_mass = [x.get_mass() for x in l2_xnodes]
-
-        l1_radius = [x.get_radius() for x in l1_xnodes]
-        l2_radius = [x.get_radius() for x in l2_xnodes]
-
-        wekt_wekt_odl_np = np.array(l2_pos) - np.array(l1_pos)
-        wekt_skal_odl_np = np.sqrt(wekt_wekt_odl_np[..., 0] ** 2 + wekt_wekt_odl_np[..., 1] ** 2).transpose()
-
-        wektor_mas1_np = np.array(l1_mass)
-        wektor_mas2_np = np.array(l2_mass)
-
-        wektor_promieni1_np = np.array(l1_radius)
-        wektor_promieni2_np = np.array(l2_radius)
-
-        dd = np.array((wekt_skal_odl_np, wekt_skal_odl_np)).transpose()
-        wekt_wekt_kier_np = wekt_wekt_odl_np/dd
-
-        wekt_masa1_razy_masa2_np = wektor_mas1_np * wektor_mas2_np
-
-        wekt_promien1_plus_promien2_np = wektor_promieni1_np + wektor_promieni2_np
-
-        wekt_wartosci_zadanych_odleglosci_np = (wekt_promien1_plus_promien2_np + 100) * u_mul
-
-        macierz_skalarow_sil_sprezystosci_np = k * ( wekt_skal_odl_np -wekt_wartosci_zadanych_odleglosci_np)
-
-        macierz_skalarow_sil_grawitacji_np = ((grav * wekt_masa1_razy_masa2_np) / ( np.maximum(wekt_skal_odl_np, 32 * np.ones(wekt_skal_odl_np.shape)) ** 2))
-
-        Fs3d = np.array((macierz_skalarow_sil_sprezystosci_np, macierz_skalarow_sil_sprezystosci_np)).transpose()
-        Fg3d = np.array((macierz_skalarow_sil_grawitacji_np, macierz_skalarow_sil_grawitacji_np)).transpose()
-
-        Fsv = np.multiply(wekt_wekt_kier_np, Fs3d)
-        Fgv = np.multiply(wekt_wekt_kier_np, Fg3d)
-
-        Fv = Fsv + Fgv
-
-        for i, id_pair in enumerate(zip(list1, list2)):
-            o1 = hgobj.get_xnode_by_id(id_pair[0])
-            o2 = hgobj.get_xnode_by_id(id_pair[1])
-
-            if not o1.is_selected():
-                o1.add_force(Fv[i])
-
-            if not o2.is_selected():
-                o2.add_force(-Fv[i])
+        VertArranger.arrange_pairs_rows(hgobj.store, l1_rows, l2_rows, u_mul=u_mul, k=k, grav=grav)
 
         # for i, id_pair in enumerate(zip(list1, list2)):
         #
@@ -168,6 +126,105 @@ class VertArranger:
         tend = time.time()
 
         # print("\t\tarranged {0} xnode pairs in {1:.5f}s, {2:.1f} 1/s".format(len(list1), tend-tstart, 1.0/(tend-tstart)))
+
+    ## Metoda licząca siły występujące pomiędzy parami elementów danych numerami wierszy magazynu stanu.
+    # Wszystkie pary liczone są jednym wektorowym przebiegiem, a siły sumowane są do wierszy przez np.bincount.
+    # Siły dodawane są tylko elementom niezaznaczonym.
+    # @param st Magazyn stanu elementów (VertStore).
+    # @param l1_rows Numery wierszy pierwszych elementów par.
+    # @param l2_rows Numery wierszy drugich elementów par.
+    # @param u_mul Mnożnik wartości zadanej odległości (opcjonalny).
+    # @param k Stała sprężystości (opcjonalna).
+    # @param grav Stała grawitacyjna (opcjonalna).
+    @staticmethod
+    def arrange_pairs_rows(st, l1_rows, l2_rows, u_mul=1.0, k=0.0, grav=0.0):
+        if len(l1_rows) == 0:
+            return
+
+        wekt_wekt_odl_np = st.position[l2_rows] - st.position[l1_rows]
+        wekt_skal_odl_np = np.sqrt(wekt_wekt_odl_np[..., 0] ** 2 + wekt_wekt_odl_np[..., 1] ** 2).transpose()
+
+        wektor_mas1_np = st.mass[l1_rows]
+        wektor_mas2_np = st.mass[l2_rows]
+
+        wektor_promieni1_np = st.radius[l1_rows]
+        wektor_promieni2_np = st.radius[l2_rows]
+
+        dd = np.array((wekt_skal_odl_np, wekt_skal_odl_np)).transpose()
+        wekt_wekt_kier_np = wekt_wekt_odl_np/dd
+
+        wekt_masa1_razy_masa2_np = wektor_mas1_np * wektor_mas2_np
+
+        wekt_promien1_plus_promien2_np = wektor_promieni1_np + wektor_promieni2_np
+
+        wekt_wartosci_zadanych_odleglosci_np = (wekt_promien1_plus_promien2_np + 100) * u_mul
+
+        macierz_skalarow_sil_sprezystosci_np = k * ( wekt_skal_odl_np -wekt_wartosci_zadanych_odleglosci_np)
+
+        macierz_skalarow_sil_grawitacji_np = ((grav * wekt_masa1_razy_masa2_np) / ( np.maximum(wekt_skal_odl_np, 32 * np.ones(wekt_skal_odl_np.shape)) ** 2))
+
+        Fs3d = np.array((macierz_skalarow_sil_sprezystosci_np, macierz_skalarow_sil_sprezystosci_np)).transpose()
+        Fg3d = np.array((macierz_skalarow_sil_grawitacji_np, macierz_skalarow_sil_grawitacji_np)).transpose()
+
+        Fsv = np.multiply(wekt_wekt_kier_np, Fs3d)
+        Fgv = np.multiply(wekt_wekt_kier_np, Fg3d)
+
+        Fv = Fsv + Fgv
+
+        # siły dodawane są tylko elementom niezaznaczonym
+        l1_free = np.logical_not(st.selected[l1_rows])
+        l2_free = np.logical_not(st.selected[l2_rows])
+
+        VertArranger.scatter_add_forces(st, l1_rows[l1_free], Fv[l1_free])
+        VertArranger.scatter_add_forces(st, l2_rows[l2_free], -Fv[l2_free])
+
+    ## Metoda licząca siły odpychania i sprężystości wewnątrz grup elementów (np. wierzchołków każdej hipergałęzi).
+    # Pary (element, inny element tej samej grupy) wszystkich grup podawane są jako płaskie tablice,
+    # a siła działa tylko na pierwszy element pary (para odwrotna też jest na liście).
+    # Wynik jest taki sam jak wywołanie arrange_all osobno dla każdej grupy (z pominięciem OpenCL) -
+    # geometria liczona jest w float32, tak jak w macierzach odległości i kierunków hipergrafu.
+    # @param st Magazyn stanu elementów (VertStore).
+    # @param l1_rows Numery wierszy elementów, na które działa siła.
+    # @param l2_rows Numery wierszy elementów oddziałujących (różnych od pierwszych).
+    # @param u_mul Mnożnik wartości zadanej odległości (opcjonalny).
+    # @param k Stała sprężystości (opcjonalna).
+    # @param grav Stała grawitacyjna (opcjonalna).
+    @staticmethod
+    def arrange_segmented_pairs_rows(st, l1_rows, l2_rows, u_mul=1.0, k=0.0, grav=0.0):
+        if len(l1_rows) == 0:
+            return
+
+        wekt_wekt_odl_np = st.position[l2_rows].astype(np.float32) - st.position[l1_rows].astype(np.float32)
+        wekt_skal_odl_np = np.sqrt(wekt_wekt_odl_np[..., 0] ** 2 + wekt_wekt_odl_np[..., 1] ** 2)
+        wekt_skal_odl_d_np = wekt_skal_odl_np.astype(np.double)
+
+        # elementy w tym samym miejscu mają zerowy wektor kierunku
+        dd = np.where(wekt_skal_odl_np == 0, np.float32(math.sqrt(2.0) / 2), wekt_skal_odl_np)
+        wekt_wekt_kier_np = wekt_wekt_odl_np / dd[:, np.newaxis]
+
+        wekt_masa1_razy_masa2_np = st.mass[l1_rows] * st.mass[l2_rows]
+
+        wekt_wartosci_zadanych_odleglosci_np = (st.radius[l1_rows] + st.radius[l2_rows] + 100) * u_mul
+
+        wekt_skalarow_sil_np = k * (wekt_skal_odl_d_np - wekt_wartosci_zadanych_odleglosci_np) + \
+                               (grav * wekt_masa1_razy_masa2_np) / (np.maximum(wekt_skal_odl_d_np, 32.0) ** 2)
+
+        VertArranger.scatter_add_forces(st, l1_rows, wekt_wekt_kier_np * wekt_skalarow_sil_np[:, np.newaxis])
+
+    ## Metoda sumująca wektory sił do wierszy magazynu stanu (wiersze mogą się powtarzać).
+    # @param st Magazyn stanu elementów (VertStore).
+    # @param rows Numery wierszy.
+    # @param Fv Tablica wektorów sił (N x 2).
+    @staticmethod
+    def scatter_add_forces(st, rows, Fv):
+        if len(rows) == 0:
+            return
+
+        n = st.count
+
+        st.force[:n, 0] += np.bincount(rows, weights=Fv[:, 0], minlength=n)
+        st.force[:n, 1] += np.bincount(rows, weights=Fv[:, 1], minlength=n)
+
     ## Metoda licząca siły występujące pomiędzy podzbiorami elementów na danej liście id, oraz przypisująca je do nich.
     # @param hgobj Obiekt hipergrafu.
     # @param xid_list Lista id elementów.
@@ -175,8 +232,12 @@ class VertArranger:
     # @param k Stała sprężystości oddziaływań sprężystych pomiędzy elementami (opcjonalna).
     # @param grav Stała grawitacyjna (opcjonalna).
     # @param nclosest Ilość innych elementów do obliczenia na każdy element (pomniejszona o jeden liczność podzbioru).
+    # @param theta Opcjonalny kąt otwarcia drzewa Barnes-Hut. Jeśli jest podany i k == 0, siły grawitacji liczone są
+    #  w przybliżeniu drzewem czwórkowym (QuadTree) w czasie O(n log n), bez macierzy n x n.
+    # @param active Opcjonalna tablica flag (dla kolejnych elementów xid_list) - siły liczone są tylko dla elementów
+    #  aktywnych (od wszystkich elementów), więc koszt jest proporcjonalny do ilości elementów aktywnych.
     @staticmethod
-    def arrange_all(hgobj, xid_list, u_mul=1.0, k=0.0, grav=0.0):
+    def arrange_all(hgobj, xid_list, u_mul=1.0, k=0.0, grav=0.0, theta=None, active=None):
         tstart = time.time()
 
         if not OCL.is_initialized():
@@ -184,17 +245,27 @@ class VertArranger:
 
         xid_list = list(xid_list)
 
-        if len(xid_list) >= 1:
+        if active is not None and not np.all(active):
+            VertArranger.arrange_active(hgobj, xid_list, active, u_mul=u_mul, k=k, grav=grav, theta=theta)
+
+        elif len(xid_list) >= 1:
             opencl_from_size = 24
             #opencl_computing = True
             # opencl_computing = False
             opencl_computing = len(xid_list) >= opencl_from_size
 
-            if opencl_computing and OCL.ENABLE_OPENCL:
+            if theta is not None and k == 0:
+                rows = hgobj.get_xnodes_rows_by_id(xid_list)
+
+                quadtree = QuadTree(hgobj.store.position[rows], hgobj.store.mass[rows])
+                Fv_sum_for_rows = quadtree.get_gravity_forces(grav=grav, theta=theta)
+
+            elif opencl_computing and OCL.ENABLE_OPENCL:
                 # POBIERANIE DANYCH WIERZCHOLKOW DO WEKTOROW
-                wektor_mas_np       = np.array([hgobj.get_xnode_by_id(xid).get_mass()              for xid in xid_list], dtype=np.float32)
-                wektor_promieni_np  = np.array([hgobj.get_xnode_by_id(xid).get_radius()            for xid in xid_list], dtype=np.float32)
-                xnodes_pos_array_np = np.array([hgobj.get_xnode_by_id(xid).get_position().tolist() for xid in xid_list], dtype=np.float32)
+                rows = hgobj.get_xnodes_rows_by_id(xid_list)
+                wektor_mas_np       = hgobj.store.mass[rows].astype(np.float32)
+                wektor_promieni_np  = hgobj.store.radius[rows].astype(np.float32)
+                xnodes_pos_array_np = hgobj.store.position[rows].astype(np.float32)
                 coeffs_vec_3_x_1    = np.array([u_mul,k,grav]).astype(np.float32)
 
                 # Fv = np.zeros((len(xid_list),len(xid_list),2), dtype=np.float32)
@@ -229,18 +300,19 @@ class VertArranger:
                 # print(Fv)
                 # print(Fv_sum_for_rows)
             else:
-                mac_skal_odl_dict = hgobj.macierz_skalarow_odleglosci(xid_list)
-                mac_wekt_kier_dict = hgobj.macierz_wekt_kierunkowych(xid_list)
-                # mac_wekt_odl_dict = hgobj.macierz_wekt_odleglosci(xid_list)
+                # macierze odległości liczone wprost z magazynu stanu - wyniki zmieniają się co krok symulacji,
+                # więc nie są zapamiętywane w pamięci podręcznej macierzy hipergrafu
+                rows = hgobj.get_xnodes_rows_by_id(xid_list)
+                xnodes_pos_array_np = hgobj.store.position[rows].astype(np.float32)
+
+                av = xnodes_pos_array_np[np.newaxis, :, :] - xnodes_pos_array_np[:, np.newaxis, :]
 
-                # mac_wekt_odl_np = mac_wekt_odl_dict['matrix']
-                mac_skal_odl_np  = mac_skal_odl_dict['matrix']
-                mac_wekt_kier_np = mac_wekt_kier_dict['matrix']
-                # mac_wekt_odl_np = mac_wekt_odl_dict['matrix']
+                mac_skal_odl_np = np.sqrt(av[..., 0] ** 2 + av[..., 1] ** 2)
+                mac_wekt_kier_np = av / np.where(mac_skal_odl_np == 0, math.sqrt(2.0)/2, mac_skal_odl_np)[..., np.newaxis]
 
                 # POBIERANIE DANYCH WIERZCHOLKOW DO WEKTOROW
-                wektor_mas_np = np.matrix([hgobj.get_xnode_by_id(xid).get_mass() for xid in xid_list])
-                wektor_promieni_np = np.matrix([hgobj.get_xnode_by_id(xid).get_radius() for xid in xid_list])
+                wektor_mas_np = np.matrix(hgobj.store.mass[rows])
+                wektor_promieni_np = np.matrix(hgobj.store.radius[rows])
 
                 # # DEKLAROWANIE WEKTORA WYNIKOWEGO
                 # wektor_sil_wynik_np = np.zeros((len(xid_list),2), dtype=np.float)
@@ -276,35 +348,72 @@ class VertArranger:
             # print(Fv)
             # print(Fv_sum_for_rows)
 
-            for i in range(len(xid_list)):
-                o = hgobj.get_xnode_by_id(xid_list[i])
-                o.add_force(Fv_sum_for_rows[i])
+            np.add.at(hgobj.store.force, rows, Fv_sum_for_rows)
 
         tend = time.time()
 
         # print("\t\tarranged all {0} xnodes ({1} relations) in {2:.5f}s, {3:.1f} 1/s, OCL: {4}".format(len(xid_list), len(xid_list)*(len(xid_list)-1), tend - tstart, 1.0/(tend-tstart), OCL.ENABLE_OPENCL and OCL.is_initialized()))
 
 
+    ## Metoda licząca siły działające na aktywne elementy listy od wszystkich elementów listy.
+    # Wynik jest taki sam jak w arrange_all dla wierszy elementów aktywnych.
+    # @param hgobj Obiekt hipergrafu.
+    # @param xid_list Lista id elementów.
+    # @param active Tablica flag elementów aktywnych (dla kolejnych elementów xid_list).
+    # @param u_mul Mnożnik wartości zadanej odległości (opcjonalny).
+    # @param k Stała sprężystości oddziaływań sprężystych pomiędzy elementami (opcjonalna).
+    # @param grav Stała grawitacyjna (opcjonalna).
+    # @param theta Opcjonalny kąt otwarcia drzewa Barnes-Hut (jak w arrange_all).
+    @staticmethod
+    def arrange_active(hgobj, xid_list, active, u_mul=1.0, k=0.0, grav=0.0, theta=None):
+        active_idx = np.flatnonzero(active)
+
+        if len(active_idx) == 0:
+            return
+
+        st = hgobj.store
+        rows = hgobj.get_xnodes_rows_by_id(xid_list)
+
+        if theta is not None and k == 0:
+            quadtree = QuadTree(st.position[rows], st.mass[rows])
+            Fv_sum_for_rows = quadtree.get_gravity_forces(grav=grav, theta=theta, bodies=active_idx)
+
+            VertArranger.scatter_add_forces(st, rows[active_idx], Fv_sum_for_rows[active_idx])
+        else:
+            # pary (element aktywny, dowolny inny element)
+            n = len(rows)
+            pi = np.repeat(active_idx, n)
+            pj = np.tile(np.arange(n, dtype=np.intp), len(active_idx))
+            distinct = pi != pj
+
+            VertArranger.arrange_segmented_pairs_rows(st, rows[pi[distinct]], rows[pj[distinct]], u_mul=u_mul, k=k, grav=grav)
+
     ## Metoda działająca siłą oporu zależną od prędkości na każdy element danej listy.
     # @param hgobj Obiekt hipergrafu, którego elementy są rozpatrywane.
     # @param xid_list Lista elementów do zastosowania oporu.
     # @param drag Współczynnik oporu do zastosowania.
     @staticmethod
     def apply_drag_force(hgobj, xid_list, drag):
+        if len(xid_list) > 0:
+            VertArranger.apply_drag_force_rows(hgobj.store, hgobj.get_xnodes_rows_by_id(xid_list), drag)
+
+    ## Metoda działająca siłą oporu zależną od prędkości na elementy danych wierszy magazynu stanu.
+    # @param st Magazyn stanu elementów (VertStore).
+    # @param rows Numery wierszy elementów.
+    # @param drag Współczynnik oporu do zastosowania.
+    @staticmethod
+    def apply_drag_force_rows(st, rows, drag):
 
         maxvel = 500.0
 
-        if len(xid_list) > 0:
-            node_list = [hgobj.get_xnode_by_id(xid) for xid in xid_list]
-            node_vel_vec_list = np.array([n.get_velocity() for n in node_list])
+        if len(rows) > 0:
+            node_vel_vec_list = st.velocity[rows]
             node_f_vec_list_to_add = node_vel_vec_list * (drag * -1)
             node_vel_vec_list[(node_vel_vec_list[:,0]**2 + node_vel_vec_list[:,1]**2) > maxvel**2] *= 0.5
 
-        for i, xid in enumerate(xid_list):
-            o = node_list[i]
-            o.add_force(node_f_vec_list_to_add[i])
+            np.add.at(st.force, rows, node_f_vec_list_to_add)
 
             # pozwala utrzymac stabilnosc, elementy nie rozjezdzaja sie
             # gdy jest za duza sila, ktora powoduje duza predkosc,
             # co powoduje nieprawidłowości przy zbyt dużym czasie odświeżania
-            o.velocity_vec = node_vel_vec_list[i]
+            st.velocity[rows] = node_vel_vec_list
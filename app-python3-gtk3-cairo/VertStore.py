@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+
+## @file VertStore.py
+## @package VertStore
+
+import numpy as np
+
+
+## Klasa VertStore.
+# Ciągły magazyn stanu fizycznego elementów hipergrafu w postaci struktury tablic.
+# Każdy element (obiekt klasy Vert) jest widokiem na jeden wiersz magazynu:
+# pozycje, prędkości, przyspieszenia i siły przechowywane są w tablicach N x 2,
+# a masy, promienie i flagi zaznaczenia w tablicach N.
+# Dzięki temu obliczenia fizyczne i rysowanie mogą pracować bezpośrednio na całych tablicach,
+# bez zbierania danych z obiektów w pętli i rozpraszania wyników z powrotem.
+# Elementy są ułożone w wierszach 0..count-1 bez przerw - przy usuwaniu elementu
+# na jego miejsce przenoszony jest element z ostatniego wiersza.
+# Widoki zwracane przez elementy (np. Vert.get_position()) są ważne do czasu powiększenia magazynu.
+class VertStore(object):
+
+    ## Początkowa pojemność magazynu.
+    INITIAL_CAPACITY = 16
+
+    ## Konstruktor.
+    # @param capacity Początkowa ilość wierszy do zaalokowania.
+    def __init__(self, capacity=INITIAL_CAPACITY):
+
+        ## Ilość zajętych wierszy magazynu.
+        self.count = 0
+
+        ## Lista obiektów elementów w kolejności wierszy.
+        self.verts = list()
+
+        capacity = max(1, capacity)
+
+        ## Tablica pozycji elementów (N x 2).
+        self.position = np.zeros((capacity, 2), dtype=np.double)
+
+        ## Tablica prędkości elementów (N x 2).
+        self.velocity = np.zeros((capacity, 2), dtype=np.double)
+
+        ## Tablica przyspieszeń elementów (N x 2).
+        self.acceleration = np.zeros((capacity, 2), dtype=np.double)
+
+        ## Tablica sił działających na elementy (N x 2).
+        self.force = np.zeros((capacity, 2), dtype=np.double)
+
+        ## Tablica mas elementów (N).
+        self.mass = np.zeros(capacity, dtype=np.double)
+
+        ## Tablica promieni elementów (N).
+        self.radius = np.zeros(capacity, dtype=np.double)
+
+        ## Tablica flag zaznaczenia elementów (N).
+        self.selected = np.zeros(capacity, dtype=bool)
+
+        ## Tablica połówek szerokości i wysokości obszaru rysowanego elementu z etykietami (N x 2), w bazie płótna.
+        # Aktualizowana przez element przy każdej zmianie wyglądu (Vert.update_appearance).
+        self.extent = np.zeros((capacity, 2), dtype=np.double)
+
+        ## Tablica numerów komórek siatki przestrzennej elementów (N), utrzymywana przez SpatialGrid.
+        self.cell = np.zeros(capacity, dtype=np.int64)
+
+        ## Tablica flag uśpienia elementów (N) - elementy uśpione nie są przesuwane przez symulację.
+        self.sleeping = np.zeros(capacity, dtype=bool)
+
+        ## Tablica ilości kolejnych odświeżeń, w których element prawie się nie poruszał (N).
+        self.calm_frames = np.zeros(capacity, dtype=np.int32)
+
+        ## Tablica flag elementów przesuniętych poza symulacją od ostatniego odświeżenia (N).
+        self.disturbed = np.zeros(capacity, dtype=bool)
+
+        ## Licznik zmian pozycji elementów.
+        # Zwiększany przy każdym przesunięciu elementów, służy do unieważniania wyników zależnych od geometrii.
+        self.geometry_version = 0
+
+        ## Licznik zmian wyglądu elementów (zaznaczenie, wyróżnienie, właściwości, promień).
+        # Służy do unieważniania obrazów sceny, podobnie jak geometry_version.
+        self.appearance_version = 0
+
+        ## Słownik numer wiersza -> (pozycja, połówki wymiarów) elementów zmienionych od ostatniego wywołania pop_damage,
+        # z wartościami sprzed pierwszej zmiany - pozwala odświeżyć na ekranie tylko zmieniony obszar.
+        self.damaged = dict()
+
+        ## Czy od ostatniego wywołania pop_damage były zmiany, których nie przypisano do wierszy (np. krok symulacji).
+        # Wymagają one odświeżenia całego widoku.
+        self.damage_untracked = False
+
+        ## Zbiór numerów wierszy elementów przesuniętych lub zmienionych od ostatniego odświeżenia siatki przestrzennej.
+        # Pozwala siatce (SpatialGrid) przenieść tylko te elementy, zamiast liczyć od nowa komórki wszystkich elementów.
+        self.regrid_rows = set()
+
+        ## Czy od ostatniego odświeżenia siatki przestrzennej elementy były przesuwane bez podania wierszy (np. krok symulacji).
+        self.regrid_untracked = False
+
+    ## Metoda zwracająca pojemność magazynu.
+    # @return Ilość zaalokowanych wierszy.
+    def get_capacity(self):
+        return self.mass.shape[0]
+
+    ## Metoda oznaczająca zmianę pozycji elementów magazynu.
+    # @param rows Opcjonalny numer zmienionego wiersza, zapamiętanego wcześniej przez mark_damaged
+    # (None - zmiana dowolnych wierszy).
+    def touch_geometry(self, rows=None):
+        self.geometry_version += 1
+
+        if rows is None:
+            self.damage_untracked = True
+            self.regrid_untracked = True
+        else:
+            self.regrid_rows.add(rows)
+
+    ## Metoda oznaczająca zmianę wyglądu elementów magazynu.
+    # @param rows Opcjonalny numer zmienionego wiersza, zapamiętanego wcześniej przez mark_damaged
+    # (None - zmiana dowolnych wierszy).
+    def touch_appearance(self, rows=None):
+        self.appearance_version += 1
+
+        if rows is None:
+            self.damage_untracked = True
+
+    ## Metoda zapamiętująca wiersz, który zaraz zostanie zmieniony, razem z jego pozycją i wymiarami sprzed zmiany.
+    # @param row Numer wiersza.
+    def mark_damaged(self, row):
+        if row not in self.damaged:
+            self.damaged[row] = (np.array(self.position[row]), np.array(self.extent[row]))
+
+    ## Metoda zwracająca i czyszcząca zapamiętane zmiany.
+    # @return Krotka (słownik zmienionych wierszy jak w damaged, czy były zmiany nieprzypisane do wierszy).
+    def pop_damage(self):
+        damaged, untracked = self.damaged, self.damage_untracked
+
+        self.damaged = dict()
+        self.damage_untracked = False
+
+        return damaged, untracked
+
+    ## Metoda oznaczająca wiersz, którego element siatka przestrzenna musi rozpatrzyć ponownie (np. po zmianie promienia).
+    # @param row Numer wiersza.
+    def mark_regrid(self, row):
+        self.regrid_rows.add(row)
+
+    ## Metoda zwracająca i czyszcząca wiersze oczekujące na odświeżenie siatki przestrzennej.
+    # @return Krotka (zbiór numerów wierszy, czy były zmiany nieprzypisane do wierszy).
+    def pop_regrid(self):
+        rows, untracked = self.regrid_rows, self.regrid_untracked
+
+        self.regrid_rows = set()
+        self.regrid_untracked = False
+
+        return rows, untracked
+
+    ## Metoda budząca elementy magazynu.
+    # @param rows Numer wiersza lub tablica numerów wierszy.
+    # @param disturbed Czy elementy zostały przesunięte poza symulacją (budzą wtedy też swoich sąsiadów).
+    def wake(self, rows, disturbed=False):
+        self.sleeping[rows] = False
+        self.calm_frames[rows] = 0
+
+        if disturbed:
+            self.disturbed[rows] = True
+
+    ## Metoda zwracająca nazwy tablic magazynu.
+    # @return Krotka nazw atrybutów będących tablicami stanu.
+    @staticmethod
+    def get_array_names():
+        return 'position', 'velocity', 'acceleration', 'force', 'mass', 'radius', 'selected', 'extent', 'cell', \
+               'sleeping', 'calm_frames', 'disturbed'
+
+    ## Metoda powiększająca magazyn tak, aby zmieścił daną ilość wierszy.
+    # @param capacity Wymagana ilość wierszy.
+    def reserve(self, capacity):
+        old_capacity = self.get_capacity()
+
+        if capacity <= old_capacity:
+            return
+
+        new_capacity = max(capacity, 2 * old_capacity)
+
+        for name in self.get_array_names():
+            old_arr = getattr(self, name)
+            new_arr = np.zeros((new_capacity,) + old_arr.shape[1:], dtype=old_arr.dtype)
+            new_arr[:self.count] = old_arr[:self.count]
+            setattr(self, name, new_arr)
+
+    ## Metoda dołączająca element do magazynu.
+    # Aktualny stan elementu (jeśli był już przypisany do innego magazynu) kopiowany jest do nowego wiersza,
+    # a element staje się widokiem na ten wiersz.
+    # @param vert Obiekt elementu hipergrafu.
+    # @return Numer wiersza przydzielonego elementowi.
+    def attach(self, vert):
+        old_store = vert.__dict__.get('store')
+
+        if old_store is self:
+            return vert.store_row
+
+        self.reserve(self.count + 1)
+
+        row = self.count
+
+        if old_store is not None:
+            old_row = vert.store_row
+
+            for name in self.get_array_names():
+                getattr(self, name)[row] = getattr(old_store, name)[old_row]
+
+            old_store.remove_row(old_row)
+        else:
+            for name in self.get_array_names():
+                getattr(self, name)[row] = 0
+
+        self.verts.append(vert)
+        self.count += 1
+        self.damage_untracked = True
+
+        vert.store = self
+        vert.store_row = row
+
+        return row
+
+    ## Metoda dołączająca do magazynu wiele elementów naraz.
+    # Elementy odczytane z pliku (Vert.__setstate__) nie mają jeszcze magazynu, a ich wartości przechowywane są
+    # w słowniku pending_store_values (nazwa tablicy -> wartość) - wpisywane są one jednym przypisaniem na tablicę.
+    # Pozostałe elementy dołączane są pojedynczo (attach).
+    # Obszary rysowania (extent) nie są liczone - należy je wyznaczyć po dołączeniu (Vert.update_appearance_all).
+    # @param verts_list Lista obiektów elementów.
+    def attach_all(self, verts_list):
+        pending = list()
+
+        for vert in verts_list:
+            if 'pending_store_values' in vert.__dict__:
+                pending.append(vert)
+            else:
+                self.attach(vert)
+
+        if len(pending) == 0:
+            return
+
+        self.reserve(self.count + len(pending))
+
+        rows = slice(self.count, self.count + len(pending))
+        values_list = [vert.__dict__.pop('pending_store_values') for vert in pending]
+
+        for name in self.get_array_names():
+            arr = getattr(self, name)
+            arr[rows] = 0
+
+            try:
+                arr[rows] = [values[name] for values in values_list]
+            except KeyError:
+                # wartość zapisana tylko dla części elementów (lub dla żadnego)
+                for row, values in enumerate(values_list, self.count):
+                    if name in values:
+                        arr[row] = values[name]
+
+        for row, vert in enumerate(pending, self.count):
+            vert.store = self
+            vert.store_row = row
+
+        self.verts.extend(pending)
+        self.count += len(pending)
+        self.damage_untracked = True
+
+    ## Metoda odłączająca element od magazynu.
+    # Stan elementu przenoszony jest do jego własnego, jednoelementowego magazynu.
+    # @param vert Obiekt elementu hipergrafu.
+    def detach(self, vert):
+        if vert.__dict__.get('store') is not self:
+            return
+
+        VertStore(capacity=1).attach(vert)
+
+    ## Metoda zwalniająca wiersz magazynu.
+    # Na miejsce zwolnionego wiersza przenoszony jest ostatni wiersz, aby zachować ciągłość tablic.
+    # @param row Numer wiersza do zwolnienia.
+    def remove_row(self, row):
+        last = self.count - 1
+
+        self.regrid_rows.discard(row)
+
+        if row != last:
+            for name in self.get_array_names():
+                arr = getattr(self, name)
+                arr[row] = arr[last]
+
+            moved_vert = self.verts[last]
+            moved_vert.store_row = row
+            self.verts[row] = moved_vert
+
+            if last in self.regrid_rows:
+                self.regrid_rows.discard(last)
+                self.regrid_rows.add(row)
+
+        self.verts.pop()
+        self.count -= 1
+        self.damage_untracked = True
+
+    ## Metoda zwracająca numery wierszy dla danej listy elementów.
+    # @param verts_list Lista obiektów elementów należących do magazynu.
+    # @return Tablica NumPy z numerami wierszy.
+    @staticmethod
+    def get_rows_of_verts(verts_list):
+        return np.fromiter((v.store_row for v in verts_list), dtype=np.intp, count=len(verts_list))
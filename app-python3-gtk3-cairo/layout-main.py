@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+## @file layout-main.py
+## @package layout_main
+# Układanie hipergrafu z pliku bez interfejsu graficznego, np.:
+# python3 layout-main.py ../app-files-models/4kn-3h-ulozone.hg -o ulozony.hg --steps 2000 --energy 1e3
+
+import argparse
+
+from LayoutEngine import LayoutEngine
+
+
+## Funkcja wypisująca statystyki symulacji.
+# @param stats Słownik ze statystykami symulacji (LayoutEngine.get_stats).
+def print_stats(stats):
+    print("step {0}, \t{1:.2f}s, \t{2:.1f} steps/s, \tEk: {3:.6g}{4}".format(stats["total_steps"],
+                                                                          stats["seconds"],
+                                                                          stats["steps_per_sec"],
+                                                                          stats["kinetic_energy"],
+                                                                          ", converged" if stats["converged"] else ""))
+
+
+## Część właściwa programu układającego. Nie jest wykonywana, w przypadku importu tego pliku do innego pliku.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Układanie hipergrafu bez interfejsu graficznego.")
+    parser.add_argument("input", help="plik hipergrafu (*.hg lub *.py3hg)")
+    parser.add_argument("-o", "--output", help="plik wynikowy (*.hg), domyślnie nadpisywany jest plik wejściowy *.hg")
+    parser.add_argument("--steps", type=int, default=1000, help="maksymalna ilość kroków symulacji")
+    parser.add_argument("--energy", type=float, default=None, help="próg energii kinetycznej, poniżej którego symulacja kończy się")
+    parser.add_argument("--dt", type=float, default=LayoutEngine.DEFAULT_TIME_DELTA_SEC, help="krok czasu symulacji")
+    parser.add_argument("--theta", type=float, default=None, help="kąt otwarcia Barnes-Hut dla układania hipergałęzi")
+    parser.add_argument("--report", type=int, default=100, help="co ile kroków wypisywać postęp (0 - tylko podsumowanie)")
+    parser.add_argument("--multilevel", action="store_true", help="wstępne układanie wielopoziomowe przed symulacją")
+
+    args = parser.parse_args()
+
+    output = args.output
+
+    if output is None:
+        output = args.input if args.input.endswith(".hg") else args.input.rsplit(".", 1)[0] + ".hg"
+
+    ## Silnik układania hipergrafu.
+    engine = LayoutEngine.from_file(args.input, dt=args.dt, theta=args.theta)
+
+    print("loaded {0}: {1} xnodes, {2} hbnodes".format(args.input,
+                                                       len(engine.hg.get_all_xnodes_id()),
+                                                       len(engine.hg.get_all_hyperbranches_id())))
+
+    if args.multilevel:
+        ml_stats = engine.initialize_multilevel()
+
+        print("multilevel: {0} levels {1}, \t{2:.2f}s".format(len(ml_stats["levels"]), ml_stats["levels"], ml_stats["seconds"]))
+
+    stats = engine.run(args.steps,
+                       energy_threshold=args.energy,
+                       report_every=args.report if args.report > 0 else None,
+                       report=print_stats)
+
+    # ostatni krok mógł zostać już wypisany jako raport postępu
+    if args.report <= 0 or stats["steps"] == 0 or stats["steps"] % args.report != 0:
+        print_stats(stats)
+
+    engine.save(output)
+
+    print("saved {0}".format(output))